@@ -0,0 +1,58 @@
+"""
+Persistent cache for ProcessAnalyzer results.
+
+Analyses are keyed by a canonical hash of the normalized process payload(s),
+the analysis type and the model/prompt version. The payload includes each
+process's ``updated_at`` and the latest step timestamp, so editing an
+ERPProcess or any of its ERPProcessSteps produces a new key and the stale
+analysis is simply never read again (it ages out of the cache).
+"""
+import json
+import logging
+import os
+
+from content_cache import content_hash, get_cache
+from progress_stream import report_stage
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+ANALYSIS_PROMPT_VERSION = os.environ.get('ANALYSIS_PROMPT_VERSION', '1')
+
+
+def normalize_payload(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {key: normalize_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_payload(item) for item in value]
+    return value
+
+
+def process_fingerprint(process, steps, process_info):
+    """Canonical JSON for a process: its normalized payload plus edit timestamps"""
+    timestamps = [getattr(step, 'updated_at', None) or getattr(step, 'created_at', None) for step in steps]
+    timestamps = [ts for ts in timestamps if ts is not None]
+    return json.dumps({
+        'id': process.id,
+        'updated_at': process.updated_at.isoformat() if process.updated_at else None,
+        'steps_updated_at': max(timestamps).isoformat() if timestamps else None,
+        'payload': normalize_payload(process_info)
+    }, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def cached_analysis(analysis_type, fingerprints, compute):
+    """Return (result, cache_status), calling compute() only on a miss"""
+    cache = get_cache('process_analysis')
+    key = content_hash(analysis_type, ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION, *fingerprints)
+
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"Analysis cache hit for {analysis_type}")
+        return json.loads(cached), 'hit'
+
+    report_stage('llm_started', analysis=analysis_type)
+    result = compute()
+    cache.set(key, json.dumps(result, default=str))
+    return result, 'miss'
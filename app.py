@@ -1,4 +1,4 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request, redirect
+from flask import Flask, Response, render_template, jsonify, request, redirect
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -9,6 +9,18 @@ import json
 import logging
 from datetime import datetime
 from fpdf import FPDF
+from analysis_cache import cached_analysis, process_fingerprint
+from content_cache import get_cache
+import diagram_svg
+from document_pipeline import DocumentPipelineError, run_document_pipeline
+from llm_client import get_llm_client, get_process_analyzer
+from process_diff import diff_processes, residual_processes
+from process_queries import MAX_BATCH_SIZE, load_process, load_processes, serialize_process, serialize_processes
+from progress_stream import ProgressStreams, in_progress_stream, report_stage
+from startup_profile import StartupProfile
+from static_assets import StaticAssets
+import step_similarity
+from tobe_cache import install_tobe_generation_cache
 
 # Try importing SocketIO, but make it optional
 try:
@@ -30,7 +42,24 @@ def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def create_app():
+def init_database(app):
+    """Create missing tables and apply the migrations.
+
+    This is a deploy step (``python create_tables.py``); workers no longer
+    touch the schema when they boot. Processes saved before versioning get
+    their version history recorded here, not on a read request.
+    """
+    from flask_migrate import upgrade
+    from backend.models import db
+    from process_versions import backfill_all_versions
+    with app.app_context():
+        db.create_all()
+        upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+        backfill_all_versions()
+
+def create_app(resume_jobs=True):
+    profile = StartupProfile()
+
     # Use relative paths for static and template folders
     app = Flask(__name__,
             static_folder='/home/ec2-user/AI-powered-BPM/react-frontend/dist',
@@ -40,15 +69,19 @@ def create_app():
     # Initialize SocketIO with proper CORS support for WebSockets
     socketio = None
     if socketio_available:
-        socketio = SocketIO(
-            app, 
-            cors_allowed_origins="*",
-            async_mode="eventlet",  # Use eventlet for better WebSocket support
-            ping_timeout=60,  # Increase ping timeout for stability
-            engineio_logger=True,  # Enable Engine.IO logging
-            json=json,  # Use the same JSON implementation
-            binary=True  # Enable binary data support
-        )
+        with profile.step('socketio'):
+            socketio = SocketIO(
+                app, 
+                cors_allowed_origins="*",
+                # eventlet for WebSockets; the gunicorn API role runs threaded workers
+                async_mode=os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet'),
+                ping_timeout=60,  # Increase ping timeout for stability
+                engineio_logger=True,  # Enable Engine.IO logging
+                json=json,  # Use the same JSON implementation
+                binary=True,  # Enable binary data support
+                # Lets every worker process emit to clients connected to another
+                message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+            )
 
     
     # Enable CORS for all routes and origins
@@ -61,13 +94,16 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), UPLOAD_FOLDER)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-    # Initialize database
-    from backend.models import db
-    db.init_app(app)
+    # Initialize database; the schema is created by init_database at deploy time
+    with profile.step('database'):
+        from backend.models import db
+        db.init_app(app)
 
-    # Create tables
-    with app.app_context():
-        db.create_all()
+        # Register job, version and diagram models with the metadata
+        from extraction_jobs import ExtractionJobQueue, JOB_NAMESPACE
+        from batch_gap_analysis import BatchGapAnalysisRunner
+        import process_versions
+        import process_diagram
         
     # Make sure upload folder exists
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -76,24 +112,46 @@ def create_app():
     # Initialize extensions
     migrate = Migrate(app, db)
 
+    # Background document extraction; pick up jobs left by a previous worker
+    with profile.step('job_queues'):
+        extraction_jobs = ExtractionJobQueue(app, socketio)
+        batch_gap_jobs = BatchGapAnalysisRunner(app)
+        if resume_jobs:
+            try:
+                extraction_jobs.resume_pending()
+                batch_gap_jobs.resume_pending()
+            except Exception as e:
+                logger.error(f"Could not resume pending jobs (run 'python create_tables.py' "
+                             f"if the schema is missing): {str(e)}")
+        # Server-sent progress events for long-running AI requests
+        progress = ProgressStreams(app)
+
     # Register blueprints
-    from backend.routes.admin_routes import admin_bp
-    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    with profile.step('blueprint:admin'):
+        from backend.routes.admin_routes import admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/api/admin')
     
-    from backend.routes.process_routes import bp as process_bp
-    app.register_blueprint(process_bp)
+    with profile.step('blueprint:process'):
+        from backend.routes.process_routes import bp as process_bp
+        app.register_blueprint(process_bp)
     
     # Register the API blueprint which already includes gap_analysis
-    from backend.api import bp as api_bp
-    app.register_blueprint(api_bp, url_prefix='/api')
+    with profile.step('blueprint:api'):
+        from backend.api import bp as api_bp
+        app.register_blueprint(api_bp, url_prefix='/api')
+        # Repeat TO-BE generations for unchanged AS-IS content come from the cache
+        install_tobe_generation_cache(app)
+        # Opt-in SSE progress for the slow TO-BE and gap analysis endpoints
+        progress.install(app)
     
     # Register the meeting blueprint for AI Meeting Advisor
-    from backend.routes.meeting import meeting_bp, register_realtime_meeting_audio
-    app.register_blueprint(meeting_bp)
-    
-    # Register WebSocket handlers for real-time meeting audio if available
-    if socketio_available and socketio:
-        register_realtime_meeting_audio(socketio)
+    with profile.step('blueprint:meeting'):
+        from backend.routes.meeting import meeting_bp, register_realtime_meeting_audio
+        app.register_blueprint(meeting_bp)
+        
+        # Register WebSocket handlers for real-time meeting audio if available
+        if socketio_available and socketio:
+            register_realtime_meeting_audio(socketio)
     
     # Template download route
     @app.route('/download_template')
@@ -101,217 +159,96 @@ def create_app():
         # Redirect to the backend route for template download
         return redirect('/api/download-template')
         
-    # Serve React App
+    # Serve React App from the in-memory manifest of the build
+    with profile.step('static_assets'):
+        static_assets = StaticAssets(app.static_folder)
+
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve_react(path):
-        if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-            return send_from_directory(app.static_folder, path)
-        else:
-            return send_from_directory(app.static_folder, 'index.html')
+        return static_assets.serve(path)
     
     # Explicitly define routes for SPA navigation
     @app.route('/ai-meeting')
     @app.route('/ai-meeting/')
     def ai_meeting():
         # Force serve index.html for the AI Meeting route
-        return send_from_directory(app.static_folder, 'index.html')
+        return static_assets.serve_index()
         
     @app.route('/evaai')
     @app.route('/evaai/')
     def evaai():
         # Force serve index.html for the EVA AI route
-        return send_from_directory(app.static_folder, 'index.html')
+        return static_assets.serve_index()
     
     # Document processing endpoint
     @app.route('/api/process/extract', methods=['POST'])
     def extract_process_from_document():
-        """Extract process from an uploaded document using OpenAI API"""
-        print("=== Document upload received ===")
-        
+        """Queue an uploaded document ('file' field) for background extraction"""
         if 'file' not in request.files:
-            print("Error: No file in request")
             return jsonify({'error': 'No file provided'}), 400
-
-        file = request.files['file']
-        print(f"File received: {file.filename}")
         
+        file = request.files['file']
         if file.filename == '':
-            print("Error: Empty filename")
             return jsonify({'error': 'No file selected'}), 400
-            
         if not allowed_file(file.filename):
-            print(f"Error: Invalid file format - {file.filename}")
             return jsonify({'error': f'Invalid file format. Supported formats: pdf, doc, docx'}), 400
-
+        
         try:
-            # Save file for processing
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            print(f"File saved to {file_path}")
-            
-            # For now, just return a mock response to verify the endpoint is working
-            mock_process = {
-                "name": f"Process from {filename}",
-                "system": "Document Upload",
-                "steps": [
-                    {
-                        "step_number": 1,
-                        "description": "Upload document",
-                        "approver_role": "User",
-                        "approver_name": "System"
-                    },
-                    {
-                        "step_number": 2,
-                        "description": "Process document",
-                        "approver_role": "System",
-                        "approver_name": "AI"
-                    }
-                ]
-            }
-            
+            # Same queue as /api/process-document/jobs; the result is polled or pushed over SocketIO
+            job = extraction_jobs.submit(file.read(), secure_filename(file.filename))
             return jsonify({
                 'message': 'Document received successfully',
-                'processId': 1,
-                'process': mock_process
-            })
-                
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/api/process-document/jobs/{job.id}',
+                'socketio_namespace': JOB_NAMESPACE
+            }), 202
         except Exception as e:
-            print(f"General error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"Error queueing document: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
             
+    def _get_uploaded_document():
+        """Validate the 'document' upload; returns (file, error_response)"""
+        # Check if a file was uploaded
+        if 'document' not in request.files:
+            logger.error("No document part in request")
+            return None, (jsonify({'error': 'No document uploaded'}), 400)
+        
+        file = request.files['document']
+        logger.info(f"Received file: {file.filename}")
+        
+        # Check if a file was selected
+        if file.filename == '':
+            logger.error("No file selected")
+            return None, (jsonify({'error': 'No file selected'}), 400)
+        
+        # Check file type
+        if not allowed_file(file.filename):
+            logger.error(f"Invalid file type: {file.filename}")
+            return None, (jsonify({'error': 'Invalid file type. Please upload a PDF or Word document.'}), 400)
+        
+        return file, None
+
     @app.route('/api/process-document', methods=['POST'])
+    @progress.streamable('process-document')
     def process_document():
         try:
-            # Check if a file was uploaded
-            if 'document' not in request.files:
-                logger.error("No document part in request")
-                return jsonify({'error': 'No document uploaded'}), 400
-            
-            file = request.files['document']
-            logger.info(f"Received file: {file.filename}")
+            file, error_response = _get_uploaded_document()
+            if error_response:
+                return error_response
             
-            # Check if a file was selected
-            if file.filename == '':
-                logger.error("No file selected")
-                return jsonify({'error': 'No file selected'}), 400
-            
-            # Check file type
-            if not allowed_file(file.filename):
-                logger.error(f"Invalid file type: {file.filename}")
-                return jsonify({'error': 'Invalid file type. Please upload a PDF or Word document.'}), 400
-            
-            # Secure the filename and create full path
+            # Secure the filename
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             logger.info(f"Processing file: {filename}")
             
             try:
-                # Save the file
-                file.save(file_path)
-                logger.info(f"File saved successfully: {filename}")
-                
-                # Get file extension
-                file_type = filename.rsplit('.', 1)[1].lower()
-                
-                # Process the document
-                try:
-                    from backend.document_processor import DocumentProcessor
-                    processor = DocumentProcessor()
-                    logger.info("DocumentProcessor initialized")
-                    process_info_str = processor.process_document(file_path, file_type)
-                    logger.info("Document processed successfully")
-                    process_info = json.loads(process_info_str)
-                    logger.info(f"Process info parsed: {process_info['name']}")
-                except Exception as e:
-                    logger.error(f"Error in document processing: {str(e)}", exc_info=True)
-                    return jsonify({
-                        'error': 'Failed to process document',
-                        'details': str(e),
-                        'type': 'processing_error'
-                    }), 500
-                
-                try:
-                    # Store in database
-                    from backend.models import ERPProcess, ERPProcessStep
-                    new_process = ERPProcess(
-                        process_name=process_info['name'],
-                        erp_system=process_info['system'],
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                    db.session.add(new_process)
-                    db.session.flush()  # Get the ID without committing
-                    logger.info(f"Created new process record: {new_process.id}")
-                    
-                    # Add steps
-                    for step in process_info['steps']:
-                        new_step = ERPProcessStep(
-                            process_id=new_process.id,
-                            step_number=step['number'],
-                            step_description=step.get('description', ''),
-                            approver_role=step.get('role', ''),
-                            approver_name=step.get('owner', ''),
-                            created_at=datetime.utcnow()
-                        )
-                        db.session.add(new_step)
-                    
-                    db.session.commit()
-                    logger.info(f"Process '{process_info['name']}' saved to database with {len(process_info['steps'])} steps")
-                except Exception as e:
-                    db.session.rollback()
-                    logger.error(f"Database error: {str(e)}", exc_info=True)
-                    return jsonify({
-                        'error': 'Failed to save process to database',
-                        'details': str(e),
-                        'type': 'database_error'
-                    }), 500
-                
-                try:
-                    # Generate Mermaid diagram
-                    mermaid_nodes = []
-                    for i, step in enumerate(process_info['steps']):
-                        step_number = step['number']
-                        step_name = step.get('name', f'Step {step_number}')
-                        step_owner = step.get('owner', 'Unassigned')
-                        step_text = f"{step_number}[{step_name}<br/>{step_owner}]"
-                        
-                        if i < len(process_info['steps']) - 1:
-                            next_step = process_info['steps'][i+1]
-                            mermaid_nodes.append(f"{step_text} --> {next_step['number']}")
-                        else:
-                            mermaid_nodes.append(step_text)
-
-                    mermaid_diagram = "graph TD\n" + "\n".join(mermaid_nodes)
-                    logger.info("Mermaid diagram generated successfully")
-                except Exception as e:
-                    logger.error(f"Error generating diagram: {str(e)}", exc_info=True)
-                    return jsonify({
-                        'error': 'Failed to generate process diagram',
-                        'details': str(e),
-                        'type': 'diagram_error'
-                    }), 500
-                
-                # Enhance response with visualization
-                response_data = {
-                    'process': process_info,
-                    'mermaid_diagram': mermaid_diagram,
-                    'message': 'Process extracted and stored successfully',
-                    'analysis': {
-                        'steps_count': len(process_info['steps']),
-                        'manual_steps': sum(1 for step in process_info['steps'] if 'Automated' not in step.get('owner', '')),
-                        'automated_steps': sum(1 for step in process_info['steps'] if 'Automated' in step.get('owner', '')),
-                        'timeline': f"Approximately {len(process_info['steps']) * 2} days",
-                        'key_roles': list(set(step.get('role', 'Unassigned') for step in process_info['steps']))
-                    }
-                }
-                
+                response_data = run_document_pipeline(file.read(), filename, app.config['UPLOAD_FOLDER'],
+                                                      on_stage=report_stage, stream=in_progress_stream())
                 logger.info("Successfully prepared response with process analysis")
                 return jsonify(response_data)
-                
+            except DocumentPipelineError as e:
+                return jsonify(e.to_dict()), 500
             except Exception as e:
                 logger.error(f"Error processing document: {str(e)}", exc_info=True)
                 return jsonify({
@@ -319,12 +256,6 @@ def create_app():
                     'details': str(e),
                     'type': 'general_error'
                 }), 500
-                
-            finally:
-                # Clean up the uploaded file
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up temporary file: {filename}")
         
         except Exception as e:
             logger.error(f"Unexpected error in process_document: {str(e)}", exc_info=True)
@@ -334,6 +265,36 @@ def create_app():
                 'type': 'unexpected_error'
             }), 500
 
+    @app.route('/api/process-document/jobs', methods=['POST'])
+    def submit_process_document_job():
+        """Queue a document for background extraction and return the job id at once"""
+        file, error_response = _get_uploaded_document()
+        if error_response:
+            return error_response
+        
+        try:
+            job = extraction_jobs.submit(file.read(), secure_filename(file.filename))
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/api/process-document/jobs/{job.id}',
+                'socketio_namespace': JOB_NAMESPACE
+            }), 202
+        except Exception as e:
+            logger.error(f"Error queueing document: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/process-document/jobs/<job_id>', methods=['GET'])
+    def get_process_document_job(job_id):
+        job = extraction_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/process-document/cache-stats', methods=['GET'])
+    def process_document_cache_stats():
+        return jsonify(get_cache('document_extraction').stats())
+
     @app.route('/test-document-processing')
     def test_document_processing():
         try:
@@ -385,6 +346,7 @@ Role: Finance"""
             }), 500
 
     @app.route('/api/analyze-process', methods=['POST'])
+    @progress.streamable('analyze-process')
     def analyze_process():
         try:
             data = request.get_json()
@@ -393,39 +355,24 @@ Role: Finance"""
             if not process_id:
                 return jsonify({'error': 'Process ID is required'}), 400
             
-            # Get process from database
-            from backend.models import ERPProcess
-            process = ERPProcess.query.get(process_id)
+            # Process and ordered steps in one query
+            process, steps = load_process(process_id)
             if not process:
                 return jsonify({'error': 'Process not found'}), 404
             
-            # Get all steps for the process
-            from backend.models import ERPProcessStep
-            steps = ERPProcessStep.query.filter_by(process_id=process_id).order_by(ERPProcessStep.step_number).all()
-            
-            # Format process info for analysis
-            process_info = {
-                'name': process.process_name,
-                'system': process.erp_system,
-                'version': '1.0',  # You might want to add version tracking to your model
-                'steps': [{
-                    'number': step.step_number,
-                    'name': f'Step {step.step_number}',
-                    'description': step.step_description,
-                    'owner': step.approver_name,
-                    'role': step.approver_role
-                } for step in steps]
-            }
-            
-            # Initialize process analyzer
-            from backend.process_analyzer import ProcessAnalyzer
-            from backend.openai_api import OpenAI
-            analyzer = ProcessAnalyzer(OpenAI(api_key=os.getenv('OPENAI_API_KEY')))
+            process_info = serialize_process(process, steps)
+            report_stage('parsed', name=process_info['name'], steps=len(process_info['steps']))
             
-            # Get analysis
-            analysis = analyzer.analyze_process(process_info)
+            # Get analysis; unchanged processes are served from the cache
+            analysis, cache_status = cached_analysis(
+                'analyze',
+                [process_fingerprint(process, steps, process_info)],
+                lambda: get_process_analyzer().analyze_process(process_info)
+            )
             
-            return jsonify(analysis)
+            response = jsonify(analysis)
+            response.headers['X-Analysis-Cache'] = cache_status
+            return response
             
         except Exception as e:
             logger.error(f"Error analyzing process: {str(e)}", exc_info=True)
@@ -440,23 +387,48 @@ Role: Finance"""
             if not process_name:
                 return jsonify({'error': 'Process name is required'}), 400
             
-            # Get all versions of the process
-            from backend.models import ERPProcess
-            versions = ERPProcess.query.filter_by(process_name=process_name)\
-                .order_by(ERPProcess.created_at.desc()).all()
-            
-            return jsonify([{
-                'id': version.id,
-                'version': '1.0',  # You might want to add version tracking
-                'created_at': version.created_at.isoformat(),
-                'updated_at': version.updated_at.isoformat()
-            } for version in versions])
+            # Narrow index-only listing; save_process records every version
+            # and init_database backfills rows written around it
+            return jsonify(process_versions.list_versions(process_name))
             
         except Exception as e:
             logger.error(f"Error listing process versions: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/process-versions/<path:process_name>/<int:version_number>', methods=['GET'])
+    def get_process_version(process_name, version_number):
+        try:
+            version = process_versions.get_version(process_name, version_number)
+            if version is None:
+                return jsonify({'error': 'Version not found'}), 404
+            return jsonify(version)
+            
+        except Exception as e:
+            logger.error(f"Error loading process version: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/process-versions/diff', methods=['POST'])
+    def diff_process_versions():
+        try:
+            data = request.get_json() or {}
+            process_name = data.get('process_name')
+            from_version = data.get('from_version')
+            to_version = data.get('to_version')
+            
+            if not process_name or from_version is None or to_version is None:
+                return jsonify({'error': 'process_name, from_version and to_version are required'}), 400
+            
+            diff = process_versions.diff_versions(process_name, int(from_version), int(to_version))
+            if diff is None:
+                return jsonify({'error': 'One or both versions not found'}), 404
+            return jsonify(diff)
+            
+        except Exception as e:
+            logger.error(f"Error diffing process versions: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/compare-processes', methods=['POST'])
+    @progress.streamable('compare-processes')
     def compare_processes():
         try:
             data = request.get_json()
@@ -466,69 +438,336 @@ Role: Finance"""
             if not current_process_id or not compare_process_id:
                 return jsonify({'error': 'Both process IDs are required'}), 400
             
-            # Get both processes
-            from backend.models import ERPProcess
-            current_process = ERPProcess.query.get(current_process_id)
-            compare_process = ERPProcess.query.get(compare_process_id)
-            
-            if not current_process or not compare_process:
+            # Both processes and their steps in one query
+            loaded = load_processes([current_process_id, compare_process_id])
+            if current_process_id not in loaded or compare_process_id not in loaded:
                 return jsonify({'error': 'One or both processes not found'}), 404
             
-            # Get steps for both processes
-            from backend.models import ERPProcessStep
-            current_steps = ERPProcessStep.query.filter_by(process_id=current_process_id)\
-                .order_by(ERPProcessStep.step_number).all()
-            compare_steps = ERPProcessStep.query.filter_by(process_id=compare_process_id)\
-                .order_by(ERPProcessStep.step_number).all()
-            
-            # Format process info for comparison
-            current_info = {
-                'name': current_process.process_name,
-                'system': current_process.erp_system,
-                'version': '1.0',
-                'steps': [{
-                    'number': step.step_number,
-                    'name': f'Step {step.step_number}',
-                    'description': step.step_description,
-                    'owner': step.approver_name,
-                    'role': step.approver_role
-                } for step in current_steps]
-            }
+            current_process, current_steps = loaded[current_process_id]
+            compare_process, compare_steps = loaded[compare_process_id]
+            current_info = serialize_process(current_process, current_steps)
+            compare_info = serialize_process(compare_process, compare_steps)
+            
+            # Added/removed/moved steps and owner/role changes are found
+            # locally; the LLM only sees the reworded, added and removed steps
+            diff = diff_processes(current_info, compare_info)
+            report_stage('parsed', structural_diff=diff['summary'])
+            if diff['trivial']:
+                response = jsonify({'structural_diff': diff, 'llm_skipped': True})
+                response.headers['X-Analysis-Cache'] = 'skipped'
+                return response
+            
+            current_residual, compare_residual = residual_processes(current_info, compare_info, diff)
+            # Unchanged residual pairs are served from the cache
+            comparison, cache_status = cached_analysis(
+                'compare_residual',
+                [json.dumps(current_residual, sort_keys=True), json.dumps(compare_residual, sort_keys=True)],
+                lambda: get_process_analyzer().compare_processes(current_residual, compare_residual)
+            )
+            
+            if isinstance(comparison, dict):
+                comparison = dict(comparison, structural_diff=diff, llm_skipped=False)
+            else:
+                comparison = {'comparison': comparison, 'structural_diff': diff, 'llm_skipped': False}
+            response = jsonify(comparison)
+            response.headers['X-Analysis-Cache'] = cache_status
+            return response
             
-            compare_info = {
-                'name': compare_process.process_name,
-                'system': compare_process.erp_system,
-                'version': '1.0',
-                'steps': [{
-                    'number': step.step_number,
-                    'name': f'Step {step.step_number}',
-                    'description': step.step_description,
-                    'owner': step.approver_name,
-                    'role': step.approver_role
-                } for step in compare_steps]
-            }
+        except Exception as e:
+            logger.error(f"Error comparing processes: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/processes/batch', methods=['POST'])
+    def get_processes_batch():
+        try:
+            data = request.get_json() or {}
+            process_ids = data.get('process_ids')
+            
+            if not isinstance(process_ids, list) or not process_ids:
+                return jsonify({'error': 'process_ids must be a non-empty list'}), 400
+            if len(process_ids) > MAX_BATCH_SIZE:
+                return jsonify({'error': f'At most {MAX_BATCH_SIZE} processes per request'}), 400
+            
+            loaded = load_processes(process_ids)
+            processes = serialize_processes(loaded, process_ids)
+            if data.get('include_diagrams'):
+                # Served from the stored diagrams; only changed processes are re-rendered
+                diagrams = {row.process_id: row for row in process_diagram.diagrams_for(loaded).values()}
+                for info in processes:
+                    info['mermaid_diagram'] = diagrams[info['id']].mermaid
+                    info['diagram_hash'] = diagrams[info['id']].content_hash
+            return jsonify({
+                'processes': processes,
+                'missing': [process_id for process_id in process_ids if process_id not in loaded]
+            })
             
-            # Initialize process analyzer
-            from backend.process_analyzer import ProcessAnalyzer
-            from backend.openai_api import OpenAI
-            analyzer = ProcessAnalyzer(OpenAI(api_key=os.getenv('OPENAI_API_KEY')))
+        except Exception as e:
+            logger.error(f"Error loading processes: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/processes/<int:process_id>/diagram', methods=['GET'])
+    def get_process_diagram(process_id):
+        try:
+            process, steps = load_process(process_id)
+            if process is None:
+                return jsonify({'error': 'Process not found'}), 404
             
-            # Get comparison
-            comparison = analyzer.compare_processes(current_info, compare_info)
+            row = process_diagram.diagrams_for({process_id: (process, steps)})[process_id]
+            etag = f'"{row.content_hash}"'
+            if etag in request.headers.get('If-None-Match', ''):
+                return '', 304, {'ETag': etag}
             
-            return jsonify(comparison)
+            # ?since=<content_hash> of the diagram the client holds: only the changed lines
+            response = jsonify(process_diagram.diagram_payload(row, since=request.args.get('since')))
+            response.headers['ETag'] = etag
+            return response
             
         except Exception as e:
-            logger.error(f"Error comparing processes: {str(e)}", exc_info=True)
+            logger.error(f"Error loading process diagram: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    def _rendered_diagram(process_id, render, mimetype):
+        process, steps = load_process(process_id)
+        if process is None:
+            return jsonify({'error': 'Process not found'}), 404
+        
+        # Laid out on the server and cached by diagram content, so views and
+        # exports do not need the client-side Mermaid layout
+        key, body = render(process_diagram.stored_diagram_source(process, steps))
+        headers = {'ETag': f'"{key}"', 'Cache-Control': 'no-cache'}
+        if headers['ETag'] in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype=mimetype, headers=headers)
+
+    @app.route('/api/processes/<int:process_id>/diagram.svg', methods=['GET'])
+    def get_process_diagram_svg(process_id):
+        try:
+            return _rendered_diagram(process_id, diagram_svg.render_svg, 'image/svg+xml')
+        except Exception as e:
+            logger.error(f"Error rendering process diagram SVG: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/processes/<int:process_id>/diagram.png', methods=['GET'])
+    def get_process_diagram_png(process_id):
+        try:
+            scale = min(max(float(request.args.get('scale', 1)), 0.25), 4)
+        except ValueError:
+            return jsonify({'error': 'scale must be a number'}), 400
+        try:
+            return _rendered_diagram(process_id, lambda info: diagram_svg.render_png(info, scale), 'image/png')
+        except diagram_svg.DiagramRenderError as e:
+            return jsonify({'error': str(e), 'type': 'unsupported_format'}), 501
+        except Exception as e:
+            logger.error(f"Error rendering process diagram PNG: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/processes/<int:process_id>/report.pdf', methods=['GET'])
+    def get_process_report_pdf(process_id):
+        """PDF export of a process: the server-side diagram followed by its steps"""
+        try:
+            process, steps = load_process(process_id)
+            if process is None:
+                return jsonify({'error': 'Process not found'}), 404
+
+            process_info = serialize_process(process, steps)
+            pdf = FPDF()
+            pdf.set_auto_page_break(True, margin=15)
+            pdf.add_page()
+            pdf.set_font('Helvetica', 'B', 16)
+            pdf.cell(0, 10, diagram_svg.pdf_text(process_info['name'] or f'Process {process_id}'), ln=True)
+            pdf.set_font('Helvetica', size=10)
+            pdf.cell(0, 6, diagram_svg.pdf_text(f"System: {process_info['system'] or 'Unknown'}"), ln=True)
+            pdf.ln(4)
+
+            # Same layout as diagram.svg, drawn with FPDF lines and boxes
+            diagram_svg.draw_on_pdf(pdf, process_diagram.stored_diagram_source(process, steps))
+            pdf.ln(6)
+
+            pdf.set_font('Helvetica', 'B', 12)
+            pdf.cell(0, 8, 'Steps', ln=True)
+            pdf.set_font('Helvetica', size=10)
+            for step in process_info['steps']:
+                owner = ', '.join(part for part in (step['owner'], step['role']) if part)
+                pdf.multi_cell(0, 5, diagram_svg.pdf_text(
+                    f"{step['number']}. {step['description'] or ''}" + (f" ({owner})" if owner else '')))
+
+            body = pdf.output(dest='S')
+            # PyFPDF returns a latin-1 str, fpdf2 a bytearray
+            body = body.encode('latin-1') if isinstance(body, str) else bytes(body)
+            return Response(body, mimetype='application/pdf', headers={
+                'Content-Disposition': f'attachment; filename="process-{process_id}.pdf"'
+            })
+
+        except Exception as e:
+            logger.error(f"Error exporting process report: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    def _kind_param(value):
+        if value in (None, ''):
+            return None
+        if value not in ('erp', 'tobe'):
+            raise ValueError("kind must be 'erp' or 'tobe'")
+        return step_similarity.KIND_TOBE if value == 'tobe' else step_similarity.KIND_ERP
+
+    @app.route('/api/steps/similar', methods=['POST'])
+    def similar_steps():
+        try:
+            data = request.get_json() or {}
+            text = data.get('text')
+            if not text:
+                return jsonify({'error': 'text is required'}), 400
+            
+            index = step_similarity.get_step_index()
+            if index is None:
+                return jsonify({'error': 'Step index has not been built yet'}), 503
+            
+            k = max(1, min(int(data.get('k', 10)), 100))
+            return jsonify({'results': index.search_steps(text, k=k, kind=_kind_param(data.get('kind')))})
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error searching similar steps: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/processes/similar', methods=['POST'])
+    def similar_processes():
+        try:
+            data = request.get_json() or {}
+            process_id = data.get('process_id')
+            source_kind = data.get('source_kind', 'erp')
+            
+            index = step_similarity.get_step_index()
+            if index is None:
+                return jsonify({'error': 'Step index has not been built yet'}), 503
+            
+            exclude = None
+            if process_id is not None:
+                texts = [step['description'] for step in step_similarity.load_steps(source_kind, process_id)]
+                exclude = (_kind_param(source_kind), int(process_id))
+            else:
+                texts = [text for text in data.get('steps', []) if isinstance(text, str)]
+            if not texts:
+                return jsonify({'error': 'process_id or a list of step descriptions is required'}), 400
+            
+            k = max(1, min(int(data.get('k', 10)), 100))
+            return jsonify({'results': index.search_processes(texts, k=k, kind=_kind_param(data.get('kind')),
+                                                              exclude=exclude)})
+            
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error searching similar processes: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/gap-analysis/align', methods=['POST'])
+    def align_gap_analysis_steps():
+        try:
+            data = request.get_json() or {}
+            asis_process_id = data.get('asis_process_id')
+            tobe_process_id = data.get('tobe_process_id')
+            
+            if not asis_process_id or not tobe_process_id:
+                return jsonify({'error': 'Both asis_process_id and tobe_process_id are required'}), 400
+            
+            # Local pre-alignment of AS-IS and TO-BE steps, no LLM call
+            alignment = step_similarity.align_steps(
+                step_similarity.load_steps('erp', asis_process_id),
+                step_similarity.load_steps('tobe', tobe_process_id),
+                threshold=float(data['threshold']) if data.get('threshold') is not None else None
+            )
+            return jsonify(alignment)
+            
+        except Exception as e:
+            logger.error(f"Error aligning process steps: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/gap-analysis/batch', methods=['POST'])
+    def submit_batch_gap_analysis():
+        """Start gap analysis for every AS-IS / TO-BE pair matching the filter"""
+        try:
+            data = request.get_json() or {}
+            if not any(data.get(key) for key in ('erp_system', 'category', 'standard_type')):
+                return jsonify({'error': 'At least one of erp_system, category or standard_type is required'}), 400
+            if data.get('erp_system') and data.get('category'):
+                return jsonify({'error': 'category is stored in erp_system; filter by one of them, not both'}), 400
+            
+            job = batch_gap_jobs.create(data.get('erp_system'), data.get('category'), data.get('standard_type'))
+            return jsonify(dict(job.to_dict(), status_url=f'/api/gap-analysis/batch/{job.id}')), 202
+            
+        except Exception as e:
+            logger.error(f"Error starting batch gap analysis: {str(e)}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/gap-analysis/batch/<job_id>', methods=['GET'])
+    def get_batch_gap_analysis(job_id):
+        job = batch_gap_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/gap-analysis/batch/<job_id>/resume', methods=['POST'])
+    def resume_batch_gap_analysis(job_id):
+        job = batch_gap_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if not batch_gap_jobs.resume(job_id):
+            return jsonify({'error': f'Job is {job.status} and cannot be resumed'}), 409
+        return jsonify(batch_gap_jobs.get(job_id).to_dict()), 202
+
+    @app.route('/api/llm/metrics', methods=['GET'])
+    def llm_metrics():
+        return jsonify({
+            'llm': get_llm_client().metrics.snapshot(),
+            'cache': {
+                'document_extraction': get_cache('document_extraction').stats(),
+                'process_analysis': get_cache('process_analysis').stats(),
+                'tobe_generation': get_cache('tobe_generation').stats()
+            }
+        })
+
+    profile.finish(app)
+
     # Return both app and socketio
     if socketio_available and socketio:
         return app, socketio
     return app, None
 
+def create_wsgi_app():
+    """WSGI entry point for gunicorn (``app:create_wsgi_app()``, see gunicorn.conf.py).
+
+    With ``preload_app`` this runs once in the master, so nothing here may
+    start threads or hold connections; init_worker does that per worker.
+    """
+    app, _ = create_app(resume_jobs=False)
+    return app
+
+def resume_pending_jobs(app):
+    """Restart extraction and batch gap analysis jobs left by a previous process"""
+    try:
+        app.extensions['extraction_jobs'].resume_pending()
+        app.extensions['batch_gap_analysis'].resume_pending()
+    except Exception as e:
+        logger.error(f"Could not resume pending jobs in worker {os.getpid()}: {str(e)}")
+
+def init_worker(app):
+    """Per-worker setup after the fork: fresh database connections and job resumption"""
+    from backend.models import db
+    with app.app_context():
+        # Connections opened in the master must not be shared between workers
+        db.engine.dispose()
+    if os.environ.get('BPM_SERVER_ROLE', 'api') == 'realtime':
+        # Jobs parse PDFs and fan out LLM calls; they stay on the API workers,
+        # not under the eventlet loop holding the sockets
+        return
+    resume_pending_jobs(app)
+
 if __name__ == '__main__':
-    app, socketio = create_app()
+    app, socketio = create_app(resume_jobs=False)
+    # The development server sets up its own schema before resuming jobs;
+    # deployments run create_tables.py
+    init_database(app)
+    resume_pending_jobs(app)
     if socketio_available and socketio:
         socketio.run(app, host='0.0.0.0', port=5000, debug=True)
     else:
@@ -0,0 +1,432 @@
+"""
+Batch gap analysis across many AS-IS / TO-BE process pairs.
+
+A job selects every AS-IS process matching a filter (ERP system, category,
+standard type) together with its TO-BE processes, records one item per pair
+and then analyses the pairs concurrently through the shared, rate-limited
+LLM client. Results are written in checkpoints: each checkpoint bulk-inserts
+the GapAnalysis/GapFinding rows for a group of finished pairs and marks those
+items done in the same transaction. An interrupted job therefore resumes
+exactly where it stopped, without duplicating analyses, either when a worker
+restarts (stale running jobs are picked up like extraction jobs) or from the
+command line with ``--resume``.
+
+The seed data stores a process's category in ``erp_system``, so ``category``
+is matched against that column and cannot be combined with ``erp_system``.
+Resuming a job also retries the pairs that failed (e.g. on a transient LLM
+error); pairs already analysed are kept.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from backend.models import db
+from llm_client import get_llm_client
+from llm_stream import repair_json
+from process_queries import load_processes
+from process_repository import save_gap_analyses
+from step_similarity import align_steps
+
+logger = logging.getLogger(__name__)
+
+GAP_MODEL = os.environ.get('BATCH_GAP_MODEL', os.environ.get('OPENAI_MODEL', 'gpt-4'))
+GAP_CONCURRENCY = int(os.environ.get('BATCH_GAP_CONCURRENCY', 4))
+CHECKPOINT_SIZE = int(os.environ.get('BATCH_GAP_CHECKPOINT_SIZE', 20))
+
+GAP_PROMPT = """Compare this AS-IS process with its TO-BE process ({standard_type} standard) and list the gaps.
+
+AS-IS process: {asis_name}
+{asis_steps}
+
+TO-BE process: {tobe_name}
+{tobe_steps}
+
+Pre-aligned step pairs (AS-IS -> TO-BE, similarity): {pairs}
+AS-IS steps with no TO-BE counterpart: {unmatched_asis}
+TO-BE steps with no AS-IS counterpart: {unmatched_tobe}
+
+Return ONLY a JSON object:
+{{"summary": "two or three sentence overview",
+  "findings": [{{"finding_type": "missing_step|redundant_step|changed_step|automation|control|role",
+                 "description": "...", "recommendation": "...",
+                 "impact": "High|Medium|Low", "effort": "High|Medium|Low"}}]}}"""
+
+
+class BatchGapJob(db.Model):
+    __tablename__ = 'batch_gap_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)
+    filters = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    pairs_per_minute = db.Column(db.Float)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        remaining = self.total - self.completed - self.failed
+        eta = remaining / self.pairs_per_minute * 60 if self.pairs_per_minute and self.status == 'running' else None
+        return {
+            'job_id': self.id,
+            'filters': json.loads(self.filters),
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'progress': round((self.completed + self.failed) / self.total, 4) if self.total else 1.0,
+            'pairs_per_minute': self.pairs_per_minute,
+            'eta_seconds': round(eta) if eta is not None else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class BatchGapItem(db.Model):
+    __tablename__ = 'batch_gap_items'
+    __table_args__ = (
+        db.Index('ix_batch_gap_items_job_id_status', 'job_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), db.ForeignKey('batch_gap_jobs.id', ondelete='CASCADE'), nullable=False)
+    asis_process_id = db.Column(db.Integer, nullable=False)
+    tobe_process_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    analysis_id = db.Column(db.Integer)
+    error = db.Column(db.Text)
+
+
+def select_pairs(erp_system=None, category=None, standard_type=None, session=None):
+    """(asis_process_id, tobe_process_id) pairs matching the filter"""
+    if erp_system and category:
+        raise ValueError('category is stored in erp_system; filter by one of them, not both')
+    from backend.models.erp_process import ERPProcess
+    from backend.models.tobe_process import ToBeProcess
+    session = session or db.session
+    query = session.query(ERPProcess.id, ToBeProcess.id)\
+        .join(ToBeProcess, ToBeProcess.related_asis_id == ERPProcess.id)
+    if erp_system or category:
+        query = query.filter(ERPProcess.erp_system == (erp_system or category))
+    if standard_type:
+        query = query.filter(ToBeProcess.standard_type == standard_type)
+    return query.order_by(ERPProcess.id, ToBeProcess.id).all()
+
+
+def _load_tobe_processes(tobe_ids, session):
+    """{tobe_id: {'name', 'standard_type', 'steps'}} in two queries"""
+    from backend.models.tobe_process import ToBeProcess, ToBeProcessStep
+    processes = {row.id: {'name': row.process_name, 'standard_type': row.standard_type, 'steps': []}
+                 for row in session.query(ToBeProcess.id, ToBeProcess.process_name, ToBeProcess.standard_type)
+                 .filter(ToBeProcess.id.in_(tobe_ids))}
+    steps = session.query(ToBeProcessStep.process_id, ToBeProcessStep.step_number,
+                          ToBeProcessStep.step_description, ToBeProcessStep.approver_role)\
+        .filter(ToBeProcessStep.process_id.in_(tobe_ids))\
+        .order_by(ToBeProcessStep.process_id, ToBeProcessStep.step_number)
+    for process_id, number, description, role in steps:
+        processes[process_id]['steps'].append({'number': number, 'description': description or '', 'role': role or ''})
+    return processes
+
+
+def _format_steps(steps):
+    return '\n'.join(f"{step['number']}. {step['description']} ({step.get('role') or 'unassigned'})"
+                     for step in steps) or '(no steps)'
+
+
+def analyze_pair(asis, tobe):
+    """One LLM gap analysis for a pair; returns {'summary', 'findings'}"""
+    alignment = align_steps(asis['steps'], tobe['steps'])
+    prompt = GAP_PROMPT.format(
+        standard_type=tobe['standard_type'],
+        asis_name=asis['name'],
+        asis_steps=_format_steps(asis['steps']),
+        tobe_name=tobe['name'],
+        tobe_steps=_format_steps(tobe['steps']),
+        pairs=', '.join(f"{pair['asis']['number']}->{pair['target']['number']} ({pair['score']:.2f})"
+                        for pair in alignment['pairs']) or 'none',
+        unmatched_asis=', '.join(str(step['number']) for step in alignment['unmatched_asis']) or 'none',
+        unmatched_tobe=', '.join(str(step['number']) for step in alignment['unmatched_target']) or 'none'
+    )
+    content = get_llm_client().chat_text([{"role": "user", "content": prompt}], model=GAP_MODEL, temperature=0)
+    result, repaired = repair_json(content)
+    if not isinstance(result, dict):
+        raise ValueError(f"Expected a JSON object from the gap analysis, got {type(result).__name__}")
+    if repaired:
+        logger.warning(f"Repaired malformed gap analysis reply for '{asis['name']}'")
+    return {
+        'summary': result.get('summary', ''),
+        'findings': [finding for finding in result.get('findings', []) if isinstance(finding, dict)]
+    }
+
+
+class BatchGapAnalysisRunner:
+    """Creates batch gap-analysis jobs and runs them on a background thread"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.stale_after = timedelta(seconds=int(os.environ.get('BATCH_GAP_STALE_SECONDS', 600)))
+        # Jobs run one at a time; each job fans out to GAP_CONCURRENCY analyses
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='batch-gap')
+        app.extensions['batch_gap_analysis'] = self
+
+    def create(self, erp_system=None, category=None, standard_type=None, start=True):
+        """Record a job with one item per matching pair; returns the job"""
+        filters = {'erp_system': erp_system, 'category': category, 'standard_type': standard_type}
+        pairs = select_pairs(erp_system, category, standard_type)
+        job = BatchGapJob(id=str(uuid.uuid4()), filters=json.dumps(filters), total=len(pairs),
+                          status='queued' if pairs else 'completed')
+        db.session.add(job)
+        db.session.flush()
+        if pairs:
+            db.session.execute(BatchGapItem.__table__.insert(), [{
+                'job_id': job.id, 'asis_process_id': asis_id, 'tobe_process_id': tobe_id, 'status': 'pending'
+            } for asis_id, tobe_id in pairs])
+        db.session.commit()
+        logger.info(f"Created batch gap analysis job {job.id} with {len(pairs)} pairs")
+        if start and pairs:
+            self.executor.submit(self.run, job.id)
+        return job
+
+    def get(self, job_id):
+        return db.session.get(BatchGapJob, job_id)
+
+    def resume(self, job_id):
+        """Queue an interrupted, failed or partly failed job again; failed items are retried, done ones kept"""
+        if not requeue(job_id):
+            return False
+        self.executor.submit(self.run, job_id)
+        return True
+
+    def resume_pending(self):
+        """Re-queue jobs left behind by a previous (or crashed) worker"""
+        with self.app.app_context():
+            stale_before = datetime.utcnow() - self.stale_after
+            BatchGapJob.query.filter(
+                BatchGapJob.status == 'running',
+                BatchGapJob.updated_at < stale_before
+            ).update({'status': 'queued'}, synchronize_session=False)
+            db.session.commit()
+            job_ids = [row.id for row in db.session.query(BatchGapJob.id)
+                       .filter(BatchGapJob.status == 'queued')
+                       .order_by(BatchGapJob.created_at)]
+        for job_id in job_ids:
+            self.executor.submit(self.run, job_id)
+        if job_ids:
+            logger.info(f"Resumed {len(job_ids)} pending batch gap analysis jobs")
+
+    def run(self, job_id, on_progress=None):
+        """Claim and run a job inside the app context"""
+        with self.app.app_context():
+            try:
+                run_job(job_id, on_progress)
+            except Exception as e:
+                logger.error(f"Batch gap analysis job {job_id} failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+                BatchGapJob.query.filter_by(id=job_id).update(
+                    {'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+
+def requeue(job_id, stale_before=None):
+    """Queue a stopped job again, retrying its failed items; returns whether it was queued.
+
+    A running job is only taken over when ``stale_before`` is given and its
+    last checkpoint is older than that, so a job another worker is still
+    running is never analysed twice.
+    """
+    resumable = db.or_(BatchGapJob.status.in_(['failed', 'interrupted']),
+                       db.and_(BatchGapJob.status == 'completed', BatchGapJob.failed > 0))
+    if stale_before is not None:
+        resumable = db.or_(resumable, db.and_(BatchGapJob.status == 'running',
+                                              BatchGapJob.updated_at < stale_before))
+    updated = BatchGapJob.query.filter(BatchGapJob.id == job_id, resumable)\
+        .update({'status': 'queued', 'error': None}, synchronize_session=False)
+    if updated:
+        _retry_failed_items(job_id)
+    db.session.commit()
+    return updated == 1
+
+
+def _retry_failed_items(job_id):
+    """Put a job's failed items back to pending and take them off its failed counter"""
+    retried = BatchGapItem.query.filter_by(job_id=job_id, status='failed').update(
+        {'status': 'pending', 'error': None}, synchronize_session=False
+    )
+    if retried:
+        BatchGapJob.query.filter_by(id=job_id).update(
+            {'failed': BatchGapJob.failed - retried}, synchronize_session=False
+        )
+        logger.info(f"Retrying {retried} failed pairs of batch gap analysis job {job_id}")
+    return retried
+
+
+def _claim(job_id):
+    # Atomic queued -> running transition so only one worker runs a job
+    now = datetime.utcnow()
+    claimed = BatchGapJob.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'started_at': now, 'updated_at': now},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _checkpoint(job_id, results, counters, pairs_per_minute):
+    """Persist finished pairs: analyses, findings, item status and job counters in one transaction"""
+    succeeded = [(item_id, pair, result) for item_id, pair, result, error in results if error is None]
+    analysis_ids = save_gap_analyses([{
+        'asis_process_id': pair[0],
+        'tobe_process_id': pair[1],
+        'summary': result['summary'],
+        'findings': result['findings']
+    } for _, pair, result in succeeded], commit=False) if succeeded else []
+
+    item_updates = [{'id': item_id, 'status': 'done', 'analysis_id': analysis_id, 'error': None}
+                    for (item_id, _, _), analysis_id in zip(succeeded, analysis_ids)]
+    item_updates += [{'id': item_id, 'status': 'failed', 'analysis_id': None, 'error': error}
+                     for item_id, _, _, error in results if error is not None]
+    db.session.bulk_update_mappings(BatchGapItem, item_updates)
+
+    counters['completed'] += len(succeeded)
+    counters['failed'] += len(results) - len(succeeded)
+    BatchGapJob.query.filter_by(id=job_id).update({
+        'completed': counters['completed'],
+        'failed': counters['failed'],
+        'pairs_per_minute': pairs_per_minute,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def run_job(job_id, on_progress=None, concurrency=None):
+    """Analyse the pending items of a job, checkpointing every CHECKPOINT_SIZE pairs"""
+    if not _claim(job_id):
+        logger.info(f"Batch gap analysis job {job_id} is not queued; skipping")
+        return
+    concurrency = concurrency or GAP_CONCURRENCY
+    job = db.session.get(BatchGapJob, job_id)
+    counters = {'completed': job.completed, 'failed': job.failed}
+    items = db.session.query(BatchGapItem.id, BatchGapItem.asis_process_id, BatchGapItem.tobe_process_id)\
+        .filter(BatchGapItem.job_id == job_id, BatchGapItem.status == 'pending')\
+        .order_by(BatchGapItem.id)\
+        .all()
+    logger.info(f"Running batch gap analysis job {job_id}: {len(items)} of {job.total} pairs pending")
+
+    started = time.monotonic()
+    processed = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-gap-pair') as pool:
+        for offset in range(0, len(items), CHECKPOINT_SIZE):
+            group = items[offset:offset + CHECKPOINT_SIZE]
+            asis = load_processes({item.asis_process_id for item in group})
+            tobe = _load_tobe_processes({item.tobe_process_id for item in group}, db.session)
+
+            futures = {}
+            results = []
+            for item in group:
+                pair = (item.asis_process_id, item.tobe_process_id)
+                if pair[0] not in asis or pair[1] not in tobe:
+                    results.append((item.id, pair, None, 'Process no longer exists'))
+                    continue
+                process, steps = asis[pair[0]]
+                asis_info = {'name': process.process_name, 'steps': [{
+                    'number': step.step_number,
+                    'description': step.step_description or '',
+                    'role': step.approver_role or ''
+                } for step in steps]}
+                futures[pool.submit(analyze_pair, asis_info, tobe[pair[1]])] = (item.id, pair)
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item_id, pair = futures[future]
+                    try:
+                        results.append((item_id, pair, future.result(), None))
+                    except Exception as e:
+                        logger.error(f"Gap analysis of {pair} failed: {str(e)}")
+                        results.append((item_id, pair, None, str(e)))
+
+            processed += len(results)
+            elapsed = time.monotonic() - started
+            pairs_per_minute = round(processed / elapsed * 60, 2) if elapsed > 0 else None
+            _checkpoint(job_id, results, counters, pairs_per_minute)
+            logger.info(f"Batch gap analysis job {job_id}: {counters['completed'] + counters['failed']}/{job.total} "
+                        f"pairs ({pairs_per_minute} pairs/min)")
+            if on_progress:
+                on_progress(db.session.get(BatchGapJob, job_id).to_dict())
+
+    BatchGapJob.query.filter_by(id=job_id).update(
+        {'status': 'completed', 'finished_at': datetime.utcnow(), 'updated_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    logger.info(f"Batch gap analysis job {job_id} completed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run gap analysis for every matching AS-IS / TO-BE pair')
+    parser.add_argument('--erp-system')
+    parser.add_argument('--category')
+    parser.add_argument('--standard-type')
+    parser.add_argument('--resume', metavar='JOB_ID', help='continue an interrupted job')
+    parser.add_argument('--concurrency', type=int, default=GAP_CONCURRENCY)
+    args = parser.parse_args()
+    if args.erp_system and args.category:
+        parser.error('--category is stored in erp_system; use either --erp-system or --category')
+
+    from app import create_app
+    # Other pending jobs stay with the API workers
+    app, _ = create_app(resume_jobs=False)
+
+    def report(progress):
+        print(f"{progress['completed'] + progress['failed']}/{progress['total']} pairs "
+              f"({progress['failed']} failed), {progress['pairs_per_minute']} pairs/min, "
+              f"ETA {progress['eta_seconds']}s")
+
+    with app.app_context():
+        runner = app.extensions.get('batch_gap_analysis') or BatchGapAnalysisRunner(app)
+        if args.resume:
+            # A job killed at the command line is still marked running; take it
+            # over only once its heartbeat is stale, never while a worker runs it
+            if not requeue(args.resume, stale_before=datetime.utcnow() - runner.stale_after):
+                job = db.session.get(BatchGapJob, args.resume)
+                print(f"Job {args.resume} " + (f"is {job.status} and cannot be resumed yet" if job else "not found"))
+                return
+            job_id = args.resume
+        else:
+            job_id = runner.create(args.erp_system, args.category, args.standard_type, start=False).id
+            print(f"Job {job_id}: resume with --resume {job_id} if interrupted")
+        try:
+            run_job(job_id, report, concurrency=args.concurrency)
+        except KeyboardInterrupt:
+            db.session.rollback()
+            BatchGapJob.query.filter_by(id=job_id).update({'status': 'interrupted'}, synchronize_session=False)
+            db.session.commit()
+            print(f"Interrupted; resume with --resume {job_id}")
+            return
+        print(json.dumps(db.session.get(BatchGapJob, job_id).to_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark the gunicorn server profiles against each other.
+
+For each profile the script starts gunicorn with gunicorn.conf.py (unless
+--url points at a server that is already running), opens ``--hold`` long-lived
+connections the way Socket.IO long-polling and SSE clients do, and
+meanwhile fires ``--requests`` requests at ``--path`` from ``--concurrency``
+threads. It prints throughput, latency percentiles and errors per profile,
+which shows how each worker model copes with ordinary requests while many
+connections are parked on it.
+
+    python bench_server.py --profiles sync,api,realtime --hold 50
+    python bench_server.py --url http://localhost:5000 --path /api/llm/metrics
+
+Profiles:
+    sync      4 sync workers, the previous configuration
+    api       gthread workers sized from CPU/memory, preloaded app
+    realtime  eventlet worker
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PROFILES = {
+    'sync': {'BPM_SERVER_ROLE': 'api', 'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_WORKERS': '4',
+             'GUNICORN_THREADS': '1', 'SOCKETIO_ASYNC_MODE': 'threading'},
+    'api': {'BPM_SERVER_ROLE': 'api'},
+    'realtime': {'BPM_SERVER_ROLE': 'realtime'},
+}
+HOLD_PATH = '/socket.io/?EIO=4&transport=polling'
+
+
+def start_server(profile, port):
+    env = dict(os.environ, PORT=str(port), GUNICORN_ACCESS_LOG='', **PROFILES[profile])
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode} for profile '{profile}'")
+        try:
+            requests.get(url + '/', timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"gunicorn did not answer within 60s for profile '{profile}'")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def hold_connections(url, count, stop):
+    """Keep count long-poll requests open until stop is set"""
+    def hold():
+        session = requests.Session()
+        while not stop.is_set():
+            try:
+                session.get(url + HOLD_PATH, timeout=30)
+            except requests.RequestException:
+                time.sleep(0.1)
+
+    threads = [threading.Thread(target=hold, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_load(url, path, total, concurrency, timeout):
+    local = threading.local()
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = session.get(url + path, timeout=timeout).status_code < 500
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return {
+        'requests_per_second': len(results) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else float('nan'),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'errors': sum(1 for _, ok in results if not ok)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gunicorn server profiles')
+    parser.add_argument('--profiles', default='sync,api,realtime', help='comma separated profiles to start')
+    parser.add_argument('--url', help='benchmark a running server instead of starting profiles')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--path', default='/', help='path requested under load')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--hold', type=int, default=20, help='long-lived connections held during the run')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    targets = [('url', args.url)] if args.url else [(name, None) for name in args.profiles.split(',')]
+    print(f"{'profile':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, url in targets:
+        process = None
+        if url is None:
+            process, url = start_server(name, args.port)
+        stop = threading.Event()
+        try:
+            hold_connections(url, args.hold, stop)
+            time.sleep(1)
+            result = run_load(url, args.path, args.requests, args.concurrency, args.timeout)
+            print(f"{name:<10} {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}")
+        finally:
+            stop.set()
+            if process is not None:
+                stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
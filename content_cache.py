@@ -0,0 +1,199 @@
+"""
+Content-addressed result cache for expensive AI calls.
+
+Entries are stored in a small SQLite file (shared by all gunicorn workers on a
+node) and keyed by a SHA-256 over the input content plus whatever model/prompt
+version produced the result. Old and least recently used entries are evicted
+once the cache grows past its entry/size limits or an entry exceeds its age.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ai_cache.db')
+
+
+def content_hash(*parts):
+    """Return a stable SHA-256 hex digest over bytes/str parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        elif isinstance(part, str):
+            part = part.encode('utf-8')
+        elif not isinstance(part, (bytes, bytearray, memoryview)):
+            part = str(part).encode('utf-8')
+        # Length-prefix each part so ('ab', 'c') and ('a', 'bc') differ
+        digest.update(str(len(part)).encode('ascii') + b':')
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """SQLite-backed key/value cache with size- and age-based eviction"""
+
+    def __init__(self, namespace, path=None, max_entries=1000, max_bytes=50 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.namespace = namespace
+        self.path = path or os.environ.get('AI_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed "
+                "ON cache_entries (namespace, accessed_at)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    namespace TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_stats (namespace) VALUES (?)", (namespace,))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row and self.max_age and now - row[1] > self.max_age:
+                conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+                row = None
+            if row:
+                conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key)
+                )
+            column = 'hits' if row else 'misses'
+            conn.execute(f"UPDATE cache_stats SET {column} = {column} + 1 WHERE namespace = ?", (self.namespace,))
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def set(self, key, value):
+        """Store value (a string) under key and evict anything over the limits"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, len(value.encode('utf-8')), now, now)
+            )
+            self._evict(conn, now)
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self, conn, now):
+        if self.max_age:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.max_age)
+            )
+
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until both limits are satisfied
+        evicted = 0
+        rows = conn.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC",
+            (self.namespace,)
+        ).fetchall()
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+            count -= 1
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from '{self.namespace}' cache")
+
+    def stats(self):
+        """Return hit/miss counters for this worker and for all workers"""
+        with self._connect() as conn:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+            hits, misses = conn.execute(
+                "SELECT hits, misses FROM cache_stats WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return {
+            'namespace': self.namespace,
+            'entries': count,
+            'size_bytes': total,
+            'hits': hits,
+            'misses': misses,
+            'worker_hits': self.hits,
+            'worker_misses': self.misses
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _setting(namespace, name, default):
+    # AI_CACHE_<NAMESPACE>_<NAME> overrides AI_CACHE_<NAME> for one namespace
+    value = os.environ.get(f'AI_CACHE_{namespace.upper()}_{name}')
+    return float(value if value is not None else os.environ.get(f'AI_CACHE_{name}', default))
+
+
+def get_cache(namespace):
+    """Return the process-wide cache for a namespace, configured from the environment"""
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = ContentCache(
+                namespace,
+                max_entries=int(_setting(namespace, 'MAX_ENTRIES', 1000)),
+                max_bytes=int(_setting(namespace, 'MAX_MB', 50) * 1024 * 1024),
+                max_age=int(_setting(namespace, 'MAX_AGE_DAYS', 30) * 24 * 3600)
+            )
+        return _caches[namespace]
@@ -1,17 +1,20 @@
-from app import create_app
-from backend.models import db
+from app import create_app, init_database
 
 def create_tables():
-    """Create database tables directly using SQLAlchemy"""
-    app = create_app()
+    """Create the database tables and apply migrations.
+
+    Run this once per deploy, before starting the workers: create_app no
+    longer creates the schema on boot.
+    """
+    app, _ = create_app(resume_jobs=False)
     
-    with app.app_context():
-        # Create all tables
-        try:
-            db.create_all()
-            print("Successfully created all database tables!")
-        except Exception as e:
-            print(f"Error creating tables: {str(e)}")
+    # Create all tables
+    try:
+        init_database(app)
+        print("Successfully created all database tables!")
+    except Exception as e:
+        print(f"Error creating tables: {str(e)}")
+        raise
 
 if __name__ == "__main__":
     create_tables()
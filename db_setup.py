@@ -1,25 +1,17 @@
-from app import create_app
-from backend.models import db, ERPProcess, ERPProcessStep
-from datetime import datetime
+from app import create_app, init_database
+from backend.models import db
+from process_repository import save_process
 
 def setup_database():
     """Initialize the database with tables and sample data"""
-    app = create_app()
+    app, _ = create_app(resume_jobs=False)
     
-    with app.app_context():
-        # Create all tables
-        db.create_all()
-        print("Database tables created successfully!")
+    # Create all tables
+    init_database(app)
+    print("Database tables created successfully!")
 
+    with app.app_context():
         # Add sample data
-        sample_po_process = ERPProcess(
-            process_name="Purchase Order Approval",
-            erp_system="SAP",
-            created_at=datetime.utcnow()
-        )
-        db.session.add(sample_po_process)
-        db.session.flush()  # Get the ID before adding steps
-
         po_steps = [
             (1, "PO Creation by Requester", "Requester", "John Smith"),
             (2, "Department Manager Review", "Manager", "Sarah Johnson"),
@@ -28,16 +20,16 @@ def setup_database():
             (5, "PO Generation", "System", "Automated")
         ]
 
-        for step_num, desc, role, name in po_steps:
-            step = ERPProcessStep(
-                process_id=sample_po_process.id,
-                step_number=step_num,
-                step_description=desc,
-                approver_role=role,
-                approver_name=name,
-                created_at=datetime.utcnow()
-            )
-            db.session.add(step)
+        save_process({
+            'process_name': "Purchase Order Approval",
+            'erp_system': "SAP",
+            'steps': [{
+                'step_number': step_num,
+                'step_description': desc,
+                'approver_role': role,
+                'approver_name': name
+            } for step_num, desc, role, name in po_steps]
+        }, commit=False)
 
         try:
             db.session.commit()
@@ -0,0 +1,466 @@
+"""
+Server-side layout and rendering of process diagrams.
+
+The frontend draws every process with Mermaid, which pulls the
+flowDiagram/dagre/graph/layout chunks into the browser. ``render_svg``
+lays the same step graph out on the server (``process_flowchart.diagram_graph``)
+with a small layered layout in pure Python and returns a standalone SVG:
+
+1. cycles are broken by reversing DFS back edges,
+2. steps are ranked by longest path and long edges get virtual nodes,
+3. a few barycenter sweeps reduce edge crossings within each rank,
+4. x positions follow the neighbours' centres, then are spread to remove
+   overlaps.
+
+SVGs are cached by diagram content hash in the shared content cache, so a
+diagram is laid out once per change rather than once per view. PNGs are
+available when the optional ``cairosvg`` package is installed, and
+``draw_on_pdf`` draws the same layout with FPDF primitives for the PDF
+process report (``/api/processes/<id>/report.pdf``).
+"""
+import base64
+import html
+import logging
+import textwrap
+
+from content_cache import content_hash, get_cache
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when layout or styling changes so cached SVGs are replaced
+LAYOUT_VERSION = '1'
+
+CHAR_WIDTH = 7
+LINE_HEIGHT = 16
+PADDING = 12
+NODE_MIN_WIDTH = 140
+NODE_MAX_WIDTH = 240
+WRAP_CHARS = 30
+MAX_TITLE_LINES = 3
+RANK_GAP = 56
+NODE_GAP = 32
+MARGIN = 20
+ORDER_SWEEPS = 4
+POSITION_SWEEPS = 3
+FONT_SIZE = 12
+
+# kind -> (fill, stroke)
+NODE_COLORS = {
+    'start': ('#e8f5e9', '#2e7d32'),
+    'end': ('#e8f5e9', '#2e7d32'),
+    'decision': ('#fff8e1', '#f9a825'),
+    'task': ('#eef4ff', '#4a6fa5'),
+}
+EDGE_COLOR = '#555555'
+# Millimetres per SVG pixel at 96 dpi
+PX_TO_MM = 25.4 / 96
+
+
+class DiagramRenderError(Exception):
+    """Raised when a diagram cannot be rendered in the requested format"""
+
+
+class LayoutNode:
+    """A step (or a virtual bend point of a long edge) with its box"""
+
+    def __init__(self, node_id, rank, width=0.0, height=0.0, title_lines=(), owner='', kind=None):
+        self.id = node_id
+        self.rank = rank
+        self.width = width
+        self.height = height
+        self.title_lines = list(title_lines)
+        self.owner = owner
+        # None marks a virtual node
+        self.kind = kind
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def virtual(self):
+        return self.kind is None
+
+
+class LayoutEdge:
+    def __init__(self, source, target, label, points, loop=False):
+        self.source = source
+        self.target = target
+        self.label = label
+        self.points = points
+        self.loop = loop
+
+
+class DiagramLayout:
+    def __init__(self, nodes, edges, width, height):
+        self.nodes = nodes
+        self.edges = edges
+        self.width = width
+        self.height = height
+
+
+def _node_box(node):
+    """(title lines, width, height) for a node's text"""
+    title_lines = textwrap.wrap(node['title'], WRAP_CHARS) or ['']
+    if len(title_lines) > MAX_TITLE_LINES:
+        title_lines = title_lines[:MAX_TITLE_LINES]
+        title_lines[-1] = title_lines[-1][:WRAP_CHARS - 3].rstrip() + '...'
+    longest = max(len(line) for line in title_lines + [node['owner']])
+    width = min(NODE_MAX_WIDTH, max(NODE_MIN_WIDTH, longest * CHAR_WIDTH + 2 * PADDING))
+    height = (len(title_lines) + 1) * LINE_HEIGHT + 2 * PADDING
+    if node['kind'] == 'decision':
+        # The text has to fit inside the rhombus
+        width, height = width * 1.4, height * 1.5
+    return title_lines, width, height
+
+
+def _reversed_edges(node_ids, edges):
+    """Indexes of edges that close a cycle, found by an iterative DFS in step order"""
+    adjacency = {node_id: [] for node_id in node_ids}
+    for index, (source, target, _) in enumerate(edges):
+        adjacency[source].append((target, index))
+
+    reversed_edges = set()
+    state = {}
+    for root in node_ids:
+        if root in state:
+            continue
+        state[root] = 'open'
+        stack = [(root, iter(adjacency[root]))]
+        while stack:
+            node_id, neighbours = stack[-1]
+            for target, index in neighbours:
+                if state.get(target) == 'open':
+                    reversed_edges.add(index)
+                elif target not in state:
+                    state[target] = 'open'
+                    stack.append((target, iter(adjacency[target])))
+                    break
+            else:
+                state[node_id] = 'done'
+                stack.pop()
+    return reversed_edges
+
+
+def _ranks(node_ids, dag_edges):
+    """Longest-path rank of every node over the acyclic edges"""
+    successors = {node_id: [] for node_id in node_ids}
+    indegree = dict.fromkeys(node_ids, 0)
+    for source, target in dag_edges:
+        successors[source].append(target)
+        indegree[target] += 1
+
+    rank = dict.fromkeys(node_ids, 0)
+    ready = [node_id for node_id in node_ids if indegree[node_id] == 0]
+    position = 0
+    while position < len(ready):
+        node_id = ready[position]
+        position += 1
+        for target in successors[node_id]:
+            rank[target] = max(rank[target], rank[node_id] + 1)
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                ready.append(target)
+    return rank
+
+
+def _order_layers(layers, predecessors, successors):
+    """Barycenter sweeps reordering each layer by its neighbours' positions"""
+    position = {node_id: index for layer in layers for index, node_id in enumerate(layer)}
+
+    def sweep(ranks, neighbours):
+        for rank in ranks:
+            layer = layers[rank]
+            barycenter = {}
+            for node_id in layer:
+                linked = neighbours[node_id]
+                barycenter[node_id] = (sum(position[other] for other in linked) / len(linked)
+                                       if linked else position[node_id])
+            layer.sort(key=lambda node_id: barycenter[node_id])
+            for index, node_id in enumerate(layer):
+                position[node_id] = index
+
+    for _ in range(ORDER_SWEEPS):
+        sweep(range(1, len(layers)), predecessors)
+        sweep(range(len(layers) - 2, -1, -1), successors)
+
+
+def _place_layer(layer, nodes, desired):
+    """Set x for one layer: as close to desired as possible without overlaps"""
+    previous = None
+    for node_id in layer:
+        node = nodes[node_id]
+        x = desired[node_id]
+        if previous is not None:
+            x = max(x, previous.x + (previous.width + node.width) / 2 + NODE_GAP)
+        node.x = x
+        previous = node
+    # Spreading only pushes right; recentre the layer on where it wanted to be
+    shift = sum(desired[node_id] - nodes[node_id].x for node_id in layer) / len(layer)
+    for node_id in layer:
+        nodes[node_id].x += shift
+
+
+def layout_graph(graph_nodes, graph_edges):
+    """DiagramLayout for the (nodes, edges) of process_flowchart.diagram_graph"""
+    node_ids = [node['id'] for node in graph_nodes]
+    loops = [(index, edge) for index, edge in enumerate(graph_edges) if edge[0] == edge[1]]
+    edges = [edge for edge in graph_edges if edge[0] != edge[1]]
+    reversed_edges = _reversed_edges(node_ids, edges)
+    dag_edges = [(target, source) if index in reversed_edges else (source, target)
+                 for index, (source, target, _) in enumerate(edges)]
+    rank = _ranks(node_ids, dag_edges)
+
+    nodes = {}
+    for node in graph_nodes:
+        title_lines, width, height = _node_box(node)
+        nodes[node['id']] = LayoutNode(node['id'], rank[node['id']], width, height,
+                                       title_lines, node['owner'], node['kind'])
+
+    # Long edges get one virtual node per rank they cross
+    chains = []
+    for index, (source, target) in enumerate(dag_edges):
+        chain = [source]
+        for step_rank in range(rank[source] + 1, rank[target]):
+            virtual_id = f'~{index}~{step_rank}'
+            nodes[virtual_id] = LayoutNode(virtual_id, step_rank, width=10)
+            chain.append(virtual_id)
+        chain.append(target)
+        chains.append(chain)
+
+    layers = [[] for _ in range(max(rank.values(), default=-1) + 1)]
+    for node in nodes.values():
+        layers[node.rank].append(node.id)
+    predecessors = {node_id: [] for node_id in nodes}
+    successors = {node_id: [] for node_id in nodes}
+    for chain in chains:
+        for upper, lower in zip(chain, chain[1:]):
+            successors[upper].append(lower)
+            predecessors[lower].append(upper)
+    _order_layers(layers, predecessors, successors)
+
+    y = MARGIN
+    for layer in layers:
+        layer_height = max(nodes[node_id].height for node_id in layer)
+        for node_id in layer:
+            nodes[node_id].y = y + layer_height / 2
+        y += layer_height + RANK_GAP
+
+    # Start from packed layers, then pull each node towards its neighbours
+    for layer in layers:
+        _place_layer(layer, nodes, dict.fromkeys(layer, 0.0))
+    for sweep in range(POSITION_SWEEPS):
+        downward = sweep % 2 == 0
+        neighbours = predecessors if downward else successors
+        for layer in (layers[1:] if downward else reversed(layers[:-1])):
+            desired = {}
+            for node_id in layer:
+                linked = neighbours[node_id]
+                desired[node_id] = (sum(nodes[other].x for other in linked) / len(linked)
+                                    if linked else nodes[node_id].x)
+            _place_layer(layer, nodes, desired)
+
+    left = min((node.x - node.width / 2 for node in nodes.values()), default=0)
+    right = max((node.x + node.width / 2 for node in nodes.values()), default=0)
+    for node in nodes.values():
+        node.x += MARGIN - left
+
+    layout_edges = []
+    for index, ((source, target, label), chain) in enumerate(zip(edges, chains)):
+        upper, lower = nodes[chain[0]], nodes[chain[-1]]
+        points = [(upper.x, upper.y + upper.height / 2)]
+        points += [(nodes[node_id].x, nodes[node_id].y) for node_id in chain[1:-1]]
+        points.append((lower.x, lower.y - lower.height / 2))
+        if index in reversed_edges:
+            points.reverse()
+        layout_edges.append(LayoutEdge(source, target, label, points))
+    for _, (source, _, label) in loops:
+        node = nodes[source]
+        side = node.x + node.width / 2
+        layout_edges.append(LayoutEdge(source, source, label,
+                                       [(side, node.y - 8), (side + 24, node.y), (side, node.y + 8)], loop=True))
+
+    real_nodes = {node_id: node for node_id, node in nodes.items() if not node.virtual}
+    return DiagramLayout(real_nodes, layout_edges, right - left + 2 * MARGIN + 24, max(y - RANK_GAP + MARGIN, 2 * MARGIN))
+
+
+def layout_process(process_info):
+    from process_flowchart import diagram_graph
+    return layout_graph(*diagram_graph(process_info.get('steps') or []))
+
+
+def _num(value):
+    return f'{value:.1f}'.rstrip('0').rstrip('.')
+
+
+def _points(points):
+    return ' '.join(f'{_num(x)},{_num(y)}' for x, y in points)
+
+
+def _edge_label_position(edge):
+    middle = len(edge.points) // 2
+    (x1, y1), (x2, y2) = edge.points[middle - 1], edge.points[middle]
+    return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+def _svg_node(node):
+    fill, stroke = NODE_COLORS[node.kind]
+    left, top = node.x - node.width / 2, node.y - node.height / 2
+    if node.kind == 'decision':
+        shape = (f'<polygon points="{_points([(node.x, top), (left + node.width, node.y), (node.x, top + node.height), (left, node.y)])}" '
+                 f'fill="{fill}" stroke="{stroke}" stroke-width="1.5"/>')
+    else:
+        radius = node.height / 2 if node.kind in ('start', 'end') else 6
+        shape = (f'<rect x="{_num(left)}" y="{_num(top)}" width="{_num(node.width)}" height="{_num(node.height)}" '
+                 f'rx="{_num(radius)}" fill="{fill}" stroke="{stroke}" stroke-width="1.5"/>')
+
+    lines = node.title_lines + [node.owner]
+    first_baseline = node.y - (len(lines) - 1) * LINE_HEIGHT / 2 + FONT_SIZE / 3
+    spans = []
+    for index, line in enumerate(lines):
+        owner = ' fill="#666666" font-style="italic"' if index == len(lines) - 1 else ''
+        spans.append(f'<tspan x="{_num(node.x)}" y="{_num(first_baseline + index * LINE_HEIGHT)}"{owner}>'
+                     f'{html.escape(line)}</tspan>')
+    return (f'<g class="node {node.kind}" data-step="{html.escape(node.id)}">{shape}'
+            f'<text text-anchor="middle">{"".join(spans)}</text></g>')
+
+
+def _svg_edge(edge):
+    if edge.loop:
+        (x1, y1), (cx, cy), (x2, y2) = edge.points
+        path = (f'<path d="M{_num(x1)},{_num(y1)} C{_num(cx)},{_num(y1 - 16)} {_num(cx)},{_num(y2 + 16)} '
+                f'{_num(x2)},{_num(y2)}" fill="none" stroke="{EDGE_COLOR}" stroke-width="1.5" marker-end="url(#arrow)"/>')
+    else:
+        path = (f'<polyline points="{_points(edge.points)}" fill="none" stroke="{EDGE_COLOR}" '
+                f'stroke-width="1.5" marker-end="url(#arrow)"/>')
+    if not edge.label:
+        return path
+    x, y = edge.points[1] if edge.loop else _edge_label_position(edge)
+    width = len(edge.label) * (CHAR_WIDTH - 1) + 8
+    return (f'{path}<rect x="{_num(x - width / 2)}" y="{_num(y - 9)}" width="{_num(width)}" height="18" fill="#ffffff"/>'
+            f'<text x="{_num(x)}" y="{_num(y + 4)}" text-anchor="middle" font-size="11">{html.escape(edge.label)}</text>')
+
+
+def layout_svg(layout):
+    """Standalone SVG document for a DiagramLayout"""
+    width, height = _num(layout.width), _num(layout.height)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+        f'font-family="Helvetica, Arial, sans-serif" font-size="{FONT_SIZE}">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" '
+        f'orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="{EDGE_COLOR}"/></marker></defs>',
+        '<rect width="100%" height="100%" fill="#ffffff"/>',
+        '<g class="edges">', *(_svg_edge(edge) for edge in layout.edges), '</g>',
+        '<g class="nodes">', *(_svg_node(node) for node in layout.nodes.values()), '</g>',
+        '</svg>'
+    ]
+    return '\n'.join(parts)
+
+
+def svg_key(process_info):
+    from process_flowchart import diagram_hash
+    return content_hash('svg', LAYOUT_VERSION, diagram_hash(process_info))
+
+
+def render_svg(process_info):
+    """(cache key, SVG text) for a process, laid out once per diagram content"""
+    key = svg_key(process_info)
+    cache = get_cache('diagram_svg')
+    svg = cache.get(key)
+    if svg is None:
+        svg = layout_svg(layout_process(process_info))
+        cache.set(key, svg)
+        logger.info(f"Rendered diagram SVG {key[:12]} ({len(process_info.get('steps') or [])} steps)")
+    return key, svg
+
+
+def render_png(process_info, scale=1.0):
+    """(cache key, PNG bytes) for a process; needs the optional cairosvg package"""
+    if cairosvg is None:
+        raise DiagramRenderError('PNG rendering requires the cairosvg package')
+    svg_cache_key, svg = render_svg(process_info)
+    key = content_hash('png', svg_cache_key, scale)
+    cache = get_cache('diagram_png')
+    encoded = cache.get(key)
+    if encoded is None:
+        png = cairosvg.svg2png(bytestring=svg.encode('utf-8'), scale=scale)
+        cache.set(key, base64.b64encode(png).decode('ascii'))
+        return key, png
+    return key, base64.b64decode(encoded)
+
+
+def pdf_text(text):
+    """Text with what the latin-1 FPDF core fonts cannot show replaced"""
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _hex_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def draw_on_pdf(pdf, process_info, x=None, y=None, width=None):
+    """Draw a process diagram on an FPDF page with lines, boxes and cells.
+
+    The diagram is scaled to ``width`` mm (default: the printable width, never
+    enlarged) and to the page height; a new page is started when it does not
+    fit below ``y``. Returns the height drawn in mm.
+    """
+    layout = layout_process(process_info)
+    left = pdf.l_margin if x is None else x
+    width = width or pdf.w - pdf.l_margin - pdf.r_margin
+    page_height = pdf.h - pdf.t_margin - pdf.b_margin
+    scale = min(PX_TO_MM, width / layout.width, page_height / layout.height)
+    top = pdf.get_y() if y is None else y
+    if top + layout.height * scale > pdf.h - pdf.b_margin:
+        pdf.add_page()
+        top = pdf.get_y()
+
+    def point(px, py):
+        return left + px * scale, top + py * scale
+
+    pdf.set_line_width(0.3)
+    pdf.set_draw_color(*_hex_rgb(EDGE_COLOR))
+    for edge in layout.edges:
+        points = [point(px, py) for px, py in edge.points]
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            pdf.line(x1, y1, x2, y2)
+        # Arrow head along the last segment
+        (x1, y1), (x2, y2) = points[-2], points[-1]
+        length = max(((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5, 1e-6)
+        dx, dy = (x2 - x1) / length, (y2 - y1) / length
+        head = 8 * scale
+        for side in (1, -1):
+            pdf.line(x2, y2, x2 - head * dx + side * head * 0.5 * dy, y2 - head * dy - side * head * 0.5 * dx)
+
+    font_size = FONT_SIZE * 0.75 * scale / PX_TO_MM
+    line_height = LINE_HEIGHT * scale
+    pdf.set_font('Helvetica', size=font_size)
+    for node in layout.nodes.values():
+        fill, stroke = NODE_COLORS[node.kind]
+        pdf.set_fill_color(*_hex_rgb(fill))
+        pdf.set_draw_color(*_hex_rgb(stroke))
+        node_left, node_top = point(node.x - node.width / 2, node.y - node.height / 2)
+        node_width, node_height = node.width * scale, node.height * scale
+        if node.kind == 'decision':
+            centre_x, centre_y = point(node.x, node.y)
+            corners = [(centre_x, node_top), (node_left + node_width, centre_y),
+                       (centre_x, node_top + node_height), (node_left, centre_y)]
+            if hasattr(pdf, 'polygon'):
+                pdf.polygon(corners, style='DF')
+            else:
+                for (x1, y1), (x2, y2) in zip(corners, corners[1:] + corners[:1]):
+                    pdf.line(x1, y1, x2, y2)
+        else:
+            pdf.rect(node_left, node_top, node_width, node_height, 'DF')
+
+        lines = node.title_lines + [node.owner]
+        _, text_top = point(node.x, node.y - len(lines) * LINE_HEIGHT / 2)
+        for index, line in enumerate(lines):
+            pdf.set_xy(node_left, text_top + index * line_height)
+            pdf.cell(node_width, line_height, pdf_text(line), align='C')
+
+    pdf.set_xy(pdf.l_margin, top + layout.height * scale)
+    return layout.height * scale
@@ -0,0 +1,232 @@
+"""
+Document-to-process pipeline shared by the synchronous /api/process-document
+endpoint and the background extraction jobs.
+
+The pipeline runs the same stages in the same order for both callers: cached
+or fresh extraction, database insert and Mermaid diagram generation. Each
+stage reports through an optional ``on_stage(stage, **data)`` callback so job
+runners can publish progress.
+"""
+import itertools
+import json
+import logging
+import os
+
+from content_cache import content_hash, get_cache
+from document_streaming import iter_document_chunks
+from llm_stream import parse_process_reply, stream_process_extraction
+from process_mapreduce import SECTION_PROMPT, map_reduce_extract
+from process_repository import save_process
+
+logger = logging.getLogger(__name__)
+
+# Bump EXTRACTION_PROMPT_VERSION whenever the extraction prompt changes so
+# cached results from the old prompt are no longer served
+EXTRACTION_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+EXTRACTION_PROMPT_VERSION = os.environ.get('EXTRACTION_PROMPT_VERSION', '1')
+
+
+class DocumentPipelineError(Exception):
+    """Raised when a pipeline stage fails; carries the API error payload"""
+
+    def __init__(self, error, error_type, details):
+        super().__init__(details)
+        self.error = error
+        self.error_type = error_type
+        self.details = details
+
+    def to_dict(self):
+        return {
+            'error': self.error,
+            'details': self.details,
+            'type': self.error_type
+        }
+
+
+def _noop_stage(stage, **data):
+    pass
+
+
+def _extract_long_document(file_path, file_type, on_steps=None):
+    """Map-reduce documents that span several context-sized chunks.
+
+    Returns ``(process_info, first_chunk)``: process_info is None when the
+    document fits in a single prompt, in which case first_chunk holds its
+    text (if it could be read) for the single-prompt path.
+    """
+    if file_type not in ('pdf', 'docx'):
+        return None, None
+    chunks = iter_document_chunks(file_path, file_type)
+    head = list(itertools.islice(chunks, 2))
+    if len(head) < 2:
+        chunks.close()
+        return None, head[0] if head else None
+    logger.info(f"Long document detected, using map-reduce extraction: {file_path}")
+
+    published = [0]
+
+    def on_partial(partial):
+        # Number section steps continuously so clients can render them as they arrive
+        steps = [dict(step, number=published[0] + index)
+                 for index, step in enumerate(partial.get('steps', []), start=1)]
+        published[0] += len(steps)
+        if steps:
+            on_steps(steps)
+
+    process_info = map_reduce_extract(itertools.chain(head, chunks), on_partial=on_partial if on_steps else None)
+    return process_info, None
+
+
+def _run_extraction(file_path, file_type, on_steps=None):
+    """Extract a saved document; returns (process_info, complete).
+
+    With ``on_steps`` the reply is streamed and steps are published as they
+    arrive. ``complete`` is False when the reply had to be repaired or was
+    cut short, so the result is not cached.
+    """
+    process_info, first_chunk = _extract_long_document(file_path, file_type, on_steps)
+    if process_info is not None:
+        return process_info, True
+
+    if on_steps and first_chunk is not None:
+        prompt = SECTION_PROMPT.format(section=1, total=1, text=first_chunk['text'])
+        return stream_process_extraction(prompt, on_steps=on_steps, model=EXTRACTION_MODEL)
+
+    from backend.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    logger.info("DocumentProcessor initialized")
+    process_info, repaired = parse_process_reply(processor.process_document(file_path, file_type))
+    if on_steps:
+        on_steps(process_info['steps'])
+    return process_info, not repaired
+
+
+def _extraction_path(file_type, stream):
+    """Identity of the prompt a document of this type is extracted with (see _run_extraction)"""
+    if stream and file_type in ('pdf', 'docx'):
+        return 'section_prompt:' + content_hash(SECTION_PROMPT)[:16]
+    return 'document_processor'
+
+
+def extract_process_info(file_bytes, filename, file_path, on_stage=None, stream=False):
+    """Return (process_info, cache_status) for an uploaded document.
+
+    With ``stream`` the extracted steps are reported through
+    ``on_stage('steps_partial', steps=[...])`` while the model is still
+    answering.
+    """
+    on_stage = on_stage or _noop_stage
+    file_type = filename.rsplit('.', 1)[1].lower()
+
+    def on_steps(steps):
+        on_stage('steps_partial', steps=steps)
+
+    # Identical uploads reuse the stored extraction result of the same
+    # extraction path: streamed single-prompt replies use SECTION_PROMPT,
+    # the others DocumentProcessor's own prompt
+    cache = get_cache('document_extraction')
+    cache_key = content_hash(file_bytes, file_type, EXTRACTION_MODEL, EXTRACTION_PROMPT_VERSION,
+                             _extraction_path(file_type, stream))
+
+    process_info_str = cache.get(cache_key)
+    cache_status = 'hit' if process_info_str else 'miss'
+    if process_info_str:
+        logger.info(f"Extraction cache hit for {filename}")
+        process_info, _ = parse_process_reply(process_info_str)
+        if stream:
+            on_steps(process_info['steps'])
+    else:
+        # Save the file
+        with open(file_path, 'wb') as f:
+            f.write(file_bytes)
+        logger.info(f"File saved successfully: {filename}")
+
+        on_stage('llm_started')
+        process_info, complete = _run_extraction(file_path, file_type, on_steps if stream else None)
+        logger.info("Document processed successfully")
+        if complete:
+            cache.set(cache_key, json.dumps(process_info))
+        else:
+            logger.warning(f"Not caching the repaired or partial extraction of {filename}")
+    logger.info(f"Process info parsed: {process_info['name']}")
+    return process_info, cache_status
+
+
+def store_process(process_info):
+    """Insert the extracted process, its steps and its version, returning the new process id"""
+    process_id = save_process(process_info)
+    logger.info(f"Process '{process_info['name']}' saved to database as {process_id} "
+                f"with {len(process_info['steps'])} steps")
+    try:
+        from process_diagram import store_diagram
+        store_diagram(process_id, process_info)
+    except Exception as e:
+        # Rendered and stored again on the first read of the diagram
+        logger.error(f"Error storing diagram of process {process_id}: {str(e)}", exc_info=True)
+    return process_id
+
+
+def build_process_analysis(process_info):
+    steps = process_info['steps']
+    return {
+        'steps_count': len(steps),
+        'manual_steps': sum(1 for step in steps if 'Automated' not in step.get('owner', '')),
+        'automated_steps': sum(1 for step in steps if 'Automated' in step.get('owner', '')),
+        'timeline': f"Approximately {len(steps) * 2} days",
+        'key_roles': list(set(step.get('role', 'Unassigned') for step in steps))
+    }
+
+
+def run_document_pipeline(file_bytes, filename, upload_folder, on_stage=None, stream=False):
+    """Extract, store and diagram a document; returns the API response payload.
+
+    ``stream`` streams the extraction and reports partial steps (see
+    extract_process_info). Raises DocumentPipelineError describing the
+    failed stage.
+    """
+    on_stage = on_stage or _noop_stage
+    file_path = os.path.join(upload_folder, filename)
+    on_stage('uploaded', filename=filename, size=len(file_bytes))
+
+    try:
+        # Process the document
+        try:
+            process_info, cache_status = extract_process_info(file_bytes, filename, file_path, on_stage, stream)
+            on_stage('parsed', name=process_info['name'], steps=len(process_info['steps']), cache=cache_status)
+        except Exception as e:
+            logger.error(f"Error in document processing: {str(e)}", exc_info=True)
+            raise DocumentPipelineError('Failed to process document', 'processing_error', str(e))
+
+        try:
+            # Store in database
+            process_id = store_process(process_info)
+            on_stage('stored', process_id=process_id)
+        except Exception as e:
+            logger.error(f"Database error: {str(e)}", exc_info=True)
+            raise DocumentPipelineError('Failed to save process to database', 'database_error', str(e))
+
+        try:
+            # Generate Mermaid diagram (already rendered when it was stored)
+            from process_flowchart import diagram_source, render_diagram
+            _, mermaid_diagram = render_diagram(diagram_source(process_info))
+            logger.info("Mermaid diagram generated successfully")
+            on_stage('diagram_ready')
+        except Exception as e:
+            logger.error(f"Error generating diagram: {str(e)}", exc_info=True)
+            raise DocumentPipelineError('Failed to generate process diagram', 'diagram_error', str(e))
+
+        # Enhance response with visualization
+        return {
+            'process': process_info,
+            'process_id': process_id,
+            'mermaid_diagram': mermaid_diagram,
+            'message': 'Process extracted and stored successfully',
+            'cache': cache_status,
+            'analysis': build_process_analysis(process_info)
+        }
+
+    finally:
+        # Clean up the uploaded file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info(f"Cleaned up temporary file: {filename}")
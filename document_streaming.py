@@ -0,0 +1,206 @@
+"""
+Streaming, page-parallel text extraction for uploaded process documents.
+
+Instead of reading a whole document into one string, the helpers here yield
+text as it becomes available:
+
+* PDF pages are parsed in batches across a process pool (PyPDF2 is pure
+  Python and holds the GIL) with a bounded number of batches in flight, and
+  are yielded in page order. One pool per worker process is shared by every
+  job and request thread; it is created on first use, after any fork.
+* DOCX paragraphs and table rows are yielded one at a time.
+* ``iter_document_chunks`` packs those units into chunks that fit the
+  model's context budget, so the first chunk can go to the LLM while later
+  pages are still being parsed.
+"""
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Rough budget per chunk sent to the model, leaving room for the prompt and
+# the JSON answer. Tokens are estimated at ~4 characters each.
+DEFAULT_CHUNK_TOKENS = int(os.environ.get('EXTRACTION_CHUNK_TOKENS', 3000))
+CHARS_PER_TOKEN = 4
+
+PDF_BATCH_PAGES = 8
+PDF_WORKERS = int(os.environ.get('PDF_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _extract_pdf_page_range(file_path, start, stop):
+    """Worker entry point: return [(page_number, text), ...] for pages [start, stop)"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    pages = []
+    for index in range(start, stop):
+        try:
+            text = reader.pages[index].extract_text() or ''
+        except Exception as e:
+            logger.warning(f"Could not extract text from page {index + 1} of {file_path}: {str(e)}")
+            text = ''
+        pages.append((index + 1, text))
+    return pages
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool():
+    """Return this process's PDF parsing pool, creating it on first use"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork belongs to the parent
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pdf_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def iter_pdf_pages(file_path, workers=None, batch_pages=PDF_BATCH_PAGES):
+    """Yield (page_number, text) for every page of a PDF, in order.
+
+    ``workers`` bounds this document's batches in flight (two per worker) on
+    the shared pool; 1 parses in the calling thread.
+    """
+    from PyPDF2 import PdfReader
+    page_count = len(PdfReader(file_path).pages)
+    workers = workers or PDF_WORKERS
+
+    # Small documents are not worth the process pool start-up cost
+    if workers <= 1 or page_count <= batch_pages:
+        yield from _extract_pdf_page_range(file_path, 0, page_count)
+        return
+
+    batches = [(start, min(start + batch_pages, page_count)) for start in range(0, page_count, batch_pages)]
+    max_in_flight = workers * 2
+    pool = get_pdf_pool()
+    pending = deque()
+    next_batch = 0
+    try:
+        while next_batch < len(batches) or pending:
+            # Keep a bounded window of batches in flight so memory stays flat
+            while next_batch < len(batches) and len(pending) < max_in_flight:
+                start, stop = batches[next_batch]
+                pending.append(pool.submit(_extract_pdf_page_range, file_path, start, stop))
+                next_batch += 1
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # A parser process died; the next document gets a fresh pool
+        _discard_pdf_pool(pool)
+        raise
+    finally:
+        # The consumer may stop early (e.g. on an LLM error); drop queued work
+        for future in pending:
+            future.cancel()
+
+
+def iter_docx_paragraphs(file_path):
+    """Yield (paragraph_number, text) for non-empty paragraphs and table rows"""
+    from docx import Document
+    document = Document(file_path)
+    number = 0
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if text:
+            number += 1
+            yield number, text
+    for table in document.tables:
+        for row in table.rows:
+            text = ' | '.join(cell.text.strip() for cell in row.cells if cell.text.strip())
+            if text:
+                number += 1
+                yield number, text
+
+
+def iter_text_lines(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                yield number, line.rstrip('\n')
+
+
+def iter_document_units(file_path, file_type, workers=None):
+    """Yield (location, text) units for a supported document type"""
+    if file_type == 'pdf':
+        return iter_pdf_pages(file_path, workers=workers)
+    if file_type == 'docx':
+        return iter_docx_paragraphs(file_path)
+    if file_type == 'txt':
+        return iter_text_lines(file_path)
+    raise ValueError(f"Streaming extraction is not supported for '{file_type}' files")
+
+
+def _split_oversized(text, max_chars):
+    """Split a unit that alone exceeds the budget on paragraph, then word boundaries"""
+    pieces = []
+    current = ''
+    for part in re.split(r'(\n\s*\n|\s+)', text):
+        if len(current) + len(part) > max_chars and current:
+            pieces.append(current)
+            current = ''
+        while len(part) > max_chars:
+            pieces.append(part[:max_chars])
+            part = part[max_chars:]
+        current += part
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_units(units, max_tokens=None):
+    """Pack (location, text) units into chunks of at most max_tokens.
+
+    Yields dicts with 'index', 'text', 'start' and 'end' (first and last unit
+    location) and an estimated 'tokens' count.
+    """
+    max_chars = (max_tokens or DEFAULT_CHUNK_TOKENS) * CHARS_PER_TOKEN
+    index = 0
+    parts = []
+    size = 0
+    start = end = None
+
+    def make_chunk():
+        text = '\n\n'.join(parts)
+        return {'index': index, 'text': text, 'start': start, 'end': end, 'tokens': estimate_tokens(text)}
+
+    for location, text in units:
+        text = text.strip()
+        if not text:
+            continue
+        for piece in (_split_oversized(text, max_chars) if len(text) > max_chars else [text]):
+            if parts and size + len(piece) + 2 > max_chars:
+                yield make_chunk()
+                index += 1
+                parts = []
+                size = 0
+            if not parts:
+                start = location
+            parts.append(piece)
+            size += len(piece) + 2
+            end = location
+    if parts:
+        yield make_chunk()
+
+
+def iter_document_chunks(file_path, file_type, max_tokens=None, workers=None):
+    """Stream a document as context-sized text chunks"""
+    return chunk_units(iter_document_units(file_path, file_type, workers=workers), max_tokens=max_tokens)
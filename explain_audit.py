@@ -0,0 +1,165 @@
+"""
+Query plan audit for the process lookup endpoints.
+
+Seeds a scratch database with a large dataset (100k processes by default),
+applies the Flask-Migrate migrations, then runs EXPLAIN (EXPLAIN QUERY PLAN on
+SQLite) for the queries behind the main endpoints and reports every
+sequential/full table scan. Exits with status 1 if any scan is found, so it
+can run in CI.
+
+Usage:
+    python explain_audit.py                                  # scratch SQLite db
+    python explain_audit.py --database-url postgresql://...  # empty PostgreSQL db
+    python explain_audit.py --skip-seed                      # re-audit an existing dataset
+    python explain_audit.py --no-migrate                     # plans without the indexes
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from flask import Flask
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import text
+
+# Add the project root to Python path
+project_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_dir)
+
+from backend.models import db
+from backend.models.erp_process import ERPProcess
+from backend.models.tobe_process import GapAnalysis
+from process_queries import processes_query
+from process_repository import save_gap_analyses, save_processes, save_tobe_process
+from process_versions import ProcessVersion, base_version_query, version_steps_query, versions_query
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(project_dir, 'instance', 'explain_audit.db')}"
+SEED_BATCH_SIZE = 5000
+VERSIONS_PER_NAME = 10
+
+
+def create_audit_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    Migrate(app, db, directory=os.path.join(project_dir, 'migrations'))
+    return app
+
+
+def seed(processes, steps_per_process, gap_analyses):
+    """Bulk insert processes (several versions per name, each versioned), TO-BE processes and gap analyses"""
+    started = time.perf_counter()
+    for offset in range(0, processes, SEED_BATCH_SIZE):
+        batch = [{
+            'name': f'Process {index // VERSIONS_PER_NAME}',
+            'system': random.choice(['SAP', 'Oracle', 'Dynamics']),
+            'steps': [{
+                'number': number,
+                'description': f'Step {number} of process {index}',
+                'role': 'Approver',
+                'owner': f'Owner {number}'
+            } for number in range(1, steps_per_process + 1)]
+        } for index in range(offset, min(offset + SEED_BATCH_SIZE, processes))]
+        save_processes(batch)
+        print(f"  seeded {offset + len(batch)}/{processes} processes")
+
+    process_ids = [row[0] for row in db.session.query(ERPProcess.id).all()]
+    tobe_ids = [
+        save_tobe_process(f'TO-BE {index}', random.choice(process_ids), 'APQC', [], commit=False)
+        for index in range(max(1, gap_analyses // 10))
+    ]
+    db.session.commit()
+    for offset in range(0, gap_analyses, SEED_BATCH_SIZE):
+        save_gap_analyses([{
+            'asis_process_id': random.choice(process_ids),
+            'tobe_process_id': random.choice(tobe_ids),
+            'summary': 'Seeded analysis'
+        } for _ in range(min(SEED_BATCH_SIZE, gap_analyses - offset))])
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+def audited_queries():
+    """The queries behind the main endpoints, with representative parameters"""
+    session = db.session
+    process_ids = [row[0] for row in session.query(ERPProcess.id).order_by(ERPProcess.id).limit(1000).all()]
+    sample_id = process_ids[len(process_ids) // 2]
+    sample_name = session.query(ERPProcess.process_name).filter(ERPProcess.id == sample_id).scalar()
+    latest_version = session.query(db.func.max(ProcessVersion.version_number))\
+        .filter(ProcessVersion.process_name == sample_name).scalar() or 1
+    base_version = base_version_query(session, sample_name, latest_version).scalar() or 1
+    return [
+        ('analyze-process: process with steps', processes_query(session, [sample_id])),
+        ('compare-processes: two processes with steps', processes_query(session, process_ids[:2])),
+        ('processes/batch: 100 processes with steps', processes_query(session, process_ids[:100])),
+        ('process versions: versions of a name, newest first', versions_query(session, sample_name)),
+        ('process versions: snapshot a version starts from',
+            base_version_query(session, sample_name, latest_version)),
+        ('process versions: delta chain of a version',
+            version_steps_query(session, sample_name, base_version, latest_version)),
+        ('gap analyses for an AS-IS process', session.query(GapAnalysis)
+            .filter(GapAnalysis.asis_process_id == sample_id)),
+        ('gap analyses for a TO-BE process', session.query(GapAnalysis)
+            .filter(GapAnalysis.tobe_process_id == 1)),
+    ]
+
+
+def explain(query):
+    """Return the plan lines and the lines that indicate a full table scan"""
+    engine = db.engine
+    sql = str(query.statement.compile(engine, compile_kwargs={'literal_binds': True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            plan = [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            # "SCAN t" is a table scan ("SCAN t USING INDEX" walks an index);
+            # an AUTOMATIC index is built from a full scan on every execution
+            scans = [line for line in plan
+                     if (line.startswith('SCAN ') and ' USING ' not in line) or 'AUTOMATIC' in line]
+        else:
+            plan = [row[0] for row in conn.execute(text(f'EXPLAIN {sql}'))]
+            scans = [line.strip() for line in plan if 'Seq Scan' in line]
+    return plan, scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report sequential scans in the process lookup queries')
+    parser.add_argument('--database-url', default=os.environ.get('EXPLAIN_AUDIT_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--processes', type=int, default=100000)
+    parser.add_argument('--steps-per-process', type=int, default=5)
+    parser.add_argument('--gap-analyses', type=int, default=10000)
+    parser.add_argument('--skip-seed', action='store_true', help='audit the data already in the database')
+    parser.add_argument('--no-migrate', action='store_true', help='do not apply migrations before auditing')
+    args = parser.parse_args()
+
+    if args.database_url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(args.database_url[len('sqlite:///'):]) or '.', exist_ok=True)
+
+    app = create_audit_app(args.database_url)
+    with app.app_context():
+        db.create_all()
+        if not args.skip_seed:
+            if db.session.query(ERPProcess.id).first() is not None:
+                parser.error('database already holds processes; use --skip-seed or an empty database')
+            print(f"Seeding {args.processes} processes into {db.engine.url}...")
+            seed(args.processes, args.steps_per_process, args.gap_analyses)
+        if not args.no_migrate:
+            upgrade()
+        # Refresh planner statistics after the bulk load
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+
+        total_scans = 0
+        for label, query in audited_queries():
+            plan, scans = explain(query)
+            total_scans += len(scans)
+            print(f"\n{'SEQ SCAN' if scans else 'ok':8} {label}")
+            for line in plan:
+                print(f"         {line}")
+
+        print(f"\n{total_scans} sequential scan(s) found")
+        return 1 if total_scans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Background job queue for document extraction.
+
+Uploads are written to the upload folder and recorded as ExtractionJob rows,
+then a local thread pool runs the document pipeline outside the request
+worker. Job state lives in the application database, so a restarted worker
+picks up queued jobs and re-queues running ones whose heartbeat went stale;
+a running job refreshes its heartbeat from a side thread, so a long model
+call never looks stale.
+Progress is pushed to SocketIO clients that joined the job's room on the
+``/jobs`` namespace, including ``job_steps`` events carrying extracted steps
+while the model is still streaming its answer; clients without WebSockets
+poll the status endpoint.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from backend.models import db
+from document_pipeline import DocumentPipelineError, run_document_pipeline
+
+logger = logging.getLogger(__name__)
+
+JOB_NAMESPACE = '/jobs'
+
+
+class ExtractionJob(db.Model):
+    __tablename__ = 'extraction_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    stage = db.Column(db.String(50))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self, include_result=True):
+        data = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'stage': self.stage,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result and self.result:
+            data['result'] = json.loads(self.result)
+        if self.error:
+            data['error'] = json.loads(self.error)
+        return data
+
+
+class ExtractionJobQueue:
+    """Runs extraction jobs on a local thread pool inside the Flask app context"""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio=None):
+        self.app = app
+        self.socketio = socketio
+        self.job_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'jobs')
+        self.stale_after = timedelta(seconds=int(os.environ.get('EXTRACTION_JOB_STALE_SECONDS', 600)))
+        # Several heartbeats fit in the stale window, so one slow commit does not lose the job
+        self.heartbeat_interval = self.stale_after.total_seconds() / 4
+        os.makedirs(self.job_folder, exist_ok=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('EXTRACTION_JOB_WORKERS', 2)),
+            thread_name_prefix='extraction-job'
+        )
+        app.extensions['extraction_jobs'] = self
+
+        if socketio is not None:
+            from flask_socketio import join_room
+
+            @socketio.on('subscribe', namespace=JOB_NAMESPACE)
+            def subscribe_to_job(data):
+                job_id = (data or {}).get('job_id')
+                if job_id:
+                    join_room(job_id)
+
+    def submit(self, file_bytes, filename):
+        """Persist the upload and queue it; returns the new job"""
+        job_id = str(uuid.uuid4())
+        file_path = os.path.join(self.job_folder, f"{job_id}_{filename}")
+        with open(file_path, 'wb') as f:
+            f.write(file_bytes)
+
+        job = ExtractionJob(id=job_id, filename=filename, file_path=file_path, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        logger.info(f"Queued extraction job {job_id} for {filename}")
+
+        self.executor.submit(self._run, job_id)
+        return job
+
+    def get(self, job_id):
+        return db.session.get(ExtractionJob, job_id)
+
+    def resume_pending(self):
+        """Re-queue jobs left behind by a previous (or crashed) worker"""
+        with self.app.app_context():
+            stale_before = datetime.utcnow() - self.stale_after
+            ExtractionJob.query.filter(
+                ExtractionJob.status == 'running',
+                ExtractionJob.updated_at < stale_before
+            ).update({'status': 'queued'}, synchronize_session=False)
+            db.session.commit()
+
+            job_ids = [row.id for row in db.session.query(ExtractionJob.id)
+                       .filter(ExtractionJob.status == 'queued')
+                       .order_by(ExtractionJob.created_at)]
+        for job_id in job_ids:
+            self.executor.submit(self._run, job_id)
+        if job_ids:
+            logger.info(f"Resumed {len(job_ids)} pending extraction jobs")
+
+    def _claim(self, job_id):
+        # Atomic queued -> running transition so only one worker runs a job
+        now = datetime.utcnow()
+        claimed = ExtractionJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': now, 'updated_at': now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return claimed == 1
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = datetime.utcnow()
+        ExtractionJob.query.filter_by(id=job_id).update(fields, synchronize_session=False)
+        db.session.commit()
+        self._emit(job_id)
+
+    def _heartbeat(self, job_id, stop):
+        """Refresh a running job's updated_at until stop is set"""
+        with self.app.app_context():
+            try:
+                while not stop.wait(self.heartbeat_interval):
+                    try:
+                        ExtractionJob.query.filter_by(id=job_id, status='running').update(
+                            {'updated_at': datetime.utcnow()}, synchronize_session=False
+                        )
+                        db.session.commit()
+                    except Exception as e:
+                        logger.error(f"Heartbeat of extraction job {job_id} failed: {str(e)}")
+                        db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def _emit(self, job_id):
+        if self.socketio is None:
+            return
+        job = self.get(job_id)
+        self.socketio.emit('job_update', job.to_dict(), namespace=JOB_NAMESPACE, to=job_id)
+
+    def _emit_steps(self, job_id, steps):
+        if self.socketio is None:
+            return
+        self.socketio.emit('job_steps', {'job_id': job_id, 'steps': steps}, namespace=JOB_NAMESPACE, to=job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            stop_heartbeat = threading.Event()
+            try:
+                if not self._claim(job_id):
+                    return
+                threading.Thread(target=self._heartbeat, args=(job_id, stop_heartbeat),
+                                 name=f'extraction-heartbeat-{job_id[:8]}', daemon=True).start()
+                job = self.get(job_id)
+                self._emit(job_id)
+
+                if not os.path.exists(job.file_path):
+                    self._update(job_id, status='failed', finished_at=datetime.utcnow(), error=json.dumps({
+                        'error': 'Uploaded file is no longer available',
+                        'type': 'missing_file'
+                    }))
+                    return
+
+                with open(job.file_path, 'rb') as f:
+                    file_bytes = f.read()
+
+                def on_stage(stage, **data):
+                    if stage == 'steps_partial':
+                        # Partial steps go straight to subscribers, not to the job row
+                        self._emit_steps(job_id, data['steps'])
+                    else:
+                        self._update(job_id, stage=stage)
+
+                try:
+                    result = run_document_pipeline(
+                        file_bytes, f"{job_id}_{job.filename}", self.app.config['UPLOAD_FOLDER'], on_stage,
+                        stream=self.socketio is not None
+                    )
+                    self._update(job_id, status='completed', finished_at=datetime.utcnow(), result=json.dumps(result))
+                    logger.info(f"Extraction job {job_id} completed")
+                except DocumentPipelineError as e:
+                    self._update(job_id, status='failed', finished_at=datetime.utcnow(), error=json.dumps(e.to_dict()))
+                    logger.error(f"Extraction job {job_id} failed: {e.details}")
+                finally:
+                    if os.path.exists(job.file_path):
+                        os.remove(job.file_path)
+            except Exception as e:
+                logger.error(f"Unexpected error in extraction job {job_id}: {str(e)}", exc_info=True)
+                db.session.rollback()
+                self._update(job_id, status='failed', finished_at=datetime.utcnow(), error=json.dumps({
+                    'error': 'An unexpected error occurred',
+                    'details': str(e),
+                    'type': 'unexpected_error'
+                }))
+            finally:
+                stop_heartbeat.set()
+                db.session.remove()
@@ -5,9 +5,9 @@ This ensures that the ID 101 exists in the erp_processes table.
 import os
 import sys
 from flask import Flask
-from datetime import datetime
 from backend.models.erp_process import ERPProcess, ERPProcessStep
 from backend.models import db
+from process_repository import save_process
 
 # Create a minimal Flask app to use SQLAlchemy
 app = Flask(__name__)
@@ -31,17 +31,7 @@ def fix_erp_process():
             db.session.delete(existing)
             db.session.commit()
         
-        # Create new process with ID 101
-        process = ERPProcess(
-            id=101,
-            process_name='Invoice Processing',
-            erp_system='Finance',
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        db.session.add(process)
-        
-        # Create steps for this process
+        # Create new process with ID 101 and its steps
         steps = [
             {'number': 1, 'description': 'Receive Invoice', 'approver_role': 'AP Clerk', 'approver_name': 'John Smith'},
             {'number': 2, 'description': 'Verify Invoice Details', 'approver_role': 'AP Specialist', 'approver_name': 'Sarah Johnson'},
@@ -49,17 +39,12 @@ def fix_erp_process():
             {'number': 4, 'description': 'Approval Workflow', 'approver_role': 'System', 'approver_name': 'ERP System'},
             {'number': 5, 'description': 'Process Payment', 'approver_role': 'Finance Manager', 'approver_name': 'Michael Chen'}
         ]
-        
-        for step_data in steps:
-            step = ERPProcessStep(
-                process_id=101,
-                step_number=step_data['number'],
-                step_description=step_data['description'],
-                approver_role=step_data['approver_role'],
-                approver_name=step_data['approver_name'],
-                created_at=datetime.utcnow()
-            )
-            db.session.add(step)
+        save_process({
+            'id': 101,
+            'process_name': 'Invoice Processing',
+            'erp_system': 'Finance',
+            'steps': steps
+        }, commit=False)
         
         # Commit all changes
         db.session.commit()
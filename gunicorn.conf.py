@@ -1,3 +1,116 @@
-workers = 4
-bind = "0.0.0.0:$PORT"
-timeout = 120
+"""
+Production gunicorn profile.
+
+Two server roles run side by side on a node (see DEPLOYMENT.md):
+
+* ``api`` (default) - threaded (gthread) workers for the REST API. Threads
+  cover the long, I/O-bound LLM calls; CPU-heavy PDF parsing already runs in
+  a process pool (document_streaming). The app is preloaded in the master
+  and workers are recycled after GUNICORN_MAX_REQUESTS (+ jitter) requests.
+* ``realtime`` - eventlet workers for Socket.IO and the SSE progress
+  streams (``/socket.io/``, ``GET /api/progress/``), where most of the time
+  is spent holding idle connections open. They do not run background jobs.
+
+Extraction job events are emitted from the API role to Socket.IO clients
+connected to the realtime role, so the two-role layout needs
+SOCKETIO_MESSAGE_QUEUE.
+
+Select the role with BPM_SERVER_ROLE; every derived value can be overridden
+with the GUNICORN_* variable named next to it.
+"""
+import multiprocessing
+import os
+
+import preload
+
+role = os.environ.get('BPM_SERVER_ROLE', 'api')
+realtime = role == 'realtime'
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def _memory_mb():
+    """Memory available to this container/host in MB (cgroup limit if there is one)"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value.isdigit() and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except OSError:
+            continue
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 2048
+
+
+def _default_workers():
+    if realtime:
+        # Socket.IO needs sticky sessions across processes; one event loop
+        # handles thousands of idle connections
+        return 1
+    by_cpu = 2 * _cpu_count() + 1
+    by_memory = _memory_mb() // _env_int('GUNICORN_WORKER_MEMORY_MB', 512)
+    return max(1, min(by_cpu, by_memory))
+
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'eventlet' if realtime else 'threading')
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'app:create_wsgi_app()')
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001' if realtime else '5000')}"
+workers = _env_int('GUNICORN_WORKERS', _default_workers())
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'eventlet' if realtime else 'gthread')
+threads = _env_int('GUNICORN_THREADS', 1 if realtime else 4)
+worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+# eventlet must monkey-patch before the app's modules are imported, so
+# realtime workers load the app themselves
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false' if realtime else 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# Recycle API workers to cap slow leaks; the jitter keeps them from restarting
+# together. Realtime workers are not recycled, which would drop their sockets.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 0 if realtime else 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 0 if realtime else 100)
+
+# Worker heartbeat timeout; gthread/eventlet workers keep beating while a
+# request waits on the LLM
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+# Time for in-flight requests to finish on reload/shutdown
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+# Heartbeat files on tmpfs avoid stalls on slow disks
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def on_starting(server):
+    server.log.info(f"Starting {role} profile: {workers} x {worker_class} workers, {threads} threads, "
+                    f"preload_app={preload_app}")
+    if not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        # Job events are emitted by API workers while clients are connected to
+        # the realtime role; without a shared queue they never arrive
+        server.log.warning("SOCKETIO_MESSAGE_QUEUE is not set: /jobs events emitted by the api role "
+                           "will not reach clients connected to the realtime role")
+    if preload_app:
+        # Import the heavy libraries once in the master; forked workers share them copy-on-write
+        preload.preload_modules()
+
+
+def post_worker_init(worker):
+    # Runs in the worker after the app is loaded (and after eventlet patching)
+    from app import init_worker
+    init_worker(worker.wsgi)
@@ -0,0 +1,313 @@
+"""
+Process-wide OpenAI client layer.
+
+Every OpenAI call in the application should go through ``get_llm_client()``
+so that all callers share:
+
+* one pooled ``requests.Session`` (keep-alive connections to the API),
+* token-bucket limits for the account's requests and tokens per minute,
+* jittered exponential backoff on 429s, 5xx errors and timeouts,
+* a small thread pool for concurrent calls (``submit_chat``), and
+* per-model latency and token metrics (``metrics.snapshot()``).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+CHARS_PER_TOKEN = 4
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.TryAgain,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until amount can be taken; returns the seconds spent waiting"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, delta):
+        """Return (positive) or charge (negative) tokens after the real cost is known"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class LLMMetrics:
+    """Per-model call counters, latency percentiles and token usage"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def record(self, model, latency, prompt_tokens=0, completion_tokens=0, retries=0, throttled=0.0, error=False):
+        with self._lock:
+            counters = self._counters[model]
+            counters['calls'] += 1
+            counters['errors'] += int(error)
+            counters['retries'] += retries
+            counters['prompt_tokens'] += prompt_tokens
+            counters['completion_tokens'] += completion_tokens
+            counters['throttled_ms'] += int(throttled * 1000)
+            if not error:
+                self._latencies[model].append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for model, counters in self._counters.items():
+                latencies = sorted(self._latencies[model])
+                stats = dict(counters)
+                if latencies:
+                    stats['latency_ms'] = {
+                        'p50': round(latencies[len(latencies) // 2] * 1000),
+                        'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000),
+                        'max': round(latencies[-1] * 1000)
+                    }
+                result[model] = stats
+            return result
+
+
+class LLMClient:
+    """Shared, rate-limited OpenAI client with retries and metrics"""
+
+    def __init__(self, api_key=None, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=None, max_workers=None, pool_size=None, request_timeout=None):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('LLM_MAX_RETRIES', 5))
+        self.request_timeout = request_timeout or float(os.environ.get('LLM_REQUEST_TIMEOUT', 120))
+        self.request_bucket = TokenBucket(requests_per_minute or int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 500)))
+        self.token_bucket = TokenBucket(tokens_per_minute or int(os.environ.get('LLM_TOKENS_PER_MINUTE', 150000)))
+        self.metrics = LLMMetrics()
+
+        # Keep-alive connections shared by every call in this process
+        pool_size = pool_size or int(os.environ.get('LLM_HTTP_POOL_SIZE', 16))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+            thread_name_prefix='llm'
+        )
+
+    def install_globals(self):
+        """Route direct ``openai.*`` calls (e.g. in backend modules) through the shared session"""
+        openai.api_key = self.api_key
+        openai.requestssession = self.session
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        headers = getattr(error, 'headers', None) or {}
+        if headers.get('retry-after'):
+            try:
+                retry_after = float(headers['retry-after'])
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        delay = random.uniform(0, min(30.0, 2.0 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def _call(self, model, estimated_tokens, fn, /, **kwargs):
+        throttled = self.request_bucket.acquire(1)
+        throttled += self.token_bucket.acquire(estimated_tokens)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = fn(api_key=self.api_key, **kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self.metrics.record(model, time.monotonic() - started, retries=attempt,
+                                        throttled=throttled, error=True)
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.warning(f"OpenAI {type(e).__name__} on {model}, retry {attempt} in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+                self.request_bucket.acquire(1)
+            except Exception:
+                self.metrics.record(model, time.monotonic() - started, retries=attempt,
+                                    throttled=throttled, error=True)
+                raise
+
+        usage = response.get('usage', {}) if isinstance(response, dict) else {}
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        if usage:
+            self.token_bucket.adjust(estimated_tokens - prompt_tokens - completion_tokens)
+        self.metrics.record(model, time.monotonic() - started, prompt_tokens, completion_tokens,
+                            retries=attempt, throttled=throttled)
+        return response
+
+    def chat(self, messages, model=None, max_tokens=None, temperature=0, **kwargs):
+        """Run a ChatCompletion and return the raw response"""
+        model = model or DEFAULT_MODEL
+        prompt_chars = sum(len(m.get('content') or '') for m in messages)
+        estimated = prompt_chars // CHARS_PER_TOKEN + (max_tokens or 1000)
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+        kwargs.setdefault('request_timeout', self.request_timeout)
+        return self._call(model, estimated, openai.ChatCompletion.create,
+                          model=model, messages=messages, temperature=temperature, **kwargs)
+
+    def chat_text(self, messages, **kwargs):
+        """Run a ChatCompletion and return the stripped reply text"""
+        response = self.chat(messages, **kwargs)
+        return response['choices'][0]['message']['content'].strip()
+
+    def chat_stream(self, messages, model=None, max_tokens=None, temperature=0, **kwargs):
+        """Run a streamed ChatCompletion, yielding reply text deltas as they arrive.
+
+        Rate limits and retries cover opening the stream; an error part-way
+        through is raised to the caller, which keeps what it has received.
+        The recorded latency is the time to the start of the stream.
+        """
+        model = model or DEFAULT_MODEL
+        prompt_chars = sum(len(m.get('content') or '') for m in messages)
+        estimated = prompt_chars // CHARS_PER_TOKEN + (max_tokens or 1000)
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+        kwargs.setdefault('request_timeout', self.request_timeout)
+        stream = self._call(model, estimated, openai.ChatCompletion.create,
+                            model=model, messages=messages, temperature=temperature, stream=True, **kwargs)
+
+        completion_chars = 0
+        try:
+            for chunk in stream:
+                choices = chunk.get('choices') or [{}]
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    completion_chars += len(delta)
+                    yield delta
+        finally:
+            # Streamed responses carry no usage block; settle the estimate from the text size
+            self.token_bucket.adjust(estimated - (prompt_chars + completion_chars) // CHARS_PER_TOKEN)
+
+    def submit_chat(self, messages, **kwargs):
+        """Run chat_text on the shared pool; returns a concurrent.futures.Future"""
+        return self.executor.submit(self.chat_text, messages, **kwargs)
+
+    def transcribe(self, audio_file, model='whisper-1', **kwargs):
+        """Transcribe an audio file-like object with Whisper"""
+        start = audio_file.tell() if hasattr(audio_file, 'seek') else None
+
+        def upload(**call_kwargs):
+            # A failed attempt has read the file to EOF; every retry uploads it from the start
+            if start is not None:
+                audio_file.seek(start)
+            return openai.Audio.transcribe(**call_kwargs)
+
+        return self._call(model, 0, upload, model=model, file=audio_file, **kwargs)
+
+    def submit_transcribe(self, audio_file, **kwargs):
+        return self.executor.submit(self.transcribe, audio_file, **kwargs)
+
+
+class _ChatCompletions:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, messages, model=None, max_tokens=None, temperature=0, timeout=None, **kwargs):
+        if timeout is not None:
+            kwargs.setdefault('request_timeout', timeout)
+        return self.client.chat(messages, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+
+class _Chat:
+    def __init__(self, client):
+        self.completions = _ChatCompletions(client)
+
+
+class LLMClientAdapter:
+    """OpenAI-client facade whose chat completions go through an LLMClient.
+
+    Handed to backend classes such as ProcessAnalyzer in place of
+    ``backend.openai_api.OpenAI`` so their calls share the rate limits,
+    backoff and metrics. Both ``client.chat.completions.create(...)`` and
+    ``client.ChatCompletion.create(...)`` are supported (the responses allow
+    attribute and key access); any other attribute is looked up on the
+    wrapped backend client.
+    """
+
+    def __init__(self, client, fallback=None):
+        self.chat = _Chat(client)
+        self.ChatCompletion = self.chat.completions
+        self.api_key = client.api_key
+        self._fallback = fallback
+
+    def __getattr__(self, name):
+        if self._fallback is None:
+            raise AttributeError(name)
+        return getattr(self._fallback, name)
+
+
+_client = None
+_client_lock = threading.Lock()
+_analyzer = None
+
+
+def get_llm_client():
+    """Return the process-wide LLMClient, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+            _client.install_globals()
+        return _client
+
+
+def get_process_analyzer():
+    """Return a shared ProcessAnalyzer instead of building one per request"""
+    global _analyzer
+    client = get_llm_client()
+    with _client_lock:
+        if _analyzer is None:
+            from backend.process_analyzer import ProcessAnalyzer
+            from backend.openai_api import OpenAI
+            # Analyze/compare calls must share the limits, backoff and metrics
+            _analyzer = ProcessAnalyzer(LLMClientAdapter(client, OpenAI(api_key=client.api_key)))
+        return _analyzer
@@ -0,0 +1,346 @@
+"""
+Streaming and fault-tolerant parsing of process JSON produced by the LLM.
+
+An extraction reply used to be read in one piece and handed to
+``json.loads``: nothing was visible until the last token arrived, and one
+malformed character (a truncated tail, a trailing comma, a code fence)
+threw away the whole call. The helpers here make that robust:
+
+* ``StreamingStepParser`` consumes reply text as it streams in and returns
+  each step object of the ``"steps"`` array as soon as its closing brace
+  arrives, so callers can push partial steps to the client.
+* ``parse_process_reply`` parses a complete reply, repairing common damage
+  (fences, chatter, trailing commas, unterminated strings and brackets) and
+  falling back to the steps that were complete before the damage.
+* ``normalize_process`` validates the result against the
+  ``{'name', 'system', 'steps': [{'number', 'name', 'description', 'owner',
+  'role'}]}`` shape used by the rest of the application.
+* ``stream_process_extraction`` ties them together for a streamed
+  ChatCompletion.
+"""
+import json
+import logging
+import os
+import re
+
+from llm_client import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+
+# Alternative field names the model sometimes uses for step fields
+STEP_FIELD_ALIASES = {
+    'number': ('number', 'step_number', 'step', 'order'),
+    'name': ('name', 'step_name', 'title'),
+    'description': ('description', 'step_description', 'details', 'text'),
+    'owner': ('owner', 'approver_name', 'responsible', 'actor'),
+    'role': ('role', 'approver_role')
+}
+
+# Used when a reply names no process or system
+DEFAULT_PROCESS_NAME = 'Extracted Process'
+DEFAULT_SYSTEM = 'Unknown'
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL)
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class ProcessJSONError(ValueError):
+    """Raised when no usable process can be recovered from a model reply"""
+
+
+def _first_value(raw, keys):
+    for key in keys:
+        value = raw.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ', '.join(_text(item) for item in value if item is not None)
+    return str(value).strip()
+
+
+def normalize_step(raw, number):
+    """Validated copy of one step, or None if it carries no usable text.
+
+    ``number`` is used when the step has no (numeric) number of its own.
+    """
+    if isinstance(raw, str):
+        raw = {'description': raw}
+    if not isinstance(raw, dict):
+        return None
+
+    step = {key: value for key, value in raw.items()
+            if not any(key in aliases for aliases in STEP_FIELD_ALIASES.values())}
+    try:
+        step['number'] = int(_first_value(raw, STEP_FIELD_ALIASES['number']))
+    except (TypeError, ValueError):
+        step['number'] = number
+    for field in ('name', 'description', 'owner', 'role'):
+        step[field] = _text(_first_value(raw, STEP_FIELD_ALIASES[field]))
+
+    if not step['description'] and not step['name']:
+        return None
+    step['description'] = step['description'] or step['name']
+    return step
+
+
+def _default_names(steps):
+    # Named after the final number, so done once numbering is settled
+    for step in steps:
+        step['name'] = step['name'] or f"Step {step['number']}"
+    return steps
+
+
+def normalize_process(data, fill_defaults=True):
+    """Validate and repair a parsed extraction into the application's process shape.
+
+    With ``fill_defaults=False`` a missing name or system stays empty instead
+    of becoming a placeholder, for partial results that are merged later.
+    """
+    if isinstance(data, list):
+        data = {'steps': data}
+    if not isinstance(data, dict):
+        data = {}
+    # Some replies wrap the process, e.g. {"process": {...}}
+    if 'steps' not in data:
+        nested = [value for value in data.values() if isinstance(value, dict) and 'steps' in value]
+        if nested:
+            merged = {key: value for key, value in data.items() if not isinstance(value, dict)}
+            merged.update(nested[0])
+            data = merged
+
+    raw_steps = data.get('steps')
+    if not isinstance(raw_steps, list):
+        raw_steps = []
+    steps = []
+    for raw in raw_steps:
+        step = normalize_step(raw, len(steps) + 1)
+        if step is not None:
+            steps.append(step)
+
+    # Step numbers double as diagram node ids, so they must be unique and ascending
+    numbers = [step['number'] for step in steps]
+    if numbers != sorted(set(numbers)):
+        for number, step in enumerate(steps, start=1):
+            step['number'] = number
+    _default_names(steps)
+
+    process = {key: value for key, value in data.items() if key not in ('name', 'system', 'steps')}
+    process['name'] = _text(data.get('name')) or (DEFAULT_PROCESS_NAME if fill_defaults else '')
+    process['system'] = _text(data.get('system')) or (DEFAULT_SYSTEM if fill_defaults else '')
+    process['steps'] = steps
+    return process
+
+
+class StreamingStepParser:
+    """Incrementally pulls complete step objects out of streamed JSON text.
+
+    ``feed`` returns the steps completed by the new text. The parser tracks
+    strings and bracket nesting itself, so it never needs the reply to be
+    valid JSON as a whole: a damaged tail leaves every earlier step intact.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.steps = []
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._steps_depth = None
+        self._steps_closed = False
+        self._step_start = None
+
+    def feed(self, delta):
+        self.text += delta
+        text = self.text
+        completed = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:i]
+                continue
+            if ch.isspace():
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                self._key = None
+                continue
+            if ch == ':':
+                self._key, self._last_string = self._last_string, None
+                continue
+
+            if ch in '{[':
+                self._stack.append(ch)
+                if ch == '[' and self._key == 'steps' and self._steps_depth is None:
+                    self._steps_depth = len(self._stack)
+                elif ch == '{' and self._in_steps() and len(self._stack) == self._steps_depth + 1:
+                    self._step_start = i
+            elif ch in '}]' and self._stack:
+                if ch == '}' and self._step_start is not None and len(self._stack) == self._steps_depth + 1:
+                    step = self._parse_step(text[self._step_start:i + 1])
+                    if step is not None:
+                        self.steps.append(step)
+                        completed.append(step)
+                    self._step_start = None
+                self._stack.pop()
+                if self._in_steps() and len(self._stack) < self._steps_depth:
+                    self._steps_closed = True
+            self._key = None
+            self._last_string = None
+        self._pos = len(text)
+        return completed
+
+    def _in_steps(self):
+        return self._steps_depth is not None and not self._steps_closed
+
+    def _parse_step(self, fragment):
+        try:
+            raw = json.loads(fragment)
+        except ValueError:
+            try:
+                raw = json.loads(_TRAILING_COMMA.sub(r'\1', fragment))
+            except ValueError:
+                logger.warning(f"Skipping malformed streamed step: {fragment[:200]}")
+                return None
+        step = normalize_step(raw, len(self.steps) + 1)
+        # Streamed numbering must stay unique for clients rendering partial diagrams
+        if step is not None and self.steps and step['number'] <= self.steps[-1]['number']:
+            step['number'] = self.steps[-1]['number'] + 1
+        return _default_names([step])[0] if step is not None else None
+
+
+def _strip_wrapping(text):
+    """Drop code fences and any chatter before the first JSON bracket"""
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    return text[min(starts):] if starts else text
+
+
+def _close_truncated(text):
+    """Candidate completions of a truncated JSON document, longest first.
+
+    The text is cut back to the end of a complete object or array, so an
+    element that was cut off part-way is dropped rather than half-kept.
+    """
+    stack, in_string, escape = [], False, False
+    cuts = []
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append(ch)
+        elif ch in '}]' and stack:
+            stack.pop()
+            cuts.append((i + 1, list(stack)))
+
+    closers = {'{': '}', '[': ']'}
+    return [text[:cut] + ''.join(closers[c] for c in reversed(open_stack))
+            for cut, open_stack in reversed(cuts[-50:])]
+
+
+def repair_json(text):
+    """Parse JSON from a model reply, repairing fences, chatter, trailing commas and truncation.
+
+    Returns ``(data, repaired)``; raises ValueError when nothing parses.
+    """
+    text = _strip_wrapping(text.strip())
+    decoder = json.JSONDecoder()
+    try:
+        # raw_decode ignores anything the model wrote after the object
+        return decoder.raw_decode(text)[0], False
+    except ValueError:
+        pass
+
+    cleaned = _TRAILING_COMMA.sub(r'\1', text)
+    for candidate in [cleaned] + _close_truncated(cleaned):
+        try:
+            return decoder.raw_decode(_TRAILING_COMMA.sub(r'\1', candidate))[0], True
+        except ValueError:
+            continue
+    raise ValueError("No JSON object could be recovered from the model reply")
+
+
+def parse_process_reply(text, require_steps=True, fill_defaults=True):
+    """Parse and validate a complete extraction reply.
+
+    Returns ``(process_info, repaired)``. When the reply cannot be parsed at
+    all, the steps completed before the damage are kept. Raises
+    ProcessJSONError if ``require_steps`` and no step could be recovered.
+    """
+    try:
+        data, repaired = repair_json(text or '')
+    except ValueError:
+        parser = StreamingStepParser()
+        parser.feed(text or '')
+        data, repaired = {'steps': parser.steps}, True
+        match = re.search(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"', text or '')
+        if match:
+            data['name'] = json.loads(f'"{match.group(1)}"')
+
+    process_info = normalize_process(data, fill_defaults=fill_defaults)
+    if repaired:
+        logger.warning(f"Repaired malformed extraction reply; recovered {len(process_info['steps'])} steps")
+    if require_steps and not process_info['steps']:
+        raise ProcessJSONError("The model reply did not contain any usable process steps")
+    return process_info, repaired
+
+
+def stream_process_extraction(prompt, on_steps=None, model=None, max_tokens=None):
+    """Run an extraction prompt as a streamed ChatCompletion.
+
+    ``on_steps(steps)`` is called with each batch of newly completed steps
+    while the reply is still streaming. Returns ``(process_info, complete)``
+    where ``complete`` is False when the reply was repaired or the stream
+    broke off after some steps had arrived.
+    """
+    parser = StreamingStepParser()
+    interrupted = None
+    try:
+        for delta in get_llm_client().chat_stream(
+            [{"role": "user", "content": prompt}],
+            model=model or STREAM_MODEL,
+            max_tokens=max_tokens,
+            temperature=0
+        ):
+            steps = parser.feed(delta)
+            if steps and on_steps:
+                on_steps(steps)
+    except Exception as e:
+        if not parser.steps:
+            raise
+        # Keep the prefix that already arrived instead of failing the whole call
+        interrupted = e
+        logger.warning(f"Extraction stream interrupted after {len(parser.steps)} steps: {str(e)}")
+
+    process_info, repaired = parse_process_reply(parser.text)
+    if len(parser.steps) > len(process_info['steps']):
+        process_info['steps'] = normalize_process({'steps': parser.steps})['steps']
+    return process_info, not (repaired or interrupted)
@@ -0,0 +1,152 @@
+"""
+Audio segmentation helpers for the realtime meeting backend.
+
+``SpeechSegmenter`` replaces fixed 5-second windows with energy-based voice
+activity detection: it cuts segments at pauses in speech and never emits
+windows that contain only silence.
+"""
+import base64
+import io
+import wave
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2  # 16-bit mono PCM
+
+
+def pcm_to_wav(pcm_bytes):
+    """Wrap raw 16-bit mono PCM in a WAV container for the Whisper API"""
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(BYTES_PER_SAMPLE)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm_bytes)
+    return output.getvalue()
+
+
+class SpeechSegmenter:
+    """Energy-based voice activity segmenter over a 16-bit PCM stream.
+
+    Audio is split into short frames and each frame's RMS energy is compared
+    with an adaptive noise floor. A segment starts at the first speech frame
+    (plus a little pre-roll) and ends after ``silence_ms`` of quiet, or is cut
+    at ``max_segment`` seconds. Segments shorter than ``min_segment`` seconds
+    of speech (coughs, clicks) are discarded.
+    """
+
+    def __init__(self, frame_ms=30, min_segment=1.0, max_segment=15.0, silence_ms=600,
+                 padding_ms=200, threshold_ratio=3.0, min_rms=300.0):
+        self.frame_samples = SAMPLE_RATE * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * BYTES_PER_SAMPLE
+        self.min_speech_frames = int(min_segment * 1000 / frame_ms)
+        self.max_frames = int(max_segment * 1000 / frame_ms)
+        self.silence_frames = int(silence_ms / frame_ms)
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+
+        self.noise_floor = min_rms / threshold_ratio
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=max(1, int(padding_ms / frame_ms)))
+        self._segment = bytearray(self.max_frames * self.frame_bytes)
+        self._segment_view = memoryview(self._segment)
+        self._segment_frames = 0
+        self._speech_frames = 0
+        self._trailing_silence = 0
+        self.skipped_frames = 0
+
+    def to_dict(self):
+        """Serializable snapshot of the utterance in progress for the shared session store"""
+        return {
+            'pending': base64.b64encode(bytes(self._pending)).decode('ascii'),
+            'preroll': [base64.b64encode(frame).decode('ascii') for frame in self._preroll],
+            'segment': base64.b64encode(self._segment_view[:self._segment_frames * self.frame_bytes]).decode('ascii'),
+            'speech_frames': self._speech_frames,
+            'trailing_silence': self._trailing_silence,
+            'noise_floor': self.noise_floor
+        }
+
+    def load_dict(self, data):
+        """Resume the utterance another worker was segmenting"""
+        self._pending = bytearray(base64.b64decode(data.get('pending', '')))
+        self._preroll.clear()
+        self._preroll.extend(base64.b64decode(frame) for frame in data.get('preroll', []))
+        segment = base64.b64decode(data.get('segment', ''))[:len(self._segment)]
+        self._segment_frames = len(segment) // self.frame_bytes
+        self._segment_view[:self._segment_frames * self.frame_bytes] = segment[:self._segment_frames * self.frame_bytes]
+        self._speech_frames = data.get('speech_frames', 0)
+        self._trailing_silence = data.get('trailing_silence', 0)
+        self.noise_floor = data.get('noise_floor', self.noise_floor)
+
+    @property
+    def in_speech(self):
+        return self._segment_frames > 0
+
+    def _frame_energies(self, data):
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32)
+        frames = samples.reshape(-1, self.frame_samples)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def _append(self, frame):
+        offset = self._segment_frames * self.frame_bytes
+        self._segment_view[offset:offset + self.frame_bytes] = frame
+        self._segment_frames += 1
+
+    def _finish(self):
+        length = self._segment_frames * self.frame_bytes
+        speech_frames = self._speech_frames
+        self._segment_frames = 0
+        self._speech_frames = 0
+        self._trailing_silence = 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        return bytes(self._segment_view[:length])
+
+    def feed(self, pcm_bytes):
+        """Consume PCM bytes and return a list of completed speech segments"""
+        self._pending += pcm_bytes
+        usable = len(self._pending) - len(self._pending) % self.frame_bytes
+        if not usable:
+            return []
+        data = bytes(self._pending[:usable])
+        del self._pending[:usable]
+
+        segments = []
+        energies = self._frame_energies(data)
+        for index, energy in enumerate(energies):
+            frame = data[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+            is_speech = energy > max(self.min_rms, self.noise_floor * self.threshold_ratio)
+
+            if not self.in_speech:
+                if not is_speech:
+                    # Track background level only while nobody is talking
+                    self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(energy)
+                    self._preroll.append(frame)
+                    self.skipped_frames += 1
+                    continue
+                for preroll_frame in self._preroll:
+                    self._append(preroll_frame)
+                self._preroll.clear()
+
+            self._append(frame)
+            if is_speech:
+                self._speech_frames += 1
+                self._trailing_silence = 0
+            else:
+                self._trailing_silence += 1
+
+            if self._trailing_silence >= self.silence_frames or self._segment_frames >= self.max_frames:
+                segment = self._finish()
+                if segment:
+                    segments.append(segment)
+        return segments
+
+    def flush(self):
+        """Return the segment in progress (if it holds enough speech) and reset"""
+        self._pending.clear()
+        self._preroll.clear()
+        if not self.in_speech:
+            return None
+        return self._finish()
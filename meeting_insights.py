@@ -0,0 +1,192 @@
+"""
+Rolling meeting state for incremental insights.
+
+Instead of one ChatCompletion per transcribed segment, each meeting keeps a
+compact running summary plus the last few transcript segments. New
+transcripts are batched until enough has been said (and enough time has
+passed) to warrant a fresh insight; one call then returns the insight and an
+updated summary, so prompt size stays bounded however long the meeting runs.
+When the model finds nothing new to say, the debounce interval backs off, so
+quiet or repetitive meetings trigger fewer calls over time.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from llm_client import get_llm_client
+from llm_stream import repair_json
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_MODEL = os.environ.get('MEETING_INSIGHT_MODEL', 'gpt-3.5-turbo')
+
+INSIGHT_PROMPT = """You are assisting in a live business meeting.
+
+Meeting summary so far:
+{summary}
+
+Recent discussion:
+{recent}
+
+New since the last insight:
+{new}
+
+Return ONLY a JSON object:
+{{"summary": "updated meeting summary, at most {summary_words} words",
+  "insight": "one new actionable insight, or an empty string if nothing new is worth saying"}}"""
+
+
+class MeetingState:
+    """Running summary, recent segments and debounce state for one meeting"""
+
+    def __init__(self, recent_segments=None, min_interval=None, max_interval=None,
+                 min_new_words=None, summary_words=None):
+        self.recent = deque(maxlen=recent_segments or int(os.environ.get('MEETING_RECENT_SEGMENTS', 6)))
+        self.base_interval = min_interval or float(os.environ.get('MEETING_INSIGHT_MIN_INTERVAL', 20))
+        self.max_interval = max_interval or float(os.environ.get('MEETING_INSIGHT_MAX_INTERVAL', 180))
+        self.min_new_words = min_new_words or int(os.environ.get('MEETING_INSIGHT_MIN_WORDS', 40))
+        self.summary_words = summary_words or int(os.environ.get('MEETING_SUMMARY_WORDS', 150))
+
+        self.summary = ''
+        self.interval = self.base_interval
+        self.last_insight_at = time.monotonic()
+        self.calls = 0
+        self._new = []
+        self._new_words = 0
+        # Transcripts of the call in progress; they join recent once it succeeds
+        self._inflight = []
+        self._analyzing = False
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        """Serializable snapshot for the shared session store"""
+        with self._lock:
+            return {
+                'summary': self.summary,
+                'recent': list(self.recent),
+                'new': self._inflight + self._new,
+                'interval': self.interval,
+                'calls': self.calls
+            }
+
+    def load_dict(self, data):
+        """Restore a snapshot saved by another worker"""
+        with self._lock:
+            self.summary = data.get('summary', '')
+            self.recent.clear()
+            self.recent.extend(data.get('recent', []))
+            self._new = list(data.get('new', []))
+            self._new_words = sum(len(text.split()) for text in self._new)
+            self.interval = data.get('interval', self.base_interval)
+            self.calls = data.get('calls', 0)
+
+    def add_transcript(self, text):
+        """Record a transcript segment; returns True if an insight is now due"""
+        text = (text or '').strip()
+        if not text:
+            return False
+        with self._lock:
+            self._new.append(text)
+            self._new_words += len(text.split())
+            return self._is_due()
+
+    def _is_due(self):
+        if self._analyzing or not self._new:
+            return False
+        elapsed = time.monotonic() - self.last_insight_at
+        # Enough new talk after the debounce interval, or anything new once
+        # the maximum interval has passed
+        return (elapsed >= self.interval and self._new_words >= self.min_new_words) or \
+            elapsed >= self.max_interval
+
+    def seconds_until_due(self):
+        """Seconds until the pending transcripts become due on their own.
+
+        None when nothing waits or a call is in progress (its caller checks again).
+        """
+        with self._lock:
+            if not self._new or self._analyzing:
+                return None
+            wait = self.interval if self._new_words >= self.min_new_words else self.max_interval
+            return max(0.0, wait - (time.monotonic() - self.last_insight_at))
+
+    def take_batch(self):
+        """Claim the pending transcripts for one insight call, or None if not due"""
+        with self._lock:
+            if not self._is_due():
+                return None
+            self._analyzing = True
+            self._inflight = self._new
+            self._new = []
+            self._new_words = 0
+            return {
+                'summary': self.summary,
+                'recent': list(self.recent),
+                'new': list(self._inflight)
+            }
+
+    def apply_result(self, batch, summary, insight):
+        with self._lock:
+            self._analyzing = False
+            self._inflight = []
+            self.recent.extend(batch['new'])
+            self.calls += 1
+            self.last_insight_at = time.monotonic()
+            if summary:
+                self.summary = summary
+            # Back off while the model has nothing new to add
+            if insight:
+                self.interval = self.base_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * 2)
+
+    def abandon_batch(self, batch):
+        """Put a batch back after a failed call so its transcripts are not lost"""
+        with self._lock:
+            self._analyzing = False
+            self._inflight = []
+            self._new = batch['new'] + self._new
+            self._new_words = sum(len(text.split()) for text in self._new)
+
+
+def _parse_result(content, batch):
+    """(summary, insight) from a reply; a reply without a JSON object is the insight itself"""
+    try:
+        result, _ = repair_json(content)
+    except ValueError:
+        result = None
+    if not isinstance(result, dict):
+        return batch['summary'], content.strip()
+    return (str(result.get('summary') or '').strip(), str(result.get('insight') or '').strip())
+
+
+def generate_insight(state):
+    """Run one insight call for a meeting if one is due; returns the insight or None"""
+    batch = state.take_batch()
+    if batch is None:
+        return None
+
+    prompt = INSIGHT_PROMPT.format(
+        summary=batch['summary'] or '(meeting just started)',
+        recent='\n'.join(batch['recent']) or '(none)',
+        new='\n'.join(batch['new']),
+        summary_words=state.summary_words
+    )
+    applied = False
+    try:
+        content = get_llm_client().chat_text(
+            [{"role": "user", "content": prompt}],
+            model=INSIGHT_MODEL,
+            max_tokens=state.summary_words * 2 + 100,
+            temperature=0.3
+        )
+        summary, insight = _parse_result(content, batch)
+        state.apply_result(batch, summary, insight)
+        applied = True
+    finally:
+        # Whatever failed, the meeting must be able to get its next insight
+        if not applied:
+            state.abandon_batch(batch)
+    return {'insight': insight, 'summary': state.summary}
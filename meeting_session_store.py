@@ -0,0 +1,152 @@
+"""
+Pluggable session-state storage for the realtime meeting audio path.
+
+With several worker processes (or nodes) a client's audio chunks can land on
+different workers. Every worker appends incoming chunks to a shared spool for
+the session; whichever worker holds the session's lease drains the spool,
+runs segmentation/transcription and saves the session state (running
+summary, recent transcripts, the utterance being segmented and the
+transcript sequence) back to the store. The holder renews the lease on every
+chunk and from a timer while the client is connected; a lease that is not
+renewed within its TTL (e.g. its worker died) is taken over by the next
+worker that receives a chunk, which resumes from the saved state.
+
+Backends are selected with MEETING_SESSION_STORE:
+
+* ``memory`` (default) - in-process dicts; single worker only.
+* ``sqlite:///path/to/spool.db`` - a SQLite spool shared by all workers on
+  one node. Multi-node deployments use sticky sessions at the load balancer
+  so a client stays on one node (see DEPLOYMENT.md).
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemorySessionStore:
+    """In-process store; every lease request succeeds"""
+
+    def __init__(self):
+        self._audio = {}
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def append_audio(self, sid, chunk):
+        with self._lock:
+            self._audio.setdefault(sid, []).append(bytes(chunk))
+
+    def drain_audio(self, sid):
+        with self._lock:
+            return b''.join(self._audio.pop(sid, []))
+
+    def acquire(self, sid, owner=WORKER_ID, ttl=10):
+        return True
+
+    def load_state(self, sid):
+        with self._lock:
+            return self._state.get(sid)
+
+    def save_state(self, sid, state):
+        with self._lock:
+            self._state[sid] = state
+
+    def delete(self, sid):
+        with self._lock:
+            self._audio.pop(sid, None)
+            self._state.pop(sid, None)
+
+
+class SQLiteSessionStore:
+    """Audio spool and meeting state in a SQLite file shared by local workers"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meeting_audio_spool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sid TEXT NOT NULL,
+                    chunk BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_meeting_audio_spool_sid ON meeting_audio_spool (sid, id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meeting_sessions (
+                    sid TEXT PRIMARY KEY,
+                    owner TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    state TEXT
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append_audio(self, sid, chunk):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO meeting_audio_spool (sid, chunk) VALUES (?, ?)", (sid, bytes(chunk)))
+
+    def drain_audio(self, sid):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, chunk FROM meeting_audio_spool WHERE sid = ? ORDER BY id", (sid,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM meeting_audio_spool WHERE sid = ? AND id <= ?", (sid, rows[-1][0]))
+            conn.execute("COMMIT")
+            return b''.join(row[1] for row in rows)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, sid, owner=WORKER_ID, ttl=10):
+        """Take or renew the session lease; False if another live worker holds it"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO meeting_sessions (sid) VALUES (?)", (sid,))
+            cursor = conn.execute(
+                "UPDATE meeting_sessions SET owner = ?, lease_expires = ? "
+                "WHERE sid = ? AND (owner = ? OR owner IS NULL OR lease_expires < ?)",
+                (owner, now + ttl, sid, owner, now)
+            )
+            return cursor.rowcount == 1
+
+    def load_state(self, sid):
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM meeting_sessions WHERE sid = ?", (sid,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def save_state(self, sid, state):
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO meeting_sessions (sid) VALUES (?)", (sid,))
+            conn.execute("UPDATE meeting_sessions SET state = ? WHERE sid = ?", (json.dumps(state), sid))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM meeting_audio_spool WHERE sid = ?", (sid,))
+            conn.execute("DELETE FROM meeting_sessions WHERE sid = ?", (sid,))
+
+
+def get_session_store(url=None):
+    """Build the session store configured by MEETING_SESSION_STORE"""
+    url = url or os.environ.get('MEETING_SESSION_STORE', 'memory')
+    if url == 'memory':
+        return MemorySessionStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported MEETING_SESSION_STORE: {url}")
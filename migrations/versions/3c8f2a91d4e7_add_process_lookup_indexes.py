@@ -0,0 +1,56 @@
+"""Add composite indexes for process lookups
+
+Revision ID: 3c8f2a91d4e7
+Revises: a1d9e6b3f052
+Create Date: 2026-10-18 11:20:00.000000
+
+Matches the hot access paths:
+
+* steps of a process in order (analyze/compare/batch endpoints)
+* versions of a process by name, newest first (list-process-versions)
+* gap analyses by AS-IS or TO-BE process
+
+Tables may already carry equivalent indexes (or not exist yet) on databases
+built with ``db.create_all()``, so each index is only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f2a91d4e7'
+down_revision = 'a1d9e6b3f052'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_erp_process_steps_process_id_step_number', 'erp_process_steps', ['process_id', 'step_number']),
+    ('ix_erp_processes_process_name_created_at', 'erp_processes', ['process_name', 'created_at']),
+    ('ix_gap_analyses_asis_process_id', 'gap_analyses', ['asis_process_id']),
+    ('ix_gap_analyses_tobe_process_id', 'gap_analyses', ['tobe_process_id']),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {index['name']: index['column_names'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing = _existing_indexes(inspector, table)
+        if name in existing or columns in existing.values():
+            continue
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
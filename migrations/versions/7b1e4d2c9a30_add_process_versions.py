@@ -0,0 +1,66 @@
+"""Add delta-based process version tables
+
+Revision ID: 7b1e4d2c9a30
+Revises: 3c8f2a91d4e7
+Create Date: 2026-10-18 12:05:00.000000
+
+Databases initialised with ``db.create_all()`` may already have these
+tables, so they are only created when missing. Existing processes get their
+history recorded by init_database (``python create_tables.py``), which runs
+process_versions.backfill_all_versions after the upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1e4d2c9a30'
+down_revision = '3c8f2a91d4e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'process_versions' not in tables:
+        op.create_table(
+            'process_versions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('process_name', sa.String(length=255), nullable=False),
+            sa.Column('version_number', sa.Integer(), nullable=False),
+            sa.Column('base_version', sa.Integer(), nullable=False),
+            sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+            sa.Column('process_id', sa.Integer(), nullable=True),
+            sa.Column('erp_system', sa.String(length=100), nullable=True),
+            sa.Column('step_count', sa.Integer(), nullable=False),
+            sa.Column('changed_steps', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['process_id'], ['erp_processes.id'], ondelete='SET NULL'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('process_name', 'version_number', name='uq_process_versions_name_number')
+        )
+        op.create_index('ix_process_versions_process_id', 'process_versions', ['process_id'])
+
+    if 'process_version_steps' not in tables:
+        op.create_table(
+            'process_version_steps',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version_id', sa.Integer(), nullable=False),
+            sa.Column('step_number', sa.Integer(), nullable=False),
+            sa.Column('operation', sa.String(length=10), nullable=False),
+            sa.Column('step_description', sa.Text(), nullable=True),
+            sa.Column('approver_role', sa.String(length=255), nullable=True),
+            sa.Column('approver_name', sa.String(length=255), nullable=True),
+            sa.ForeignKeyConstraint(['version_id'], ['process_versions.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_process_version_steps_version_id_step_number', 'process_version_steps',
+                        ['version_id', 'step_number'])
+
+
+def downgrade():
+    op.drop_index('ix_process_version_steps_version_id_step_number', table_name='process_version_steps')
+    op.drop_table('process_version_steps')
+    op.drop_index('ix_process_versions_process_id', table_name='process_versions')
+    op.drop_table('process_versions')
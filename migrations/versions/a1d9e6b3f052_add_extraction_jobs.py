@@ -0,0 +1,45 @@
+"""Add extraction job table
+
+Revision ID: a1d9e6b3f052
+Revises:
+Create Date: 2026-10-18 09:40:00.000000
+
+Databases initialised with ``db.create_all()`` may already have this
+table, so it is only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d9e6b3f052'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'extraction_jobs' not in tables:
+        op.create_table(
+            'extraction_jobs',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=False),
+            sa.Column('file_path', sa.String(length=1024), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('stage', sa.String(length=50), nullable=True),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_extraction_jobs_status', 'extraction_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_extraction_jobs_status', table_name='extraction_jobs')
+    op.drop_table('extraction_jobs')
@@ -0,0 +1,63 @@
+"""Add batch gap analysis job tables
+
+Revision ID: c45d8e0f1b62
+Revises: 7b1e4d2c9a30
+Create Date: 2026-10-18 13:10:00.000000
+
+Databases initialised with ``db.create_all()`` may already have these
+tables, so they are only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c45d8e0f1b62'
+down_revision = '7b1e4d2c9a30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'batch_gap_jobs' not in tables:
+        op.create_table(
+            'batch_gap_jobs',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('filters', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('completed', sa.Integer(), nullable=False),
+            sa.Column('failed', sa.Integer(), nullable=False),
+            sa.Column('pairs_per_minute', sa.Float(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_batch_gap_jobs_status', 'batch_gap_jobs', ['status'])
+
+    if 'batch_gap_items' not in tables:
+        op.create_table(
+            'batch_gap_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('job_id', sa.String(length=36), nullable=False),
+            sa.Column('asis_process_id', sa.Integer(), nullable=False),
+            sa.Column('tobe_process_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('analysis_id', sa.Integer(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['job_id'], ['batch_gap_jobs.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_batch_gap_items_job_id_status', 'batch_gap_items', ['job_id', 'status'])
+
+
+def downgrade():
+    op.drop_index('ix_batch_gap_items_job_id_status', table_name='batch_gap_items')
+    op.drop_table('batch_gap_items')
+    op.drop_index('ix_batch_gap_jobs_status', table_name='batch_gap_jobs')
+    op.drop_table('batch_gap_jobs')
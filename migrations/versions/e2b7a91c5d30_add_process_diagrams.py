@@ -0,0 +1,40 @@
+"""Add stored process diagrams
+
+Revision ID: e2b7a91c5d30
+Revises: c45d8e0f1b62
+Create Date: 2026-10-18 16:40:00.000000
+
+Databases initialised with ``db.create_all()`` may already have this
+table, so it is only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7a91c5d30'
+down_revision = 'c45d8e0f1b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'process_diagrams' not in tables:
+        op.create_table(
+            'process_diagrams',
+            sa.Column('process_id', sa.Integer(), nullable=False),
+            sa.Column('content_hash', sa.String(length=64), nullable=False),
+            sa.Column('mermaid', sa.Text(), nullable=False),
+            sa.Column('previous_hash', sa.String(length=64), nullable=True),
+            sa.Column('previous_mermaid', sa.Text(), nullable=True),
+            sa.Column('step_count', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['process_id'], ['erp_processes.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('process_id')
+        )
+
+
+def downgrade():
+    op.drop_table('process_diagrams')
@@ -0,0 +1,30 @@
+"""Keep extracted step details next to stored process diagrams
+
+Revision ID: f3c8d20a6e47
+Revises: e2b7a91c5d30
+Create Date: 2026-10-19 10:15:00.000000
+
+Databases initialised with ``db.create_all()`` may already have the
+column, so it is only added when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d20a6e47'
+down_revision = 'e2b7a91c5d30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('process_diagrams')}
+    if 'step_details' not in columns:
+        with op.batch_alter_table('process_diagrams') as batch_op:
+            batch_op.add_column(sa.Column('step_details', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('process_diagrams') as batch_op:
+        batch_op.drop_column('step_details')
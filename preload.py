@@ -0,0 +1,55 @@
+"""
+Preloading of heavy modules in the gunicorn master.
+
+Every worker used to import pandas, numpy, openpyxl, OpenCV, PyPDF2 and the
+OpenAI/backend modules on its own, and the modules imported lazily inside
+request handlers (DocumentProcessor, ProcessAnalyzer, OpenAI) were only
+loaded by the first request that needed them. ``preload_modules`` imports
+them once in the master (see the ``on_starting`` hook in gunicorn.conf.py);
+forked workers then find them in ``sys.modules`` and share their memory
+pages copy-on-write.
+
+Only modules are imported here: no database connections, HTTP sessions or
+threads may be created before the fork. Extra modules can be listed in
+BPM_PRELOAD_MODULES (comma separated).
+"""
+import importlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = (
+    'numpy', 'pandas', 'openpyxl', 'cv2', 'PyPDF2', 'docx', 'fpdf',
+    'openai', 'requests', 'sqlalchemy', 'flask_sqlalchemy', 'flask_socketio',
+)
+# Imported lazily inside request handlers; loading them here spares the first request
+APP_MODULES = (
+    'backend.models', 'backend.document_processor', 'backend.process_analyzer', 'backend.openai_api',
+)
+
+
+def preload_modules(modules=None):
+    """Import the given (default: heavy and app) modules; returns {module: seconds}.
+
+    Modules that are not installed or fail to import are logged and skipped.
+    """
+    if modules is None:
+        extra = [name.strip() for name in os.environ.get('BPM_PRELOAD_MODULES', '').split(',') if name.strip()]
+        modules = HEAVY_MODULES + APP_MODULES + tuple(extra)
+
+    timings = {}
+    started = time.perf_counter()
+    for name in modules:
+        module_started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Could not preload {name}: {str(e)}")
+            continue
+        timings[name] = time.perf_counter() - module_started
+
+    logger.info(f"Preloaded {len(timings)} of {len(modules)} modules in "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms (pid {os.getpid()})")
+    return timings
@@ -0,0 +1,142 @@
+"""
+Mermaid flowcharts stored per process.
+
+Diagrams are drawn by process_flowchart and keyed by a hash over the fields
+they are drawn from. The latest diagram of each stored process lives in
+``process_diagrams`` together with the one before it and the extracted step
+names, types and ``next_steps`` that the step table does not hold, so a
+diagram drawn at upload still matches on later reads. List and detail views
+read that row instead of rebuilding the diagram, and a client that already
+holds the previous diagram is sent only the changed lines (see
+``diagram_payload``).
+"""
+import json
+import logging
+from datetime import datetime
+
+from backend.models import db
+from process_flowchart import diagram_hash, diagram_source, diff_diagrams, render_diagram, step_details, with_details
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessDiagram(db.Model):
+    __tablename__ = 'process_diagrams'
+
+    process_id = db.Column(db.Integer, db.ForeignKey('erp_processes.id', ondelete='CASCADE'), primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    mermaid = db.Column(db.Text, nullable=False)
+    # The diagram before the latest change, so clients holding it get a diff
+    previous_hash = db.Column(db.String(64))
+    previous_mermaid = db.Column(db.Text)
+    step_count = db.Column(db.Integer, nullable=False, default=0)
+    # JSON of what the step table cannot hold (extracted names, types,
+    # next_steps), keyed by step number
+    step_details = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def stored_diagram_source(process, steps, session=None):
+    """diagram_source for a loaded process, using the details kept on its diagram row"""
+    from process_queries import serialize_process
+    session = session or db.session
+    row = session.query(ProcessDiagram).filter_by(process_id=process.id).first()
+    return {'steps': with_details(serialize_process(process, steps)['steps'], _load_details(row))}
+
+
+def _load_details(row):
+    if row is None or not row.step_details:
+        return {}
+    try:
+        return json.loads(row.step_details)
+    except ValueError:
+        logger.warning(f"Ignoring unreadable step details of process {row.process_id}")
+        return {}
+
+
+def _save(session, process_id, steps, details, row):
+    """Render steps and write them to the process's diagram row if they changed"""
+    source = {'steps': steps}
+    key = diagram_hash(source)
+    if row is not None and row.content_hash == key:
+        return row, False
+
+    key, mermaid = render_diagram(source, known_hash=key)
+    if row is None:
+        row = ProcessDiagram(process_id=process_id)
+        session.add(row)
+    else:
+        row.previous_hash, row.previous_mermaid = row.content_hash, row.mermaid
+    row.content_hash = key
+    row.mermaid = mermaid
+    row.step_count = len(steps)
+    row.step_details = json.dumps(details, sort_keys=True) if details else None
+    row.updated_at = datetime.utcnow()
+    logger.info(f"Stored diagram {key[:12]} for process {process_id}")
+    return row, True
+
+
+def store_diagram(process_id, process_info, session=None, commit=True):
+    """Render and persist the diagram of a just-stored process; returns its ProcessDiagram row.
+
+    The diagram is drawn from the steps as readers will load them plus the
+    extraction fields the step table drops (names, types, next_steps), which
+    are kept on the row, so reads find it current instead of redrawing it.
+    """
+    session = session or db.session
+    details = step_details(process_info)
+    try:
+        row = session.query(ProcessDiagram).filter_by(process_id=process_id).first()
+        row, changed = _save(session, process_id, diagram_source(process_info)['steps'], details, row)
+        if changed and commit:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return row
+
+
+def diagrams_for(loaded, session=None):
+    """Current diagram rows for processes from process_queries.load_processes.
+
+    Stored diagrams are fetched in one query; only processes whose steps
+    changed since (or that have none yet) are re-rendered and written back.
+    """
+    from process_queries import serialize_process
+    session = session or db.session
+    if not loaded:
+        return {}
+
+    process_ids = [process.id for process, _ in loaded.values()]
+    stored = {row.process_id: row for row in
+              session.query(ProcessDiagram).filter(ProcessDiagram.process_id.in_(process_ids)).all()}
+
+    diagrams = {}
+    changed = 0
+    try:
+        for key, (process, steps) in loaded.items():
+            row = stored.get(process.id)
+            details = _load_details(row)
+            steps = with_details(serialize_process(process, steps)['steps'], details)
+            diagrams[key], saved = _save(session, process.id, steps, details, row)
+            changed += saved
+        if changed:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    logger.debug(f"Diagrams for {len(diagrams)} processes, {changed} re-rendered")
+    return diagrams
+
+
+def diagram_payload(row, since=None):
+    """API form of a diagram row; only the diff when the client holds the previous diagram"""
+    payload = {'process_id': row.process_id, 'content_hash': row.content_hash}
+    if since and since == row.content_hash:
+        payload['unchanged'] = True
+    elif since and since == row.previous_hash and row.previous_mermaid is not None:
+        payload['base_hash'] = row.previous_hash
+        payload['diff'] = diff_diagrams(row.previous_mermaid, row.mermaid)
+    else:
+        payload['mermaid_diagram'] = row.mermaid
+    return payload
@@ -0,0 +1,144 @@
+"""
+Local structural diff between two processes.
+
+Most of what distinguishes two versions of a process - steps added, removed
+or moved, a different owner or role - can be found by aligning the step
+lists, without asking the LLM. ``diff_processes`` aligns the normalized step
+descriptions with difflib, detects moved steps, pairs up reworded steps by
+similarity and reports role/owner changes on every matched step. Only the
+reworded, added and removed steps (the semantic residue) are worth sending
+to ``ProcessAnalyzer.compare_processes``; when there are none, or the only
+rewording is typo-level, the comparison is answered entirely from the local
+diff.
+"""
+import re
+from difflib import SequenceMatcher
+
+# A removed and an added step at least this similar are treated as the same
+# step reworded rather than two unrelated steps
+MODIFIED_SIMILARITY = 0.6
+# Rewordings at least this similar (typos, articles) need no semantic review
+TRIVIAL_SIMILARITY = 0.9
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_description(text):
+    """Lower-case, punctuation-free, whitespace-collapsed step text"""
+    return ' '.join(_PUNCTUATION.sub(' ', (text or '').lower()).split())
+
+
+def _step_ref(step):
+    return {
+        'number': step.get('number'),
+        'description': step.get('description', ''),
+        'owner': step.get('owner', ''),
+        'role': step.get('role', '')
+    }
+
+
+def _field_changes(before, after):
+    return [{
+        'step': after.get('number'),
+        'field': field,
+        'before': before.get(field) or '',
+        'after': after.get(field) or ''
+    } for field in ('owner', 'role') if (before.get(field) or '') != (after.get(field) or '')]
+
+
+def _pair_similar(removed, added, old_norm, new_norm):
+    """Greedily pair removed and added steps that are the same step reworded"""
+    pairs, used = [], set()
+    for i in removed:
+        best, best_ratio = None, MODIFIED_SIMILARITY
+        for j in added:
+            if j in used:
+                continue
+            ratio = SequenceMatcher(None, old_norm[i], new_norm[j], autojunk=False).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = j, ratio
+        if best is not None:
+            used.add(best)
+            pairs.append((i, best, best_ratio))
+    paired_old = {i for i, _, _ in pairs}
+    return pairs, [i for i in removed if i not in paired_old], [j for j in added if j not in used]
+
+
+def diff_processes(old_info, new_info):
+    """Structural diff of two process_info dicts (old -> new)"""
+    old_steps = old_info.get('steps', [])
+    new_steps = new_info.get('steps', [])
+    old_norm = [normalize_description(step.get('description')) for step in old_steps]
+    new_norm = [normalize_description(step.get('description')) for step in new_steps]
+
+    matched, removed, added = [], [], []
+    matcher = SequenceMatcher(None, old_norm, new_norm, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            matched.extend(zip(range(i1, i2), range(j1, j2)))
+        else:
+            removed.extend(range(i1, i2))
+            added.extend(range(j1, j2))
+
+    # A removed step that reappears verbatim elsewhere was moved, not changed
+    removed_by_text = {}
+    for i in removed:
+        removed_by_text.setdefault(old_norm[i], []).append(i)
+    moved = []
+    for j in list(added):
+        candidates = removed_by_text.get(new_norm[j])
+        if candidates:
+            i = candidates.pop(0)
+            moved.append((i, j))
+            removed.remove(i)
+            added.remove(j)
+    modified, removed, added = _pair_similar(removed, added, old_norm, new_norm)
+
+    field_changes = []
+    for i, j in matched + [(i, j) for i, j, _ in modified] + moved:
+        field_changes.extend(_field_changes(old_steps[i], new_steps[j]))
+
+    diff = {
+        'unchanged': len(matched),
+        'added': [_step_ref(new_steps[j]) for j in added],
+        'removed': [_step_ref(old_steps[i]) for i in removed],
+        'moved': [{
+            'description': new_steps[j].get('description', ''),
+            'from': old_steps[i].get('number'),
+            'to': new_steps[j].get('number')
+        } for i, j in moved],
+        'modified': [{
+            'before': _step_ref(old_steps[i]),
+            'after': _step_ref(new_steps[j]),
+            'similarity': round(ratio, 3)
+        } for i, j, ratio in modified],
+        'owner_role_changes': field_changes
+    }
+    diff['summary'] = {
+        'old_steps': len(old_steps),
+        'new_steps': len(new_steps),
+        'unchanged': diff['unchanged'],
+        'added': len(diff['added']),
+        'removed': len(diff['removed']),
+        'moved': len(diff['moved']),
+        'modified': len(diff['modified']),
+        'owner_role_changes': len(field_changes)
+    }
+    diff['identical'] = not (added or removed or moved or modified or field_changes)
+    # Nothing left that needs semantic judgement
+    diff['trivial'] = not (added or removed) and \
+        all(ratio >= TRIVIAL_SIMILARITY for _, _, ratio in modified)
+    return diff
+
+
+def residual_processes(old_info, new_info, diff):
+    """Copies of both processes reduced to the steps the local diff could not explain"""
+    old_numbers = {step['number'] for step in diff['removed']} | \
+        {change['before']['number'] for change in diff['modified']}
+    new_numbers = {step['number'] for step in diff['added']} | \
+        {change['after']['number'] for change in diff['modified']}
+    old_residual = dict(old_info, steps=[step for step in old_info.get('steps', [])
+                                         if step.get('number') in old_numbers])
+    new_residual = dict(new_info, steps=[step for step in new_info.get('steps', [])
+                                         if step.get('number') in new_numbers])
+    return old_residual, new_residual
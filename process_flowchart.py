@@ -0,0 +1,270 @@
+"""
+Step graph and Mermaid flowchart of a process.
+
+``render_diagram`` turns a process (either step format) into a ``graph TD``
+flowchart. Steps are linked in order unless the process carries explicit
+branching: steps with ``next_steps`` (ids, or ``{"step": id, "label": ...}``
+dicts) link to exactly those steps, ``decision`` steps are drawn as
+rhombi and ``start``/``end`` steps as stadiums. The output has one line per
+node and per edge in a deterministic order, so two diagrams can be diffed
+line by line (``diff_diagrams``).
+
+Diagrams are keyed by a hash over the fields they are drawn from and
+recently rendered ones are kept in memory. ``diagram_graph`` is shared with
+the SVG renderer (diagram_svg); storing diagrams per process is
+process_diagram's job.
+"""
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from content_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendered output changes so stored diagrams are rebuilt
+RENDERER_VERSION = '2'
+MEMORY_ENTRIES = int(os.environ.get('DIAGRAM_MEMORY_ENTRIES', 512))
+LABEL_MAX_CHARS = 60
+
+# Step type -> node kind
+NODE_KINDS = {'start': 'start', 'end': 'end', 'decision': 'decision', 'gateway': 'decision'}
+NODE_SHAPES = {
+    'start': ('(["', '"])'),
+    'end': ('(["', '"])'),
+    'decision': ('{"', '"}'),
+    'task': ('["', '"]'),
+}
+
+
+def _step_fields(step, index):
+    """The fields a diagram is drawn from, from either step format"""
+    number = step.get('step_number', step.get('number', step.get('id', index)))
+    return {
+        'id': str(step.get('id', number)),
+        'number': number,
+        'name': step.get('name') or '',
+        'description': step.get('step_description', step.get('description', '')) or '',
+        'owner': step.get('approver_name', step.get('owner', '')) or '',
+        'type': (step.get('type') or '').lower(),
+        'next_steps': step.get('next_steps')
+    }
+
+
+def _node_id(step_id):
+    return 'S' + re.sub(r'[^A-Za-z0-9_]', '_', step_id)
+
+
+def _escape(text):
+    text = ' '.join(str(text).split())
+    return text.replace('"', '#quot;').replace('<', '#lt;').replace('>', '#gt;')
+
+
+def _title(fields):
+    name = fields['name']
+    # Stored steps only carry the generated "Step N" name; the description says more
+    if (not name or name == f"Step {fields['number']}") and fields['description']:
+        name = fields['description']
+        if len(name) > LABEL_MAX_CHARS:
+            name = name[:LABEL_MAX_CHARS - 3].rstrip() + '...'
+    return ' '.join((name or f"Step {fields['number']}").split())
+
+
+def _targets(next_steps):
+    """[(target id, edge label)] from a next_steps list"""
+    targets = []
+    for entry in next_steps or []:
+        if isinstance(entry, dict):
+            target = entry.get('step', entry.get('id', entry.get('to')))
+            label = entry.get('label') or entry.get('condition') or ''
+        else:
+            target, label = entry, ''
+        if target is not None:
+            targets.append((str(target), label))
+    return targets
+
+
+def diagram_hash(process_info):
+    """Hash over everything the diagram of a process is drawn from"""
+    steps = [_step_fields(step, index) for index, step in enumerate(process_info.get('steps') or [], start=1)]
+    return content_hash(RENDERER_VERSION, json.dumps(steps, sort_keys=True, default=str))
+
+
+def diagram_graph(steps):
+    """(nodes, edges) of a list of steps, shared by the Mermaid and SVG renderers.
+
+    Nodes are dicts with ``id``, ``title``, ``owner`` and ``kind`` (``start``,
+    ``end``, ``decision`` or ``task``), in step order; edges are
+    ``(source id, target id, label)`` tuples.
+    """
+    fields = [_step_fields(step, index) for index, step in enumerate(steps, start=1)]
+    known = {step['id'] for step in fields}
+    branching = any(step['next_steps'] is not None for step in fields)
+
+    edges = []
+    for position, step in enumerate(fields):
+        if step['next_steps'] is not None:
+            targets = _targets(step['next_steps'])
+        elif position + 1 < len(fields) and (not branching or step['type'] != 'end'):
+            targets = [(fields[position + 1]['id'], '')]
+        else:
+            targets = []
+        for target, label in targets:
+            if target not in known:
+                logger.debug(f"Step {step['id']} links to unknown step {target}; edge skipped")
+                continue
+            edges.append((step['id'], target, label))
+    edges = list(dict.fromkeys(edges))
+
+    outgoing = {}
+    for source, _, _ in edges:
+        outgoing[source] = outgoing.get(source, 0) + 1
+
+    nodes = []
+    for step in fields:
+        kind = NODE_KINDS.get(step['type'])
+        if kind is None:
+            kind = 'decision' if outgoing.get(step['id'], 0) > 1 else 'task'
+        nodes.append({
+            'id': step['id'],
+            'title': _title(step),
+            'owner': ' '.join(step['owner'].split()) or 'Unassigned',
+            'kind': kind
+        })
+    return nodes, edges
+
+
+def build_mermaid(steps):
+    """Mermaid ``graph TD`` text for a list of steps"""
+    nodes, edges = diagram_graph(steps)
+    lines = ['graph TD']
+    for node in nodes:
+        shape = NODE_SHAPES[node['kind']]
+        lines.append(f"    {_node_id(node['id'])}{shape[0]}{_escape(node['title'])}<br/>{_escape(node['owner'])}{shape[1]}")
+    for source, target, label in edges:
+        arrow = f'-->|"{_escape(label)}"|' if label else '-->'
+        lines.append(f"    {_node_id(source)} {arrow} {_node_id(target)}")
+    return '\n'.join(lines)
+
+
+class _DiagramMemo:
+    """Small thread-safe LRU of content hash -> Mermaid text"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            mermaid = self.entries.get(key)
+            if mermaid is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return mermaid
+
+    def put(self, key, mermaid):
+        with self._lock:
+            self.entries[key] = mermaid
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+_memo = _DiagramMemo(MEMORY_ENTRIES)
+
+
+def render_diagram(process_info, known_hash=None):
+    """(content hash, Mermaid text) for a process, rendered at most once per content"""
+    key = known_hash or diagram_hash(process_info)
+    mermaid = _memo.get(key)
+    if mermaid is None:
+        mermaid = build_mermaid(process_info.get('steps') or [])
+        _memo.put(key, mermaid)
+    return key, mermaid
+
+
+def diff_diagrams(old, new):
+    """Line diff turning diagram old into new.
+
+    ``removed`` are indexes of old lines to drop and ``added`` are
+    ``[index, line]`` pairs to insert (ascending) into what remains; see
+    apply_diagram_diff.
+    """
+    old_lines, new_lines = old.split('\n'), new.split('\n')
+    removed, added = [], []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        removed.extend(range(i1, i2))
+        added.extend([index, new_lines[index]] for index in range(j1, j2))
+    return {'removed': removed, 'added': added}
+
+
+def apply_diagram_diff(old, diff):
+    dropped = set(diff['removed'])
+    lines = [line for index, line in enumerate(old.split('\n')) if index not in dropped]
+    for index, line in diff['added']:
+        lines.insert(index, line)
+    return '\n'.join(lines)
+
+
+# Extraction fields the erp_process_steps table does not store
+DETAIL_FIELDS = ('id', 'name', 'type', 'next_steps')
+
+
+def stored_steps(process_info):
+    """Steps of a process as they read back from the database (see serialize_process)"""
+    steps = []
+    for index, step in enumerate(process_info.get('steps') or [], start=1):
+        number = step.get('step_number', step.get('number', index))
+        steps.append({
+            'number': number,
+            'name': f'Step {number}',
+            'description': step.get('step_description', step.get('description', '')),
+            'owner': step.get('approver_name', step.get('owner', '')),
+            'role': step.get('approver_role', step.get('role', ''))
+        })
+    return steps
+
+
+def step_details(process_info):
+    """{step number: extraction-only fields} to keep next to the stored diagram"""
+    details = {}
+    for index, step in enumerate(process_info.get('steps') or [], start=1):
+        number = step.get('step_number', step.get('number', index))
+        extra = {field: step[field] for field in DETAIL_FIELDS if step.get(field) not in (None, '')}
+        if extra:
+            # Ties the extracted name to the text it was extracted for
+            extra['description'] = step.get('step_description', step.get('description', ''))
+            details[str(number)] = extra
+    return details
+
+
+def with_details(steps, details):
+    """Stored steps with their kept extraction fields reapplied"""
+    merged = []
+    for step in steps:
+        extra = (details or {}).get(str(step['number']))
+        if extra:
+            step = dict(step, **{field: value for field, value in extra.items()
+                                 if field in DETAIL_FIELDS and field != 'name'})
+            # A step edited since extraction is labelled from its new description
+            if extra.get('name') and extra.get('description') == step['description']:
+                step['name'] = extra['name']
+        merged.append(step)
+    return merged
+
+
+def diagram_source(process_info):
+    """The process as its stored diagram is drawn from: stored steps plus kept details"""
+    return {'steps': with_details(stored_steps(process_info), step_details(process_info))}
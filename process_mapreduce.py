@@ -0,0 +1,135 @@
+"""
+Map-reduce process extraction for long documents.
+
+A long document is split into context-sized sections (see
+document_streaming). Each section is sent to the model on its own, and
+several sections run concurrently under a concurrency limit and the
+shared client's rate limits. The partial step lists are then merged, in
+document order, into the single ``{'name', 'system', 'steps': [...]}``
+structure used by the rest of the application. Wall-clock time is roughly
+the time of the slowest section instead of the sum of all of them.
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import get_llm_client
+from llm_stream import DEFAULT_PROCESS_NAME, DEFAULT_SYSTEM, parse_process_reply
+
+logger = logging.getLogger(__name__)
+
+MAPREDUCE_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+MAPREDUCE_CONCURRENCY = int(os.environ.get('MAPREDUCE_CONCURRENCY', 4))
+
+SECTION_PROMPT = """You are extracting a business process from section {section} of {total} of a document.
+Return ONLY a JSON object with this structure:
+{{"name": "process name", "system": "ERP or business system", "steps": [
+  {{"number": 1, "name": "short step name", "description": "what happens", "owner": "person or system", "role": "role"}}
+]}}
+List only the steps described in this section, in the order they appear. Use an empty
+"steps" list if the section contains no process steps. Leave "name" or "system" empty
+if the section does not mention them.
+
+Section text:
+{text}"""
+
+
+def parse_json_response(content):
+    """Parse a JSON object from a model reply, tolerating code fences and chatter"""
+    content = content.strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', content, re.DOTALL)
+    if fenced:
+        content = fenced.group(1).strip()
+    if not content.startswith('{'):
+        start, end = content.find('{'), content.rfind('}')
+        if start != -1 and end > start:
+            content = content[start:end + 1]
+    return json.loads(content)
+
+
+def extract_section(chunk, total, model=None):
+    """Map step: extract a partial process from one section"""
+    prompt = SECTION_PROMPT.format(section=chunk['index'] + 1, total=total or '?', text=chunk['text'])
+    content = get_llm_client().chat_text(
+        [{"role": "user", "content": prompt}],
+        model=model or MAPREDUCE_MODEL,
+        temperature=0
+    )
+    # A damaged reply keeps the steps it got right instead of failing the whole document;
+    # a section that names no process or system must not outvote one that does
+    partial, _ = parse_process_reply(content, require_steps=False, fill_defaults=False)
+    logger.info(f"Section {chunk['index'] + 1} extracted {len(partial.get('steps', []))} steps")
+    return partial
+
+
+def _normalize(text):
+    return re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).strip()
+
+
+def merge_partial_processes(partials):
+    """Reduce step: merge partial extractions (in section order) and renumber steps"""
+    names = Counter(p.get('name', '').strip() for p in partials if p.get('name', '').strip())
+    systems = Counter(p.get('system', '').strip() for p in partials if p.get('system', '').strip())
+
+    steps = []
+    for partial in partials:
+        for step in partial.get('steps', []):
+            description = step.get('description', '')
+            # Sections can overlap at their boundaries; drop repeated steps
+            if steps and _normalize(description) == _normalize(steps[-1].get('description', '')):
+                continue
+            steps.append(dict(step))
+
+    for number, step in enumerate(steps, start=1):
+        step['number'] = number
+        step.setdefault('name', f'Step {number}')
+
+    return {
+        'name': names.most_common(1)[0][0] if names else DEFAULT_PROCESS_NAME,
+        'system': systems.most_common(1)[0][0] if systems else DEFAULT_SYSTEM,
+        'steps': steps
+    }
+
+
+def map_reduce_extract(chunks, total=None, max_concurrency=None, model=None, on_partial=None):
+    """Extract a process from an iterable of chunks concurrently and merge the results.
+
+    Chunks are submitted as they are produced, so sections are already being
+    extracted while later pages of the document are still being parsed; at
+    most ``max_concurrency`` sections are read ahead of the merged results.
+    Account-wide request/token limits are enforced by the shared LLM client.
+    ``on_partial(partial)`` is called for each section's result in document
+    order, before the merge.
+    """
+    started = time.monotonic()
+    workers = max_concurrency or MAPREDUCE_CONCURRENCY
+    partials = []
+
+    def collect(pending):
+        partials.append(pending.popleft().result())
+        if on_partial:
+            on_partial(partials[-1])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mapreduce') as pool:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                # Only a bounded window of sections is held at once, so the
+                # document is not read ahead of the extraction
+                if len(pending) >= workers:
+                    collect(pending)
+                pending.append(pool.submit(extract_section, chunk, total, model))
+            while pending:
+                collect(pending)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    process_info = merge_partial_processes(partials)
+    logger.info(f"Map-reduce extraction of {len(partials)} sections produced {len(process_info['steps'])} steps "
+                f"in {time.monotonic() - started:.1f}s")
+    return process_info
@@ -0,0 +1,88 @@
+"""
+Batched read access for ERP processes and their steps.
+
+Screens that analyze, compare or list processes used to fetch each process
+with ``ERPProcess.query.get`` and then its steps with a separate query, so N
+processes cost 2N round trips. ``load_processes`` fetches any number of
+processes together with their ordered steps in one joined query, and
+``serialize_process`` turns a process into the compact dict the analyzer
+and the API responses use.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on ids accepted by one batch request
+MAX_BATCH_SIZE = 200
+
+
+def processes_query(session, process_ids):
+    """Query yielding (process, step) rows for the given ids, steps in order"""
+    from backend.models.erp_process import ERPProcess, ERPProcessStep
+    return session.query(ERPProcess, ERPProcessStep)\
+        .outerjoin(ERPProcessStep, ERPProcessStep.process_id == ERPProcess.id)\
+        .filter(ERPProcess.id.in_(process_ids))\
+        .order_by(ERPProcess.id, ERPProcessStep.step_number)
+
+
+def load_processes(process_ids, session=None):
+    """Fetch processes and their ordered steps in a single query.
+
+    Returns a dict mapping each requested id (as given, so ids parsed from
+    JSON as strings still match) to ``(process, steps)``; ids that do not
+    exist are simply absent.
+    """
+    from backend.models import db
+    session = session or db.session
+
+    process_ids = list(dict.fromkeys(process_ids))
+    if not process_ids:
+        return {}
+
+    rows = processes_query(session, process_ids).all()
+
+    requested = {str(process_id): process_id for process_id in process_ids}
+    loaded = {}
+    for process, step in rows:
+        key = requested.get(str(process.id), process.id)
+        _, steps = loaded.setdefault(key, (process, []))
+        if step is not None:
+            steps.append(step)
+    logger.debug(f"Loaded {len(loaded)} of {len(process_ids)} processes in one query")
+    return loaded
+
+
+def load_process(process_id, session=None):
+    """Fetch one process and its ordered steps; returns (None, []) if missing"""
+    return load_processes([process_id], session=session).get(process_id, (None, []))
+
+
+def serialize_process(process, steps):
+    """Compact serialized form of a process used for analysis and comparison"""
+    return {
+        'name': process.process_name,
+        'system': process.erp_system,
+        'version': '1.0',
+        'steps': [{
+            'number': step.step_number,
+            'name': f'Step {step.step_number}',
+            'description': step.step_description,
+            'owner': step.approver_name,
+            'role': step.approver_role
+        } for step in steps]
+    }
+
+
+def serialize_processes(loaded, process_ids):
+    """Serialize loaded processes in the order requested, with their ids"""
+    serialized = []
+    for process_id in dict.fromkeys(process_ids):
+        if process_id not in loaded:
+            continue
+        process, steps = loaded[process_id]
+        info = serialize_process(process, steps)
+        info['id'] = process.id
+        info['created_at'] = process.created_at.isoformat() if process.created_at else None
+        info['updated_at'] = process.updated_at.isoformat() if process.updated_at else None
+        serialized.append(info)
+    return serialized
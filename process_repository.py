@@ -0,0 +1,172 @@
+"""
+Bulk persistence for processes, TO-BE processes and gap analyses.
+
+Each helper writes a parent row and all of its children with multi-row
+INSERTs: the parents are inserted with RETURNING (batched into a single
+statement by SQLAlchemy's insertmanyvalues on PostgreSQL and SQLite) to get
+their ids back, then every child row goes out as one executemany. Importing a
+process with hundreds of steps, or seeding thousands of processes, costs a
+handful of round trips instead of one INSERT per object.
+
+Steps may use either the extraction format (``number``, ``description``,
+``role``, ``owner``) or the model column names (``step_number``,
+``step_description``, ``approver_role``, ``approver_name``).
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+
+def _session(session):
+    if session is not None:
+        return session
+    from backend.models import db
+    return db.session
+
+
+def _step_row(step, process_id, index, now):
+    return {
+        'process_id': process_id,
+        'step_number': step.get('step_number', step.get('number', index)),
+        'step_description': step.get('step_description', step.get('description', '')),
+        'approver_role': step.get('approver_role', step.get('role', '')),
+        'approver_name': step.get('approver_name', step.get('owner', '')),
+        'created_at': step.get('created_at', now)
+    }
+
+
+def _insert_returning_ids(session, model, rows):
+    """Insert rows in one batched statement and return their ids in row order"""
+    if not rows:
+        return []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(session.execute(statement, rows).scalars())
+
+
+def save_processes(processes, session=None, commit=True):
+    """Insert ERPProcesses with all their steps and versions; returns the new process ids.
+
+    Each process is a dict with 'name' (or 'process_name'), 'system' (or
+    'erp_system'), optional 'id' and a list of 'steps'.
+    """
+    from backend.models.erp_process import ERPProcess, ERPProcessStep
+    session = _session(session)
+    now = datetime.utcnow()
+    try:
+        process_rows = []
+        for process in processes:
+            row = {
+                'process_name': process.get('process_name', process.get('name')),
+                'erp_system': process.get('erp_system', process.get('system')),
+                'created_at': process.get('created_at', now),
+                'updated_at': process.get('updated_at', now)
+            }
+            if process.get('id') is not None:
+                row['id'] = process['id']
+            process_rows.append(row)
+        process_ids = _insert_returning_ids(session, ERPProcess, process_rows)
+
+        step_rows = [
+            _step_row(step, process_id, index, now)
+            for process, process_id in zip(processes, process_ids)
+            for index, step in enumerate(process.get('steps', []), start=1)
+        ]
+        if step_rows:
+            session.execute(insert(ERPProcessStep), step_rows)
+
+        # Version history is written in the same transaction as the rows
+        from process_versions import record_version
+        for process, row, process_id in zip(processes, process_rows, process_ids):
+            if row['process_name']:
+                record_version(row['process_name'], process.get('steps', []), process_id=process_id,
+                               erp_system=row['erp_system'], session=session, commit=False)
+
+        if commit:
+            session.commit()
+        logger.info(f"Saved {len(process_ids)} processes with {len(step_rows)} steps")
+        return process_ids
+    except Exception:
+        session.rollback()
+        raise
+
+
+def save_process(process_info, session=None, commit=True):
+    """Insert one ERPProcess and its steps; returns the new process id"""
+    return save_processes([process_info], session=session, commit=commit)[0]
+
+
+def save_tobe_process(process_name, related_asis_id, standard_type, steps, session=None, commit=True, **extra):
+    """Insert a ToBeProcess and its ToBeProcessSteps; returns the new id"""
+    from backend.models.tobe_process import ToBeProcess, ToBeProcessStep
+    session = _session(session)
+    now = datetime.utcnow()
+    try:
+        row = dict(extra, process_name=process_name, related_asis_id=related_asis_id,
+                   standard_type=standard_type, created_at=now, updated_at=now)
+        tobe_id = _insert_returning_ids(session, ToBeProcess, [row])[0]
+
+        step_rows = []
+        for index, step in enumerate(steps, start=1):
+            step_row = _step_row(step, tobe_id, index, now)
+            step_row['is_automated'] = bool(step.get('is_automated', False))
+            step_rows.append(step_row)
+        if step_rows:
+            session.execute(insert(ToBeProcessStep), step_rows)
+
+        if commit:
+            session.commit()
+        return tobe_id
+    except Exception:
+        session.rollback()
+        raise
+
+
+def save_gap_analyses(analyses, session=None, commit=True):
+    """Insert GapAnalyses with all their GapFindings; returns the new analysis ids.
+
+    Each analysis is a dict with 'asis_process_id', 'tobe_process_id',
+    'summary' and a list of 'findings' (finding_type, description,
+    recommendation, impact, effort).
+    """
+    from backend.models.tobe_process import GapAnalysis, GapFinding
+    session = _session(session)
+    now = datetime.utcnow()
+    try:
+        analysis_ids = _insert_returning_ids(session, GapAnalysis, [{
+            'asis_process_id': analysis['asis_process_id'],
+            'tobe_process_id': analysis['tobe_process_id'],
+            'summary': analysis.get('summary', ''),
+            'created_at': now
+        } for analysis in analyses])
+
+        finding_rows = [{
+            'analysis_id': analysis_id,
+            'finding_type': finding.get('finding_type', finding.get('type', '')),
+            'description': finding.get('description', ''),
+            'recommendation': finding.get('recommendation', ''),
+            'impact': finding.get('impact', ''),
+            'effort': finding.get('effort', ''),
+            'created_at': now
+        } for analysis, analysis_id in zip(analyses, analysis_ids) for finding in analysis.get('findings', [])]
+        if finding_rows:
+            session.execute(insert(GapFinding), finding_rows)
+
+        if commit:
+            session.commit()
+        return analysis_ids
+    except Exception:
+        session.rollback()
+        raise
+
+
+def save_gap_analysis(asis_process_id, tobe_process_id, summary, findings, session=None, commit=True):
+    """Insert one GapAnalysis and its findings; returns the new analysis id"""
+    return save_gap_analyses([{
+        'asis_process_id': asis_process_id,
+        'tobe_process_id': tobe_process_id,
+        'summary': summary,
+        'findings': findings
+    }], session=session, commit=commit)[0]
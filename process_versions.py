@@ -0,0 +1,329 @@
+"""
+Delta-based version history for processes.
+
+Every saved revision of a process (keyed by process name) becomes a
+ProcessVersion. A version stores only the steps that changed relative to the
+previous version - a ``set`` row for each added or modified step and a
+``delete`` row for each removed step - and every SNAPSHOT_INTERVAL versions
+(or whenever the delta would be as large as the process itself) a full
+snapshot is written instead. Each version records the snapshot its chain
+starts from, so any version is rebuilt from one range query over at most
+SNAPSHOT_INTERVAL versions' rows rather than from a full copy per version.
+
+process_repository.save_processes records the version in the same
+transaction as the process rows, so every saved process is versioned.
+Listing versions only reads the narrow ``process_versions`` rows through the
+(process_name, version_number) index.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.models import db
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = int(os.environ.get('PROCESS_VERSION_SNAPSHOT_INTERVAL', 10))
+# Tries at the next version number when concurrent saves of a name collide
+VERSION_ATTEMPTS = 5
+
+
+class ProcessVersion(db.Model):
+    __tablename__ = 'process_versions'
+    __table_args__ = (
+        db.UniqueConstraint('process_name', 'version_number', name='uq_process_versions_name_number'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    process_name = db.Column(db.String(255), nullable=False)
+    version_number = db.Column(db.Integer, nullable=False)
+    base_version = db.Column(db.Integer, nullable=False)
+    is_snapshot = db.Column(db.Boolean, nullable=False, default=False)
+    process_id = db.Column(db.Integer, db.ForeignKey('erp_processes.id', ondelete='SET NULL'), index=True)
+    erp_system = db.Column(db.String(100))
+    step_count = db.Column(db.Integer, nullable=False, default=0)
+    changed_steps = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProcessVersionStep(db.Model):
+    __tablename__ = 'process_version_steps'
+    __table_args__ = (
+        db.Index('ix_process_version_steps_version_id_step_number', 'version_id', 'step_number'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    version_id = db.Column(db.Integer, db.ForeignKey('process_versions.id', ondelete='CASCADE'), nullable=False)
+    step_number = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False, default='set')
+    step_description = db.Column(db.Text)
+    approver_role = db.Column(db.String(255))
+    approver_name = db.Column(db.String(255))
+
+
+def _step_values(step, index):
+    """(step_number, (description, role, owner)) from either step format"""
+    number = step.get('step_number', step.get('number', index))
+    return number, (
+        step.get('step_description', step.get('description', '')) or '',
+        step.get('approver_role', step.get('role', '')) or '',
+        step.get('approver_name', step.get('owner', '')) or ''
+    )
+
+
+def _as_steps(state):
+    return [{
+        'number': number,
+        'name': f'Step {number}',
+        'description': description,
+        'role': role,
+        'owner': owner
+    } for number, (description, role, owner) in sorted(state.items())]
+
+
+def _latest(process_name, session):
+    return session.query(
+        ProcessVersion.id, ProcessVersion.version_number, ProcessVersion.base_version, ProcessVersion.process_id
+    ).filter(ProcessVersion.process_name == process_name)\
+        .order_by(ProcessVersion.version_number.desc())\
+        .first()
+
+
+def versions_query(session, process_name):
+    """Query yielding the version rows of a process, newest first"""
+    return session.query(
+        ProcessVersion.version_number, ProcessVersion.process_id, ProcessVersion.is_snapshot,
+        ProcessVersion.step_count, ProcessVersion.changed_steps, ProcessVersion.created_at
+    ).filter(ProcessVersion.process_name == process_name)\
+        .order_by(ProcessVersion.version_number.desc())
+
+
+def base_version_query(session, process_name, version_number):
+    """Query yielding the snapshot a version's delta chain starts from"""
+    return session.query(ProcessVersion.base_version)\
+        .filter(ProcessVersion.process_name == process_name,
+                ProcessVersion.version_number == version_number)
+
+
+def version_steps_query(session, process_name, base_version, version_number):
+    """Query yielding the step rows of a delta chain, oldest version first"""
+    return session.query(
+        ProcessVersion.version_number, ProcessVersionStep.step_number, ProcessVersionStep.operation,
+        ProcessVersionStep.step_description, ProcessVersionStep.approver_role, ProcessVersionStep.approver_name
+    ).join(ProcessVersionStep, ProcessVersionStep.version_id == ProcessVersion.id)\
+        .filter(ProcessVersion.process_name == process_name,
+                ProcessVersion.version_number.between(base_version, version_number))\
+        .order_by(ProcessVersion.version_number)
+
+
+def _reconstruct(process_name, version_number, session):
+    """Replay the delta chain for a version onto its snapshot; None if it does not exist"""
+    target = base_version_query(session, process_name, version_number).first()
+    if target is None:
+        return None
+
+    rows = version_steps_query(session, process_name, target.base_version, version_number).all()
+
+    state = {}
+    for _, step_number, operation, description, role, owner in rows:
+        if operation == 'delete':
+            state.pop(step_number, None)
+        else:
+            state[step_number] = (description or '', role or '', owner or '')
+    return state
+
+
+def _add_version(process_name, new_state, process_id, erp_system, session):
+    """Write the next version of a process in the current transaction; returns its number"""
+    latest = _latest(process_name, session)
+
+    if latest is None:
+        version_number, base_version, is_snapshot = 1, 1, True
+        changes = [(number, 'set', values) for number, values in new_state.items()]
+        changed_steps = len(changes)
+    else:
+        old_state = _reconstruct(process_name, latest.version_number, session)
+        changes = [(number, 'set', values) for number, values in new_state.items()
+                   if old_state.get(number) != values]
+        changes += [(number, 'delete', None) for number in old_state if number not in new_state]
+        if not changes:
+            # Only a newer row takes over the link, so re-recording an older
+            # identical row never moves it back
+            if process_id is not None and (latest.process_id is None or latest.process_id < process_id):
+                session.query(ProcessVersion).filter(ProcessVersion.id == latest.id)\
+                    .update({'process_id': process_id}, synchronize_session=False)
+            return latest.version_number
+
+        changed_steps = len(changes)
+        version_number = latest.version_number + 1
+        # Start a new chain once it gets long, or when the delta is no
+        # smaller than the process itself
+        is_snapshot = version_number - latest.base_version >= SNAPSHOT_INTERVAL or \
+            len(changes) >= len(new_state)
+        base_version = version_number if is_snapshot else latest.base_version
+        if is_snapshot:
+            changes = [(number, 'set', values) for number, values in new_state.items()]
+
+    version = ProcessVersion(
+        process_name=process_name,
+        version_number=version_number,
+        base_version=base_version,
+        is_snapshot=is_snapshot,
+        process_id=process_id,
+        erp_system=erp_system,
+        step_count=len(new_state),
+        changed_steps=changed_steps,
+        created_at=datetime.utcnow()
+    )
+    session.add(version)
+    session.flush()
+
+    if changes:
+        session.execute(ProcessVersionStep.__table__.insert(), [{
+            'version_id': version.id,
+            'step_number': number,
+            'operation': operation,
+            'step_description': values[0] if values else None,
+            'approver_role': values[1] if values else None,
+            'approver_name': values[2] if values else None
+        } for number, operation, values in changes])
+
+    logger.info(f"Recorded version {version_number} of '{process_name}' "
+                f"({'snapshot' if is_snapshot else 'delta'}, {len(changes)} step rows)")
+    return version_number
+
+
+def record_version(process_name, steps, process_id=None, erp_system=None, session=None, commit=True):
+    """Record steps as the next version of a process.
+
+    Returns the new version number, or the current one if the steps are
+    unchanged; an unchanged re-save still links its (newer) process_id to
+    that version. Each attempt runs in a savepoint: when a concurrent save
+    of the same name takes the version number first, the attempt is retried
+    on top of that version instead of failing the caller's transaction.
+    """
+    session = session or db.session
+    try:
+        new_state = dict(_step_values(step, index) for index, step in enumerate(steps, start=1))
+        for attempt in range(1, VERSION_ATTEMPTS + 1):
+            try:
+                with session.begin_nested():
+                    version_number = _add_version(process_name, new_state, process_id, erp_system, session)
+                break
+            except IntegrityError:
+                if attempt == VERSION_ATTEMPTS:
+                    raise
+                logger.warning(f"Version number of '{process_name}' taken by a concurrent save; "
+                               f"retrying (attempt {attempt})")
+        if commit:
+            session.commit()
+        return version_number
+    except Exception:
+        session.rollback()
+        raise
+
+
+def list_versions(process_name, session=None):
+    """Versions of a process, newest first, without loading any steps"""
+    session = session or db.session
+    rows = versions_query(session, process_name).all()
+    return [{
+        'id': row.process_id,
+        'version': str(row.version_number),
+        'version_number': row.version_number,
+        'is_snapshot': row.is_snapshot,
+        'step_count': row.step_count,
+        'changed_steps': row.changed_steps,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.created_at.isoformat() if row.created_at else None
+    } for row in rows]
+
+
+def get_version(process_name, version_number, session=None):
+    """Steps of one version in the extraction format, or None if it does not exist"""
+    state = _reconstruct(process_name, version_number, session or db.session)
+    if state is None:
+        return None
+    return {
+        'process_name': process_name,
+        'version_number': version_number,
+        'steps': _as_steps(state)
+    }
+
+
+def diff_versions(process_name, from_version, to_version, session=None):
+    """Added, removed and changed steps between two versions, or None if either is missing"""
+    session = session or db.session
+    old_state = _reconstruct(process_name, from_version, session)
+    new_state = _reconstruct(process_name, to_version, session)
+    if old_state is None or new_state is None:
+        return None
+    return {
+        'process_name': process_name,
+        'from_version': from_version,
+        'to_version': to_version,
+        'added': _as_steps({n: v for n, v in new_state.items() if n not in old_state}),
+        'removed': _as_steps({n: v for n, v in old_state.items() if n not in new_state}),
+        'changed': [{
+            'number': number,
+            'before': _as_steps({number: old_state[number]})[0],
+            'after': _as_steps({number: values})[0]
+        } for number, values in sorted(new_state.items())
+            if number in old_state and old_state[number] != values]
+    }
+
+
+def _unversioned_rows(session):
+    """(id, process_name) of saved rows newer than their name's latest versioned row, oldest first"""
+    from backend.models.erp_process import ERPProcess
+    linked = session.query(
+        ProcessVersion.process_name,
+        db.func.max(ProcessVersion.process_id).label('process_id')
+    ).group_by(ProcessVersion.process_name).subquery()
+    return session.query(ERPProcess.id, ERPProcess.process_name)\
+        .outerjoin(linked, linked.c.process_name == ERPProcess.process_name)\
+        .filter(ERPProcess.process_name.isnot(None),
+                ERPProcess.id > db.func.coalesce(linked.c.process_id, 0))\
+        .order_by(ERPProcess.created_at, ERPProcess.id)\
+        .all()
+
+
+def backfill_versions(rows, session=None):
+    """Record saved ERPProcess rows ((id, process_name), oldest first) as versions; returns the count"""
+    from process_queries import load_processes
+    session = session or db.session
+    if not rows:
+        return 0
+
+    loaded = load_processes([process_id for process_id, _ in rows], session=session)
+    for process_id, process_name in rows:
+        process, steps = loaded[process_id]
+        record_version(process_name, [{
+            'step_number': step.step_number,
+            'step_description': step.step_description,
+            'approver_role': step.approver_role,
+            'approver_name': step.approver_name
+        } for step in steps], process_id=process_id, erp_system=process.erp_system,
+            session=session, commit=False)
+    session.commit()
+    return len(rows)
+
+
+def backfill_all_versions(session=None):
+    """Record every saved row that has no version yet; returns the names backfilled.
+
+    save_process records versions itself; this picks up rows written around
+    it (processes stored before versioning existed, or by code that inserts
+    ERPProcess rows directly). A row older than its name's latest versioned
+    row is already superseded by that version and is left out, so history
+    stays in save order.
+    """
+    session = session or db.session
+    rows = _unversioned_rows(session)
+    backfill_versions(rows, session=session)
+    names = sorted({process_name for _, process_name in rows})
+    if rows:
+        logger.info(f"Backfilled {len(rows)} versions across {len(names)} processes")
+    return names
@@ -0,0 +1,357 @@
+"""
+Server-sent progress streams for long-running AI endpoints.
+
+Document extraction, process analysis/comparison and TO-BE/gap generation
+can take longer than a browser is willing to wait on a spinner (and longer
+than gunicorn's worker timeout). A view decorated with
+``ProgressStreams.streamable`` keeps its normal behaviour, but when the
+client asks for progress (``?progress=1`` or ``Accept: text/event-stream``)
+the request is replayed on a background thread and the client follows its
+stage events over SSE instead:
+
+* ``?progress=1`` answers 202 at once with ``stream_id`` and ``events_url``.
+* ``Accept: text/event-stream`` answers with the event stream directly.
+
+Events are appended to a small SQLite log shared by all workers on the node,
+so ``GET /api/progress/<stream_id>`` can be served by any worker. A single
+SSE response is closed after PROGRESS_STREAM_WINDOW_SECONDS; EventSource
+reconnects with ``Last-Event-ID`` and receives only the events it missed, so
+no sync worker is held for the whole duration of the work. Once the final
+``result`` or ``error`` event has been delivered, reconnects get 204, which
+tells EventSource to stop.
+
+Code running inside a streamed request reports stages with
+``report_stage(stage, **data)`` (a no-op outside a stream), or by passing a
+stream as the ``on_stage`` callback of the document pipeline.
+"""
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Response, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROGRESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'progress.db')
+PROGRESS_ROUTE = '/api/progress/<stream_id>'
+# Final events; a stream is finished once one of them has been written
+TERMINAL_EVENTS = ('result', 'error')
+# Backend blueprint views that get progress streaming (matched by rule prefix)
+BACKEND_PROGRESS_ROUTES = ('/api/tobe/generate-from-asis', '/api/gap')
+
+_current = threading.local()
+
+
+def report_stage(stage, **data):
+    """Report a stage to the progress stream of the current request, if there is one"""
+    stream = getattr(_current, 'stream', None)
+    if stream is not None:
+        stream.emit(stage, **data)
+
+
+def in_progress_stream():
+    """True while running a request whose progress is being streamed"""
+    return getattr(_current, 'stream', None) is not None
+
+
+def _truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def wants_progress():
+    """True when the client asked for a progress stream instead of a blocking response"""
+    return _truthy(request.args.get('progress')) or wants_event_stream()
+
+
+def wants_event_stream():
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+class ProgressStore:
+    """Append-only event log per stream in a SQLite file shared by local workers"""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.environ.get('PROGRESS_STREAM_PATH', DEFAULT_PROGRESS_PATH)
+        self.ttl = ttl or int(os.environ.get('PROGRESS_STREAM_TTL_SECONDS', 3600))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progress_streams (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    finished INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progress_events (
+                    stream_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (stream_id, seq)
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create(self, kind):
+        stream_id = str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT INTO progress_streams (id, kind, created_at) VALUES (?, ?, ?)",
+                         (stream_id, kind, now))
+            # Opportunistic cleanup of streams nobody will read any more
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM progress_streams WHERE created_at < ?", (now - self.ttl,))]
+            for old_id in expired:
+                conn.execute("DELETE FROM progress_events WHERE stream_id = ?", (old_id,))
+                conn.execute("DELETE FROM progress_streams WHERE id = ?", (old_id,))
+        return stream_id
+
+    def append(self, stream_id, event, data):
+        """Append an event and return its sequence number"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM progress_events WHERE stream_id = ?",
+                               (stream_id,)).fetchone()[0]
+            conn.execute("INSERT INTO progress_events (stream_id, seq, event, data) VALUES (?, ?, ?, ?)",
+                         (stream_id, seq, event, json.dumps(data, default=str)))
+            if event in TERMINAL_EVENTS:
+                conn.execute("UPDATE progress_streams SET finished = 1 WHERE id = ?", (stream_id,))
+            conn.execute("COMMIT")
+            return seq
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def exists(self, stream_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM progress_streams WHERE id = ?", (stream_id,)).fetchone() is not None
+
+    def events_after(self, stream_id, seq):
+        """[(seq, event, data_json)] written after seq, oldest first"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT seq, event, data FROM progress_events WHERE stream_id = ? AND seq > ? ORDER BY seq",
+                (stream_id, seq)
+            ).fetchall()
+
+
+class ProgressStream:
+    """Producer handle for one stream; callable as an ``on_stage(stage, **data)`` callback"""
+
+    def __init__(self, store, stream_id):
+        self.store = store
+        self.id = stream_id
+
+    def emit(self, stage, **data):
+        # Partial extraction results get their own event type so clients can
+        # render them without inspecting every stage event
+        if stage == 'steps_partial':
+            self.store.append(self.id, 'steps', data)
+        else:
+            self.store.append(self.id, 'stage', dict(data, stage=stage))
+
+    __call__ = emit
+
+    def finish(self, event, data):
+        self.store.append(self.id, event, data)
+
+
+def _sse(seq, event, data):
+    return f"id: {seq}\nevent: {event}\ndata: {data}\n\n"
+
+
+class ProgressStreams:
+    """Runs streamed requests on a local thread pool and serves their events"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.store = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.store = ProgressStore()
+        self.window = float(os.environ.get('PROGRESS_STREAM_WINDOW_SECONDS', 25))
+        self.poll_interval = float(os.environ.get('PROGRESS_STREAM_POLL_SECONDS', 0.25))
+        self.heartbeat = float(os.environ.get('PROGRESS_STREAM_HEARTBEAT_SECONDS', 10))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('PROGRESS_STREAM_WORKERS', 4)),
+            thread_name_prefix='progress'
+        )
+        app.extensions['progress_streams'] = self
+        app.add_url_rule(PROGRESS_ROUTE, 'progress_events', self._events_view, methods=['GET'])
+
+    def _events_view(self, stream_id):
+        if not self.store.exists(stream_id):
+            return jsonify({'error': 'Progress stream not found'}), 404
+        last_seq = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+        try:
+            last_seq = int(last_seq)
+        except ValueError:
+            last_seq = 0
+        return self.event_response(stream_id, last_seq)
+
+    def events_url(self, stream_id):
+        return PROGRESS_ROUTE.replace('<stream_id>', stream_id)
+
+    def start(self, kind, fn, *args, **kwargs):
+        """Run ``fn(stream, *args, **kwargs)`` in the background; returns the stream.
+
+        fn returns the payload of the final ``result`` event. An exception
+        with ``to_dict()`` (e.g. DocumentPipelineError) becomes the ``error``
+        event payload.
+        """
+        stream = ProgressStream(self.store, self.store.create(kind))
+        self.executor.submit(self._run, stream, kind, fn, args, kwargs)
+        return stream
+
+    def _run(self, stream, kind, fn, args, kwargs):
+        _current.stream = stream
+        try:
+            with self.app.app_context():
+                try:
+                    stream.finish('result', fn(stream, *args, **kwargs))
+                except Exception as e:
+                    if hasattr(e, 'to_dict'):
+                        stream.finish('error', e.to_dict())
+                    else:
+                        logger.error(f"Error in streamed {kind}: {str(e)}", exc_info=True)
+                        stream.finish('error', {
+                            'error': 'An unexpected error occurred',
+                            'details': str(e),
+                            'type': 'unexpected_error'
+                        })
+                finally:
+                    from backend.models import db
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"Could not finish progress stream {stream.id}: {str(e)}", exc_info=True)
+        finally:
+            _current.stream = None
+
+    def event_response(self, stream_id, last_seq=0):
+        """SSE response with the events after last_seq, open for at most one window"""
+        events = self.store.events_after(stream_id, last_seq)
+        if not events and self._delivered_final(stream_id, last_seq):
+            # 204 tells EventSource not to reconnect
+            return Response(status=204)
+
+        def generate():
+            seq = last_seq
+            deadline = time.monotonic() + self.window
+            last_write = time.monotonic()
+            yield "retry: 1000\n\n"
+            pending = events
+            while True:
+                for seq, event, data in pending:
+                    yield _sse(seq, event, data)
+                    last_write = time.monotonic()
+                    if event in TERMINAL_EVENTS:
+                        return
+                now = time.monotonic()
+                if now >= deadline:
+                    # The client reconnects with Last-Event-ID and resumes after seq
+                    return
+                if now - last_write >= self.heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_write = now
+                time.sleep(self.poll_interval)
+                pending = self.store.events_after(stream_id, seq)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    def _delivered_final(self, stream_id, last_seq):
+        delivered = self.store.events_after(stream_id, last_seq - 1) if last_seq else []
+        return bool(delivered) and delivered[0][1] in TERMINAL_EVENTS
+
+    def respond(self, stream):
+        """Response for a request that started a stream: SSE or 202 with the events URL"""
+        if wants_event_stream():
+            return self.event_response(stream.id)
+        return jsonify({
+            'stream_id': stream.id,
+            'events_url': self.events_url(stream.id)
+        }), 202
+
+    def _replay_view(self, stream, view, environ, args, kwargs):
+        """Run a view against a copy of the original request and return its JSON body"""
+        with self.app.request_context(environ):
+            stream.emit('started')
+            response = self.app.make_response(view(*args, **kwargs))
+        body = response.get_json(silent=True)
+        if body is None:
+            body = {'body': response.get_data(as_text=True)}
+        if response.status_code >= 400:
+            error = body if isinstance(body, dict) else {'error': body}
+            raise _ViewError(dict(error, status=response.status_code))
+        return body
+
+    def streamable(self, kind):
+        """Decorator giving a JSON view an opt-in progress stream"""
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not wants_progress():
+                    return view(*args, **kwargs)
+                stream = self.start(kind, self._replay_view, view, _copy_environ(), args, kwargs)
+                logger.info(f"Streaming {kind} progress as {stream.id}")
+                return self.respond(stream)
+            return wrapper
+
+        return decorator
+
+    def install(self, app, prefixes=BACKEND_PROGRESS_ROUTES):
+        """Add progress streaming to registered POST views under the given rule prefixes"""
+        # Blueprint endpoints only; the application's own routes opt in with streamable()
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules()
+                     if '.' in rule.endpoint and 'POST' in rule.methods and rule.rule.startswith(tuple(prefixes))}
+        for endpoint in endpoints:
+            app.view_functions[endpoint] = self.streamable(endpoint)(app.view_functions[endpoint])
+        return endpoints
+
+
+class _ViewError(Exception):
+    """A replayed view answered with an error status"""
+
+    def __init__(self, payload):
+        super().__init__(payload.get('error'))
+        self.payload = payload
+
+    def to_dict(self):
+        return self.payload
+
+
+def _copy_environ():
+    """WSGI environ of the current request with its body buffered for a replay"""
+    from io import BytesIO
+    body = request.get_data(cache=True)
+    environ = {key: value for key, value in request.environ.items()
+               if not key.startswith(('werkzeug.', 'wsgi.input'))}
+    environ['wsgi.input'] = BytesIO(body)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['HTTP_ACCEPT'] = 'application/json'
+    return environ
@@ -1,55 +1,301 @@
 import io
-import openai
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO
+from llm_client import get_llm_client
+from meeting_audio import SpeechSegmenter, pcm_to_wav
+from meeting_insights import MeetingState, generate_insight
+from meeting_session_store import WORKER_ID, get_session_store
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/ws/meeting-audio'
+
+# 16kHz 16-bit mono audio is split into speech segments at pauses as it
+# arrives; the pending-segment queue below is the only backpressure point
+MIN_SEGMENT_SECONDS = float(os.environ.get('MEETING_MIN_SEGMENT_SECONDS', 1.0))
+MAX_SEGMENT_SECONDS = float(os.environ.get('MEETING_MAX_SEGMENT_SECONDS', 15.0))
+SILENCE_MS = int(os.environ.get('MEETING_SILENCE_MS', 600))
+# Segments a single client may have in transcription/analysis at once, and
+# how many more may wait before the oldest are dropped
+MAX_INFLIGHT_SEGMENTS = int(os.environ.get('MEETING_MAX_INFLIGHT_SEGMENTS', 2))
+MAX_PENDING_SEGMENTS = int(os.environ.get('MEETING_MAX_PENDING_SEGMENTS', 4))
+# A worker keeps processing a session while it renews this lease; local
+# copies of sessions that went quiet are dropped after the idle timeout
+LEASE_SECONDS = int(os.environ.get('MEETING_LEASE_SECONDS', 10))
+IDLE_SESSION_SECONDS = int(os.environ.get('MEETING_IDLE_SESSION_SECONDS', 600))
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Workers are OS threads, so the server runs in threading mode by default.
+# With several processes, SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) lets any
+# of them emit to a client connected to another.
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    async_mode=os.environ.get('MEETING_ASYNC_MODE', 'threading'),
+                    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
+
+store = get_session_store()
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('MEETING_WORKERS', 8)),
+    thread_name_prefix='meeting-audio'
+)
+
+
+class MeetingSession:
+    """Per-client speech segmenter, meeting state and in-flight bookkeeping"""
+
+    def __init__(self):
+        self.segmenter = SpeechSegmenter(
+            min_segment=MIN_SEGMENT_SECONDS,
+            max_segment=MAX_SEGMENT_SECONDS,
+            silence_ms=SILENCE_MS
+        )
+        self.pending = deque()
+        self.meeting = MeetingState()
+        self.inflight = 0
+        self.sequence = 0
+        # Transcripts are delivered in segment order: finished ones wait here
+        # for their predecessors
+        self.completed = {}
+        self.next_delivery = 1
+        self.delivery_lock = threading.Lock()
+        # Fires generate_insight for transcripts left waiting when speech stops
+        self.insight_timer = None
+        # Set on disconnect: remaining segments are finished, then the session is dropped
+        self.closing = False
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+        # Keeps the state snapshots written to the store in order
+        self.state_lock = threading.Lock()
+
+
+# Sessions this worker currently processes (it holds their store lease)
+sessions = {}
 
-# Set your OpenAI API key
-openai.api_key = "YOUR_OPENAI_API_KEY"
 
-audio_buffers = {}
+def get_local_session(sid):
+    session = sessions.get(sid)
+    if session is None:
+        # First chunk on this worker, or taking over from a worker that
+        # stopped renewing its lease: resume the shared meeting state, the
+        # utterance it was segmenting and its transcript numbering
+        session = MeetingSession()
+        state = store.load_state(sid)
+        if state:
+            session.meeting.load_dict(state.get('meeting', {}))
+            session.segmenter.load_dict(state.get('segmenter', {}))
+            session.sequence = state.get('sequence', 0)
+            session.next_delivery = session.sequence + 1
+        sessions[sid] = session
+    session.last_seen = time.monotonic()
+    return session
 
-@socketio.on('connect', namespace='/ws/meeting-audio')
+
+def save_session_state(sid, session):
+    """Share the session with the store so another worker can take it over"""
+    with session.state_lock:
+        if sessions.get(sid) is not session:
+            return
+        with session.lock:
+            state = {
+                'meeting': session.meeting.to_dict(),
+                'segmenter': session.segmenter.to_dict(),
+                'sequence': session.sequence
+            }
+        store.save_state(sid, state)
+
+
+def purge_idle_sessions():
+    cutoff = time.monotonic() - IDLE_SESSION_SECONDS
+    for sid, session in list(sessions.items()):
+        if session.last_seen < cutoff and not session.inflight:
+            sessions.pop(sid, None)
+
+
+@socketio.on('connect', namespace=NAMESPACE)
 def handle_connect():
+    purge_idle_sessions()
     print("Client connected")
 
-@socketio.on('disconnect', namespace='/ws/meeting-audio')
+
+@socketio.on('disconnect', namespace=NAMESPACE)
 def handle_disconnect():
     sid = request.sid
-    if sid in audio_buffers:
-        del audio_buffers[sid]
+    session = sessions.get(sid)
+    if session is None:
+        store.delete(sid)
+    else:
+        with session.lock:
+            if session.insight_timer is not None:
+                session.insight_timer.cancel()
+                session.insight_timer = None
+        # Transcribe the utterance that was still in progress before dropping the session
+        audio = store.drain_audio(sid)
+        with session.lock:
+            session.closing = True
+            segments = session.segmenter.feed(audio)
+            tail = session.segmenter.flush()
+            session.pending.extend(segments + ([tail] if tail else []))
+        dispatch_segments(sid, session)
+        finish_closed_session(sid, session)
     print("Client disconnected")
 
-@socketio.on('message', namespace='/ws/meeting-audio')
+
+def finish_closed_session(sid, session):
+    """Drop a disconnected session once its last segments are done"""
+    with session.lock:
+        if not session.closing or session.pending or session.inflight:
+            return
+    if sessions.get(sid) is session:
+        sessions.pop(sid, None)
+    store.delete(sid)
+
+
+@socketio.on('message', namespace=NAMESPACE)
 def handle_audio_chunk(audio_chunk):
     sid = request.sid
-    # Buffer the audio data
-    if sid not in audio_buffers:
-        audio_buffers[sid] = b''
-    audio_buffers[sid] += audio_chunk
-
-    # For demo: every ~5 seconds or if buffer > threshold, transcribe and analyze
-    if len(audio_buffers[sid]) > 16000 * 2 * 5:  # 5 seconds of 16kHz 16-bit mono
-        audio_data = audio_buffers[sid]
-        audio_buffers[sid] = b''
+    # Chunks may arrive on any worker; only the lease holder processes them
+    store.append_audio(sid, audio_chunk)
+    if not store.acquire(sid, WORKER_ID, LEASE_SECONDS):
+        return
+    session = get_local_session(sid)
+
+    # Silent stretches never leave the segmenter
+    audio = store.drain_audio(sid)
+    dropped_segments = 0
+    with session.lock:
+        for segment in session.segmenter.feed(audio):
+            if len(session.pending) >= MAX_PENDING_SEGMENTS:
+                # Workers are behind: drop the oldest waiting segment
+                session.pending.popleft()
+                dropped_segments += 1
+            session.pending.append(segment)
+    if dropped_segments:
+        socketio.emit('message', {'type': 'backpressure', 'dropped_segments': dropped_segments},
+                      to=sid, namespace=NAMESPACE)
+
+    dispatch_segments(sid, session)
+    # The drained audio is only held by the segmenter now; the timer keeps
+    # the lease while the client is silent
+    save_session_state(sid, session)
+    schedule_trailing_insight(sid, session)
+
+
+def dispatch_segments(sid, session):
+    """Hand pending speech segments to the worker pool without blocking the event handler"""
+    while True:
+        with session.lock:
+            if not session.pending or session.inflight >= MAX_INFLIGHT_SEGMENTS:
+                return
+            session.inflight += 1
+            session.sequence += 1
+            sequence = session.sequence
+            audio_data = session.pending.popleft()
+        executor.submit(process_audio_segment, sid, session, sequence, audio_data)
+
+
+def deliver_transcript(sid, session, sequence, transcription):
+    """Emit transcripts in segment order; returns True if an insight became due"""
+    due = False
+    with session.delivery_lock:
+        with session.lock:
+            session.completed[sequence] = transcription
+            ready = []
+            while session.next_delivery in session.completed:
+                ready.append((session.next_delivery, session.completed.pop(session.next_delivery)))
+                session.next_delivery += 1
+        for ready_sequence, text in ready:
+            socketio.emit('message', {'type': 'transcription', 'seq': ready_sequence, 'text': text},
+                          to=sid, namespace=NAMESPACE)
+            due = session.meeting.add_transcript(text) or due
+    return due
+
+
+def process_audio_segment(sid, session, sequence, audio_data):
+    """Worker: transcribe one segment and push an insight when the meeting state says one is due"""
+    transcription = ''
+    try:
         # Transcribe with OpenAI Whisper API
         transcription = transcribe_audio_openai(audio_data)
-        emit('message', {'type': 'transcription', 'text': transcription})
-        # Analyze with ChatGPT
-        insight = analyze_with_gpt(transcription)
-        emit('message', {'type': 'insight', 'insight': insight})
+    except Exception as e:
+        logger.error(f"Error transcribing audio segment {sequence} for {sid}: {str(e)}", exc_info=True)
+    try:
+        # A failed segment still takes its turn so later ones are not held back
+        if deliver_transcript(sid, session, sequence, transcription):
+            # Batched, debounced analysis with the rolling meeting context
+            emit_insight(sid, session, sequence)
+        if not session.closing:
+            save_session_state(sid, session)
+            schedule_trailing_insight(sid, session)
+    except Exception as e:
+        logger.error(f"Error processing audio segment {sequence} for {sid}: {str(e)}", exc_info=True)
+    finally:
+        with session.lock:
+            session.inflight -= 1
+        # Pick up audio that queued while this client was at its in-flight limit
+        if sessions.get(sid) is session:
+            dispatch_segments(sid, session)
+        finish_closed_session(sid, session)
+
+
+def emit_insight(sid, session, sequence=None):
+    result = generate_insight(session.meeting)
+    if result and result['insight']:
+        socketio.emit('message', {'type': 'insight', 'seq': sequence, 'insight': result['insight'],
+                                  'summary': result['summary']},
+                      to=sid, namespace=NAMESPACE)
+
+
+def schedule_trailing_insight(sid, session, min_delay=0.0):
+    """Analyze transcripts that are still waiting once they fall due, even if no more speech arrives.
+
+    The same timer renews the session lease, so it fires at least every half lease.
+    """
+    delay = session.meeting.seconds_until_due()
+    renew_after = LEASE_SECONDS / 2
+    delay = renew_after if delay is None else min(max(delay, min_delay), renew_after)
+    with session.lock:
+        if session.insight_timer is not None or session.closing:
+            return
+        session.insight_timer = threading.Timer(delay + 0.1, lambda: executor.submit(run_trailing_insight, sid, session))
+        session.insight_timer.daemon = True
+        session.insight_timer.start()
+
+
+def run_trailing_insight(sid, session):
+    with session.lock:
+        session.insight_timer = None
+    if sessions.get(sid) is not session or session.closing:
+        return
+    if not store.acquire(sid, WORKER_ID, LEASE_SECONDS):
+        # Another worker took the session over; its copy is the live one
+        if sessions.get(sid) is session:
+            sessions.pop(sid, None)
+        return
+    try:
+        emit_insight(sid, session)
+        save_session_state(sid, session)
+        schedule_trailing_insight(sid, session)
+    except Exception as e:
+        logger.error(f"Error generating trailing insight for {sid}: {str(e)}", exc_info=True)
+        # The transcripts were put back; retry after the debounce interval
+        schedule_trailing_insight(sid, session, min_delay=session.meeting.base_interval)
+
 
 def transcribe_audio_openai(audio_bytes):
-    # OpenAI Whisper API expects a file-like object
-    audio_file = io.BytesIO(audio_bytes)
+    # OpenAI Whisper API expects a file-like object holding a real WAV file
+    audio_file = io.BytesIO(pcm_to_wav(audio_bytes))
     audio_file.name = "audio.wav"
     audio_file.seek(0)
     try:
-        transcript = openai.Audio.transcribe(
+        transcript = get_llm_client().transcribe(
+            audio_file,
             model="whisper-1",
-            file=audio_file,
             response_format="text"
         )
         return transcript
@@ -57,17 +303,6 @@ def transcribe_audio_openai(audio_bytes):
         print(f"Whisper API error: {e}")
         return ""
 
-def analyze_with_gpt(text):
-    if not text.strip():
-        return ""
-    prompt = f"Analyze the following meeting transcript and provide a single actionable insight:\n\n{text}"
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",  # or "gpt-4" if available
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=100,
-        temperature=0.7,
-    )
-    return response['choices'][0]['message']['content'].strip()
 
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5001)
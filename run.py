@@ -1,6 +1,9 @@
-from app import create_app
+from app import create_app, init_database, resume_pending_jobs
 
-app = create_app()
+app, socketio = create_app(resume_jobs=False)
 
 if __name__ == '__main__':
+    # Development server: set up the schema before resuming jobs
+    init_database(app)
+    resume_pending_jobs(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
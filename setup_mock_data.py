@@ -8,6 +8,7 @@ import sys
 from flask import Flask
 from backend.models.erp_process import ERPProcess, ERPProcessStep
 from backend.models import db
+from process_repository import save_processes
 
 # Create a minimal Flask app to use SQLAlchemy
 app = Flask(__name__)
@@ -169,37 +170,22 @@ def setup_mock_data():
     with app.app_context():
         print("Setting up mock process data...")
         
-        # Create processes
-        for process_data in mock_processes:
-            # Check if process with this ID already exists
-            existing = ERPProcess.query.get(process_data['id'])
-            if existing:
-                print(f"Process {process_data['id']} - {process_data['name']} already exists, skipping...")
-                continue
-                
-            # Create new process
-            process = ERPProcess(
-                id=process_data['id'],
-                process_name=process_data['name'],
-                erp_system=process_data['category'],
-                created_at=db.func.now(),
-                updated_at=db.func.now()
-            )
-            db.session.add(process)
-            
-            # Create steps for this process
-            for step_data in process_data['steps']:
-                step = ERPProcessStep(
-                    process_id=process_data['id'],
-                    step_number=step_data['number'],
-                    step_description=step_data['description'],
-                    approver_role=step_data['approver_role'],
-                    approver_name=step_data['approver_name'],
-                    created_at=db.func.now()
-                )
-                db.session.add(step)
-                
-            print(f"Added process: {process_data['name']} with {len(process_data['steps'])} steps")
+        # Skip processes that already exist (one query for all ids)
+        existing_ids = {row.id for row in db.session.query(ERPProcess.id).filter(
+            ERPProcess.id.in_([process_data['id'] for process_data in mock_processes]))}
+        for process_id in sorted(existing_ids):
+            print(f"Process {process_id} already exists, skipping...")
+        
+        # Create the remaining processes and all their steps in bulk
+        new_processes = [{
+            'id': process_data['id'],
+            'process_name': process_data['name'],
+            'erp_system': process_data['category'],
+            'steps': process_data['steps']
+        } for process_data in mock_processes if process_data['id'] not in existing_ids]
+        save_processes(new_processes, commit=False)
+        for process_data in new_processes:
+            print(f"Added process: {process_data['process_name']} with {len(process_data['steps'])} steps")
             
         # Commit all changes
         db.session.commit()
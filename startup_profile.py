@@ -0,0 +1,118 @@
+"""
+Startup profiling for worker boot.
+
+With BPM_STARTUP_PROFILE=1, ``create_app`` times each of its
+initialization steps (SocketIO, database, job queues, each blueprint, the
+static manifest, ...) together with the number of modules each step
+imported, logs a summary once the app is built and keeps it on
+``app.extensions['startup_profile']``.
+
+Run ``python startup_profile.py`` to also see where import time goes: it
+imports the app under ``python -X importtime`` in a subprocess, aggregates
+the self time per top-level package and then profiles ``create_app``.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def profiling_enabled():
+    return os.environ.get('BPM_STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+class StartupProfile:
+    """Wall-clock timings of named startup steps; a no-op unless enabled"""
+
+    def __init__(self, enabled=None):
+        self.enabled = profiling_enabled() if enabled is None else enabled
+        self.started = time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        modules_before = len(sys.modules)
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started, len(sys.modules) - modules_before))
+
+    def summary(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'steps': [{
+                'step': name,
+                'ms': round(seconds * 1000, 1),
+                'modules_imported': modules
+            } for name, seconds, modules in self.steps]
+        }
+
+    def finish(self, app):
+        """Log the summary and attach it to the app (only when enabled)"""
+        if not self.enabled:
+            return
+        summary = self.summary()
+        app.extensions['startup_profile'] = summary
+        logger.info(f"create_app finished in {summary['total_ms']} ms (pid {os.getpid()})")
+        for step in sorted(summary['steps'], key=lambda s: s['ms'], reverse=True):
+            logger.info(f"  {step['ms']:>9.1f} ms  {step['modules_imported']:>5} modules  {step['step']}")
+
+
+def import_times(module='app'):
+    """[(package, self_ms, cumulative_ms)] for importing module, slowest first"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    self_us = defaultdict(int)
+    cumulative_us = defaultdict(int)
+    for line in result.stderr.splitlines():
+        parts = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        package = parts[2].strip().split('.')[0]
+        self_us[package] += int(parts[0])
+        # The outermost import of a package carries the largest cumulative time
+        cumulative_us[package] = max(cumulative_us[package], int(parts[1]))
+    if result.returncode != 0:
+        logger.warning(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+    return sorted(((package, own / 1000, cumulative_us.get(package, 0) / 1000)
+                   for package, own in self_us.items()), key=lambda row: row[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile application import and create_app time')
+    parser.add_argument('--module', default='app', help='module to import (default: app)')
+    parser.add_argument('--top', type=int, default=25, help='number of packages to list')
+    parser.add_argument('--skip-create-app', action='store_true', help='only measure imports')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    rows = import_times(args.module)
+    print(f"Import time of '{args.module}' by top-level package (self / cumulative):")
+    for package, own, cumulative in rows[:args.top]:
+        print(f"  {own:>9.1f} ms  {cumulative:>9.1f} ms  {package}")
+    print(f"  {sum(row[1] for row in rows):>9.1f} ms total self time")
+
+    if not args.skip_create_app:
+        os.environ['BPM_STARTUP_PROFILE'] = '1'
+        started = time.perf_counter()
+        from app import create_app
+        imported = time.perf_counter()
+        create_app(resume_jobs=False)
+        print(f"import app: {(imported - started) * 1000:.1f} ms, "
+              f"create_app: {(time.perf_counter() - imported) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
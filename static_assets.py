@@ -0,0 +1,240 @@
+"""
+In-memory static file serving for the built React frontend.
+
+The dist folder is scanned once at startup into a manifest of every file
+with its MIME type, a content ETag, the Cache-Control policy and any
+compressed variants:
+
+* ``foo.js.br`` / ``foo.js.gz`` produced by the frontend build are used as
+  they are; otherwise compressible files are gzip-compressed (and
+  brotli-compressed when the optional ``brotli`` package is installed) once,
+  at startup.
+* Content-hashed files under ``assets/`` (``index-3f9c2a1b.js``,
+  ``flowDiagram-9a8b7c6d.js``, ...) get a far-future ``immutable``
+  Cache-Control; everything else, index.html in particular, must be
+  revalidated.
+* Conditional requests are answered from the precomputed ETags, and files up
+  to STATIC_MEMORY_MAX_KB are served from memory, so the common requests do
+  not touch the disk at all.
+
+A new frontend build is picked up when the workers restart (or on
+``StaticAssets.reload()``).
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Response, abort, request
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+# Vite names bundle files <name>-<hash>.<ext>; the hash is 8+ url-safe characters
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'application/wasm', 'font/ttf', 'font/otf')
+COMPRESS_MIN_BYTES = 1024
+# Suffix of pre-built variants and the Content-Encoding they are served with
+PREBUILT_VARIANTS = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+class StaticAsset:
+    """One file of the manifest with its variants"""
+
+    def __init__(self, path, size, etag, mimetype, cache_control, body=None):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.body = body
+        # encoding -> (body bytes or None, file path, size)
+        self.variants = {}
+
+    def variant_etag(self, encoding):
+        return self.etag if encoding is None else f'{self.etag}-{encoding}'
+
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+def _is_compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _accepted_encodings(header):
+    """Content codings the client accepts, from an Accept-Encoding header"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticAssets:
+    """Serves a dist folder from a manifest built at startup"""
+
+    def __init__(self, folder=None, index='index.html'):
+        self.folder = folder
+        self.index = index
+        self.assets = {}
+        self.memory_max = int(float(os.environ.get('STATIC_MEMORY_MAX_KB', 2048)) * 1024)
+        self.precompress = os.environ.get('STATIC_PRECOMPRESS', 'true').lower() in ('1', 'true', 'yes', 'on')
+        if folder is not None:
+            self.reload()
+
+    def reload(self):
+        """(Re)build the manifest from the dist folder"""
+        assets = {}
+        if not self.folder or not os.path.isdir(self.folder):
+            logger.warning(f"Static folder {self.folder} not found; frontend assets will not be served")
+            self.assets = assets
+            return
+
+        prebuilt = set()
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.folder).replace(os.sep, '/')
+                for suffix, _ in PREBUILT_VARIANTS:
+                    if rel_path.endswith(suffix) and os.path.exists(full_path[:-len(suffix)]):
+                        prebuilt.add(rel_path)
+                        break
+                else:
+                    assets[rel_path] = self._load(rel_path, full_path)
+
+        for rel_path in prebuilt:
+            for suffix, encoding in PREBUILT_VARIANTS:
+                if rel_path.endswith(suffix):
+                    self._add_variant(assets[rel_path[:-len(suffix)]], encoding,
+                                      os.path.join(self.folder, rel_path))
+
+        if self.precompress:
+            for asset in assets.values():
+                self._compress(asset)
+
+        self.assets = assets
+        variants = sum(len(asset.variants) for asset in assets.values())
+        logger.info(f"Static manifest built: {len(assets)} files, {variants} compressed variants from {self.folder}")
+
+    def _load(self, rel_path, full_path):
+        size = os.path.getsize(full_path)
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_ASSET.match(rel_path) else REVALIDATE_CACHE_CONTROL
+        body = None
+        if size <= self.memory_max:
+            with open(full_path, 'rb') as f:
+                body = f.read()
+            etag = hashlib.sha1(body).hexdigest()[:20]
+        else:
+            etag = _file_digest(full_path)
+        return StaticAsset(full_path, size, etag, mimetype, cache_control, body)
+
+    def _add_variant(self, asset, encoding, path):
+        size = os.path.getsize(path)
+        if size >= asset.size:
+            return
+        body = None
+        if size <= self.memory_max:
+            with open(path, 'rb') as f:
+                body = f.read()
+        asset.variants[encoding] = (body, path, size)
+
+    def _compress(self, asset):
+        if asset.size < COMPRESS_MIN_BYTES or not _is_compressible(asset.mimetype):
+            return
+        if 'gzip' in asset.variants and ('br' in asset.variants or brotli is None):
+            return
+        content = asset.body
+        if content is None:
+            with open(asset.path, 'rb') as f:
+                content = f.read()
+        # Compressed variants stay in memory even for files served from disk
+        if 'gzip' not in asset.variants:
+            # mtime=0 keeps the bytes (and so the ETag'd response) identical across workers
+            body = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(body) < asset.size:
+                asset.variants['gzip'] = (body, None, len(body))
+        if brotli is not None and 'br' not in asset.variants:
+            body = brotli.compress(content)
+            if len(body) < asset.size:
+                asset.variants['br'] = (body, None, len(body))
+
+    def _negotiate(self, asset):
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding'))
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and encoding in accepted:
+                return encoding
+        return None
+
+    def _not_modified(self, asset):
+        header = request.headers.get('If-None-Match')
+        if not header:
+            return False
+        if header.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')}
+        # Any variant of unchanged content is still valid for the client
+        return bool(tags & {asset.variant_etag(encoding) for encoding in (None, *asset.variants)})
+
+    def response(self, rel_path):
+        """Response for one manifest entry, honouring Accept-Encoding and If-None-Match"""
+        asset = self.assets[rel_path]
+        encoding = self._negotiate(asset)
+        headers = {
+            'Cache-Control': asset.cache_control,
+            'ETag': f'"{asset.variant_etag(encoding)}"'
+        }
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if self._not_modified(asset):
+            return Response(status=304, headers=headers)
+
+        if encoding is None:
+            body, path, size = asset.body, asset.path, asset.size
+        else:
+            body, path, size = asset.variants[encoding]
+            headers['Content-Encoding'] = encoding
+        if body is None:
+            body = wrap_file(request.environ, open(path, 'rb'))
+        headers['Content-Length'] = str(size)
+        return Response(body, mimetype=asset.mimetype, headers=headers, direct_passthrough=True)
+
+    def serve(self, path):
+        """Serve a file of the build, falling back to index.html for client-side routes"""
+        if path in self.assets:
+            return self.response(path)
+        if path.startswith('assets/'):
+            # A missing bundle file must not turn into index.html served as JavaScript
+            abort(404)
+        return self.serve_index()
+
+    def serve_index(self):
+        if self.index not in self.assets:
+            abort(404)
+        return self.response(self.index)
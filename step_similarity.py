@@ -0,0 +1,341 @@
+"""
+Local similarity index over process step descriptions.
+
+Every ERPProcessStep and ToBeProcessStep description is turned into a
+fixed-size hashed TF-IDF vector (unigrams and bigrams hashed into
+STEP_INDEX_DIM signed buckets, weighted by bucket IDF, L2-normalized). The
+vectors and their step/process ids are written as ``.npy`` files and opened
+with ``mmap_mode='r'``, so every worker shares the same pages and a query is
+one matrix-vector product over the mapped array.
+
+Builds go into a fresh directory and the ``CURRENT`` pointer is swapped
+atomically, so readers never see a half-written index; steps saved after a
+build become searchable at the next build (``python step_similarity.py``).
+
+``align_steps`` uses the same vectors to pre-align AS-IS steps with TO-BE or
+best-practice steps for gap analysis without an LLM call.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from process_diff import normalize_description
+
+logger = logging.getLogger(__name__)
+
+STEP_INDEX_PATH = os.environ.get('STEP_INDEX_PATH', os.path.join('instance', 'step_index'))
+# More buckets mean fewer hash collisions but 4 bytes more per step per bucket
+STEP_INDEX_DIM = int(os.environ.get('STEP_INDEX_DIM', 256))
+# Rows scored per matrix product; bounds the temporary score arrays
+SEARCH_CHUNK_ROWS = 65536
+# Minimum cosine similarity for two steps to be aligned
+ALIGN_THRESHOLD = float(os.environ.get('STEP_ALIGN_THRESHOLD', 0.35))
+
+KIND_ERP = 0
+KIND_TOBE = 1
+KIND_NAMES = {KIND_ERP: 'erp', KIND_TOBE: 'tobe'}
+
+ID_DTYPE = np.dtype([('kind', np.int8), ('step_id', np.int64), ('process_id', np.int64),
+                     ('step_number', np.int32)])
+
+
+STOP_WORDS = frozenset('a an and are as at be by for from in into is of on or the to with'.split())
+SUFFIXES = ('ing', 'ed', 'es', 's')
+
+
+def _stem(word):
+    """Crude suffix stripping so 'approves', 'approved' and 'approve' share a token"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith('e') and len(word) > 3 else word
+
+
+def _features(text, dim):
+    """Signed bucket ids for the unigrams and bigrams of a step description"""
+    words = [_stem(word) for word in normalize_description(text).split() if word not in STOP_WORDS]
+    tokens = words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+    features = []
+    for token in tokens:
+        code = zlib.crc32(token.encode('utf-8'))
+        features.append((code % dim, 1.0 if code & 0x80000000 else -1.0))
+    return features
+
+
+def _fill_vectors(vectors, features, idf):
+    """Write IDF-weighted, L2-normalized hashed vectors into a zeroed array"""
+    for row, step_features in enumerate(features):
+        for bucket, sign in step_features:
+            vectors[row, bucket] += sign * idf[bucket]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _vectorize(texts, idf):
+    """Hashed TF-IDF vectors (float32, L2-normalized) for a list of texts"""
+    vectors = np.zeros((len(texts), len(idf)), dtype=np.float32)
+    return _fill_vectors(vectors, [_features(text, len(idf)) for text in texts], idf)
+
+
+def _iter_step_rows(session):
+    """(kind, step_id, process_id, step_number, description) for every step, grouped by process"""
+    from backend.models.erp_process import ERPProcessStep
+    from backend.models.tobe_process import ToBeProcessStep
+    for kind, model in ((KIND_ERP, ERPProcessStep), (KIND_TOBE, ToBeProcessStep)):
+        query = session.query(model.id, model.process_id, model.step_number, model.step_description)\
+            .order_by(model.process_id, model.step_number)\
+            .yield_per(10000)
+        for step_id, process_id, step_number, description in query:
+            yield kind, step_id, process_id, step_number or 0, description or ''
+
+
+def build_index(session=None, path=None, dim=None):
+    """Vectorize every step description and publish a new index; returns its metadata"""
+    if session is None:
+        from backend.models import db
+        session = db.session
+    path = path or STEP_INDEX_PATH
+    dim = dim or STEP_INDEX_DIM
+    started = time.perf_counter()
+
+    ids, features = [], []
+    document_frequency = np.zeros(dim, dtype=np.int64)
+    for kind, step_id, process_id, step_number, description in _iter_step_rows(session):
+        step_features = _features(description, dim)
+        ids.append((kind, step_id, process_id, step_number))
+        features.append(step_features)
+        for bucket in {bucket for bucket, _ in step_features}:
+            document_frequency[bucket] += 1
+
+    count = len(ids)
+    idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    build_dir = os.path.join(path, datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+    os.makedirs(build_dir)
+    vectors = np.lib.format.open_memmap(os.path.join(build_dir, 'vectors.npy'), mode='w+',
+                                        dtype=np.float32, shape=(count, dim))
+    _fill_vectors(vectors, features, idf)
+    vectors.flush()
+    del vectors
+
+    id_array = np.array(ids, dtype=ID_DTYPE)
+    # Rows are grouped by (kind, process); keep where each process starts
+    if count:
+        boundaries = np.flatnonzero((np.diff(id_array['kind']) != 0) | (np.diff(id_array['process_id']) != 0)) + 1
+        process_starts = np.concatenate(([0], boundaries)).astype(np.int64)
+    else:
+        process_starts = np.zeros(0, dtype=np.int64)
+    np.save(os.path.join(build_dir, 'ids.npy'), id_array)
+    np.save(os.path.join(build_dir, 'process_starts.npy'), process_starts)
+    np.save(os.path.join(build_dir, 'idf.npy'), idf)
+
+    meta = {
+        'version': os.path.basename(build_dir),
+        'dim': dim,
+        'steps': count,
+        'processes': int(len(process_starts)),
+        'built_at': datetime.utcnow().isoformat(),
+        'build_seconds': round(time.perf_counter() - started, 2)
+    }
+    with open(os.path.join(build_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Publish atomically, then drop older builds
+    pointer = os.path.join(path, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(meta['version'])
+    os.replace(pointer + '.tmp', pointer)
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if os.path.isdir(full) and name != meta['version']:
+            shutil.rmtree(full, ignore_errors=True)
+
+    logger.info(f"Built step index with {count} steps in {meta['build_seconds']}s")
+    return meta
+
+
+class StepIndex:
+    """Memory-mapped step vectors with top-k step and process search"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.version = self.meta['version']
+        self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r')
+        self.process_starts = np.load(os.path.join(directory, 'process_starts.npy'))
+        self.idf = np.load(os.path.join(directory, 'idf.npy'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vectorize(self, texts):
+        return _vectorize(texts, self.idf)
+
+    def _row(self, row, score):
+        kind, step_id, process_id, step_number = self.ids[row]
+        return {
+            'kind': KIND_NAMES[int(kind)],
+            'step_id': int(step_id),
+            'process_id': int(process_id),
+            'step_number': int(step_number),
+            'score': round(float(score), 4)
+        }
+
+    def _kind_mask(self, kind, start, end):
+        if kind is None:
+            return None
+        return self.ids['kind'][start:end] == kind
+
+    def search_steps(self, text, k=10, kind=None):
+        """Top-k most similar indexed steps for a step description"""
+        query = self.vectorize([text])[0]
+        if not query.any() or not len(self):
+            return []
+        best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for start in range(0, len(self), SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, len(self))
+            scores = self.vectors[start:end] @ query
+            mask = self._kind_mask(kind, start, end)
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            best_rows = np.concatenate((best_rows, top + start))
+            best_scores = np.concatenate((best_scores, scores[top]))
+        order = np.argsort(-best_scores)[:k]
+        return [self._row(best_rows[i], best_scores[i]) for i in order if best_scores[i] > 0]
+
+    def search_processes(self, texts, k=10, kind=None, exclude=None):
+        """Top-k processes whose steps best cover the given step descriptions.
+
+        A process scores the mean, over the query steps, of its best
+        matching step's similarity. ``exclude`` is a (kind, process_id) pair
+        to leave out, e.g. the query process itself.
+        """
+        queries = self.vectorize(texts)
+        queries = queries[queries.any(axis=1)]
+        if not len(queries) or not len(self):
+            return []
+
+        starts = self.process_starts
+        process_scores = np.empty(len(starts), dtype=np.float32)
+        # Score whole processes per chunk so none is split across chunks
+        first = 0
+        while first < len(starts):
+            last = int(np.searchsorted(starts, starts[first] + SEARCH_CHUNK_ROWS, side='left'))
+            last = max(last, first + 1)
+            row_start = int(starts[first])
+            row_end = int(starts[last]) if last < len(starts) else len(self)
+            scores = queries @ self.vectors[row_start:row_end].T
+            best = np.maximum.reduceat(scores, starts[first:last] - row_start, axis=1)
+            process_scores[first:last] = best.mean(axis=0)
+            first = last
+
+        process_kinds = self.ids['kind'][starts]
+        process_ids = self.ids['process_id'][starts]
+        if kind is not None:
+            process_scores[process_kinds != kind] = -np.inf
+        if exclude is not None:
+            process_scores[(process_kinds == exclude[0]) & (process_ids == exclude[1])] = -np.inf
+
+        k = min(k, len(process_scores))
+        top = np.argpartition(-process_scores, k - 1)[:k]
+        top = top[np.argsort(-process_scores[top])]
+        return [{
+            'kind': KIND_NAMES[int(process_kinds[i])],
+            'process_id': int(process_ids[i]),
+            'score': round(float(process_scores[i]), 4)
+        } for i in top if process_scores[i] > 0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_step_index(path=None):
+    """The published index, reloaded when a newer build is published; None if none exists"""
+    global _index
+    path = path or STEP_INDEX_PATH
+    try:
+        with open(os.path.join(path, 'CURRENT')) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = StepIndex(os.path.join(path, version))
+        return _index
+
+
+def align_steps(asis_steps, target_steps, threshold=None):
+    """Pair each AS-IS step with its most similar target step, one-to-one.
+
+    Steps are dicts with a 'description' (and usually 'number'). Pairs are
+    assigned greedily from the most similar down; steps with no partner above
+    the threshold are returned as unmatched. Uses the published index's IDF
+    weights when one exists.
+    """
+    threshold = ALIGN_THRESHOLD if threshold is None else threshold
+    index = get_step_index()
+    idf = index.idf if index is not None else np.ones(STEP_INDEX_DIM, dtype=np.float32)
+    asis_vectors = _vectorize([step.get('description', '') for step in asis_steps], idf)
+    target_vectors = _vectorize([step.get('description', '') for step in target_steps], idf)
+    similarity = asis_vectors @ target_vectors.T if len(asis_steps) and len(target_steps) else \
+        np.zeros((len(asis_steps), len(target_steps)), dtype=np.float32)
+
+    pairs, used_asis, used_target = [], set(), set()
+    for flat in np.argsort(-similarity, axis=None):
+        i, j = divmod(int(flat), similarity.shape[1])
+        if similarity[i, j] < threshold:
+            break
+        if i in used_asis or j in used_target:
+            continue
+        used_asis.add(i)
+        used_target.add(j)
+        pairs.append({
+            'asis': asis_steps[i],
+            'target': target_steps[j],
+            'score': round(float(similarity[i, j]), 4)
+        })
+
+    pairs.sort(key=lambda pair: pair['asis'].get('number') or 0)
+    return {
+        'pairs': pairs,
+        'unmatched_asis': [step for i, step in enumerate(asis_steps) if i not in used_asis],
+        'unmatched_target': [step for j, step in enumerate(target_steps) if j not in used_target]
+    }
+
+
+def load_steps(kind, process_id, session=None):
+    """Ordered steps of an ERP ('erp') or TO-BE ('tobe') process in the extraction format"""
+    from backend.models import db
+    from backend.models.erp_process import ERPProcessStep
+    from backend.models.tobe_process import ToBeProcessStep
+    session = session or db.session
+    model = ToBeProcessStep if kind == 'tobe' else ERPProcessStep
+    rows = session.query(model.step_number, model.step_description, model.approver_role, model.approver_name)\
+        .filter(model.process_id == process_id)\
+        .order_by(model.step_number)\
+        .all()
+    return [{
+        'number': number,
+        'description': description or '',
+        'role': role or '',
+        'owner': owner or ''
+    } for number, description, role, owner in rows]
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app, _ = create_app()
+    with app.app_context():
+        print(json.dumps(build_index(), indent=2))
@@ -0,0 +1,165 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import diagram_svg
+from content_cache import ContentCache
+from diagram_svg import NODE_GAP, layout_graph, layout_svg, render_svg
+
+
+def _nodes(*ids, kinds=None):
+    kinds = kinds or {}
+    return [{'id': node_id, 'title': f'Step {node_id}', 'owner': 'Clerk', 'kind': kinds.get(node_id, 'task')}
+            for node_id in ids]
+
+
+def _assert_no_overlaps(layout):
+    by_rank = {}
+    for node in layout.nodes.values():
+        by_rank.setdefault(node.rank, []).append(node)
+    for layer in by_rank.values():
+        layer.sort(key=lambda node: node.x)
+        for left, right in zip(layer, layer[1:]):
+            assert right.x - left.x >= (left.width + right.width) / 2 + NODE_GAP - 1e-6
+    for node in layout.nodes.values():
+        assert node.x - node.width / 2 >= 0 and node.x + node.width / 2 <= layout.width
+        assert node.y - node.height / 2 >= 0 and node.y + node.height / 2 <= layout.height
+
+
+def test_linear_graph_is_one_node_per_rank():
+    layout = layout_graph(_nodes('1', '2', '3'), [('1', '2', ''), ('2', '3', '')])
+
+    assert [layout.nodes[node_id].rank for node_id in '123'] == [0, 1, 2]
+    assert layout.nodes['1'].y < layout.nodes['2'].y < layout.nodes['3'].y
+    assert len({round(node.x, 6) for node in layout.nodes.values()}) == 1
+
+
+def test_branches_share_a_rank_side_by_side_and_merge():
+    nodes = _nodes('1', '2', '3', '4', kinds={'1': 'decision'})
+    edges = [('1', '2', 'yes'), ('1', '3', 'no'), ('2', '4', ''), ('3', '4', '')]
+
+    layout = layout_graph(nodes, edges)
+
+    ranks = {node_id: node.rank for node_id, node in layout.nodes.items()}
+    assert ranks == {'1': 0, '2': 1, '3': 1, '4': 2}
+    _assert_no_overlaps(layout)
+    # The merge node sits between its two predecessors
+    left, right = sorted((layout.nodes['2'].x, layout.nodes['3'].x))
+    assert left < layout.nodes['4'].x < right
+
+
+def test_cycle_is_laid_out_with_the_back_edge_reversed():
+    edges = [('1', '2', ''), ('2', '3', ''), ('3', '1', 'retry')]
+
+    layout = layout_graph(_nodes('1', '2', '3'), edges)
+
+    assert [layout.nodes[node_id].rank for node_id in '123'] == [0, 1, 2]
+    back = next(edge for edge in layout.edges if edge.source == '3')
+    # Drawn from step 3 back up to step 1
+    assert back.points[0][1] > back.points[-1][1]
+    assert back.label == 'retry'
+    _assert_no_overlaps(layout)
+
+
+def test_long_edges_bend_through_the_ranks_they_cross():
+    edges = [('1', '2', ''), ('2', '3', ''), ('3', '4', ''), ('1', '4', 'skip')]
+
+    layout = layout_graph(_nodes('1', '2', '3', '4'), edges)
+
+    skip = next(edge for edge in layout.edges if edge.label == 'skip')
+    assert len(skip.points) == 4
+    # Virtual bend points are not drawn as steps
+    assert sorted(layout.nodes) == ['1', '2', '3', '4']
+    _assert_no_overlaps(layout)
+
+
+def test_self_loop_is_drawn_beside_its_node():
+    layout = layout_graph(_nodes('1', '2'), [('1', '1', 'again'), ('1', '2', '')])
+
+    loop = next(edge for edge in layout.edges if edge.loop)
+    node = layout.nodes['1']
+    assert all(x >= node.x + node.width / 2 for x, _ in loop.points)
+    assert layout.nodes['2'].rank == 1
+
+
+def test_disconnected_and_empty_graphs():
+    layout = layout_graph(_nodes('1', '2'), [])
+    assert {node.rank for node in layout.nodes.values()} == {0}
+    _assert_no_overlaps(layout)
+
+    empty = layout_graph([], [])
+    assert empty.nodes == {} and empty.edges == []
+
+
+def test_svg_has_one_group_per_step_and_edge():
+    nodes = _nodes('1', '2', '3', kinds={'1': 'start', '2': 'decision', '3': 'end'})
+    nodes[1]['title'] = 'Approve <urgent> & "rush" orders'
+    layout = layout_graph(nodes, [('2', '3', 'yes'), ('1', '2', ''), ('2', '1', 'no')])
+
+    root = ET.fromstring(layout_svg(layout))
+
+    namespace = {'svg': 'http://www.w3.org/2000/svg'}
+    groups = root.findall(".//svg:g[@data-step]", namespace)
+    assert [group.get('data-step') for group in groups] == ['1', '2', '3']
+    assert groups[1].find('svg:polygon', namespace) is not None
+    assert len(root.find("svg:g[@class='edges']", namespace).findall('svg:polyline', namespace)) == 3
+    assert [span.text for span in groups[1].iter('{http://www.w3.org/2000/svg}tspan')] == \
+        ['Approve <urgent> & "rush"', 'orders', 'Clerk']
+
+
+@pytest.fixture
+def svg_cache(tmp_path, monkeypatch):
+    cache = ContentCache('diagram_svg', path=str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(diagram_svg, 'get_cache', lambda namespace: cache)
+    return cache
+
+
+def test_render_svg_lays_out_once_per_content(svg_cache, monkeypatch):
+    process = {'steps': [{'number': 1, 'description': 'Receive invoice', 'next_steps': [2]},
+                         {'number': 2, 'description': 'Pay vendor', 'next_steps': [1]}]}
+    key, svg = render_svg(process)
+
+    monkeypatch.setattr(diagram_svg, 'layout_process', lambda info: pytest.fail('laid out again'))
+    assert render_svg({'steps': [dict(step) for step in process['steps']]}) == (key, svg)
+    assert 'Receive invoice' in svg
+
+
+class RecordingPdf:
+    """The FPDF calls draw_on_pdf makes, on an A4 page with 10 mm margins"""
+
+    w, h = 210, 297
+    l_margin = r_margin = t_margin = b_margin = 10
+
+    def __init__(self):
+        self.y = 10
+        self.calls = []
+        self.pages = 1
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+    def get_y(self):
+        return self.y
+
+    def add_page(self):
+        self.pages += 1
+        self.y = self.t_margin
+
+
+def test_draw_on_pdf_stays_inside_the_page():
+    process = {'steps': [{'number': 1, 'description': 'Receive invoice', 'type': 'start', 'next_steps': [2]},
+                         {'number': 2, 'description': 'Approve for €500?', 'next_steps': [3, 1]},
+                         {'number': 3, 'description': 'Pay vendor', 'type': 'end'}]}
+    pdf = RecordingPdf()
+
+    height = diagram_svg.draw_on_pdf(pdf, process)
+
+    rects = [args for name, args in pdf.calls if name == 'rect']
+    lines = [args for name, args in pdf.calls if name == 'line']
+    texts = [args[2] for name, args in pdf.calls if name == 'cell']
+    assert len(rects) == 2 and lines
+    assert 0 < height <= pdf.h - pdf.t_margin - pdf.b_margin
+    for x1, y1, x2, y2 in lines:
+        assert pdf.l_margin - 1e-6 <= min(x1, x2) and max(x1, x2) <= pdf.w - pdf.r_margin + 1e-6
+    assert 'Approve for ?500?' in texts
+    assert pdf.pages == 1
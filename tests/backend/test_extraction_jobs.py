@@ -0,0 +1,88 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('backend.models')
+
+from flask import Flask
+
+from backend.models import db
+from extraction_jobs import ExtractionJob, ExtractionJobQueue
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    db.init_app(app)
+    jobs = ExtractionJobQueue(app)
+    jobs.executor = RecordingExecutor()
+    with app.app_context():
+        db.create_all()
+        yield jobs
+        db.session.remove()
+
+
+def _add_job(job_id, status, age_seconds=0):
+    updated_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    db.session.add(ExtractionJob(id=job_id, filename='doc.pdf', file_path='/missing', status=status,
+                                 created_at=updated_at, updated_at=updated_at))
+    db.session.commit()
+
+
+def _status(job_id):
+    return db.session.query(ExtractionJob.status).filter_by(id=job_id).scalar()
+
+
+def test_claim_succeeds_once(queue):
+    _add_job('job', 'queued')
+
+    assert queue._claim('job')
+    assert not queue._claim('job')
+    assert _status('job') == 'running'
+
+
+def test_resume_pending_requeues_only_stale_running_jobs(queue):
+    stale = queue.stale_after.total_seconds() + 60
+    _add_job('queued', 'queued', age_seconds=5)
+    _add_job('stale', 'running', age_seconds=stale)
+    _add_job('fresh', 'running', age_seconds=5)
+    _add_job('done', 'completed', age_seconds=stale)
+
+    queue.resume_pending()
+
+    assert sorted(args[0] for args in queue.executor.submitted) == ['queued', 'stale']
+    assert _status('fresh') == 'running'
+    assert _status('done') == 'completed'
+
+
+def test_heartbeat_keeps_a_long_running_job_from_being_requeued(queue):
+    _add_job('long', 'running', age_seconds=queue.stale_after.total_seconds() + 60)
+    queue.heartbeat_interval = 0.01
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=queue._heartbeat, args=('long', stop))
+    heartbeat.start()
+    try:
+        deadline = datetime.utcnow() + timedelta(seconds=5)
+        while datetime.utcnow() < deadline:
+            db.session.expire_all()
+            if db.session.get(ExtractionJob, 'long').updated_at > datetime.utcnow() - queue.stale_after:
+                break
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    queue.resume_pending()
+
+    assert queue.executor.submitted == []
+    assert _status('long') == 'running'
@@ -0,0 +1,123 @@
+import io
+import json
+import wave
+
+import numpy as np
+
+from meeting_audio import BYTES_PER_SAMPLE, SAMPLE_RATE, SpeechSegmenter, pcm_to_wav
+
+
+def tone(seconds, amplitude=5000):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype('<i2').tobytes()
+
+
+def silence(seconds, amplitude=40):
+    rng = np.random.default_rng(0)
+    return rng.integers(-amplitude, amplitude, int(SAMPLE_RATE * seconds)).astype('<i2').tobytes()
+
+
+def duration(segment):
+    return len(segment) / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+
+
+def test_silence_produces_no_segments():
+    segmenter = SpeechSegmenter()
+
+    assert segmenter.feed(silence(3)) == []
+    assert segmenter.flush() is None
+    assert segmenter.skipped_frames == 100
+
+
+def test_segment_ends_at_a_pause_with_preroll_and_trailing_silence():
+    segmenter = SpeechSegmenter()
+
+    segments = segmenter.feed(silence(1) + tone(2) + silence(1))
+
+    assert len(segments) == 1
+    # 200 ms pre-roll + 2 s of speech + 600 ms of silence, to the frame
+    assert abs(duration(segments[0]) - 2.8) <= 0.03
+    assert not segmenter.in_speech
+
+
+def test_two_utterances_split_at_the_pause_between_them():
+    segmenter = SpeechSegmenter()
+
+    segments = segmenter.feed(tone(1.5) + silence(1) + tone(1.5) + silence(1))
+
+    assert len(segments) == 2
+
+
+def test_short_pause_does_not_split_an_utterance():
+    segmenter = SpeechSegmenter()
+
+    segments = segmenter.feed(tone(1.5) + silence(0.3) + tone(1.5) + silence(1))
+
+    assert len(segments) == 1
+
+
+def test_blips_shorter_than_min_segment_are_dropped():
+    segmenter = SpeechSegmenter()
+
+    assert segmenter.feed(silence(0.5) + tone(0.3) + silence(1)) == []
+
+
+def test_long_speech_is_cut_at_max_segment():
+    segmenter = SpeechSegmenter(max_segment=5.0)
+
+    segments = segmenter.feed(tone(12))
+
+    assert len(segments) == 2
+    assert all(len(segment) == segmenter.max_frames * segmenter.frame_bytes for segment in segments)
+    assert segmenter.in_speech
+
+
+def test_chunk_boundaries_do_not_change_the_segments():
+    audio = silence(0.5) + tone(2) + silence(1) + tone(1.2) + silence(1)
+    whole = SpeechSegmenter().feed(audio)
+
+    segmenter, pieces = SpeechSegmenter(), []
+    for offset in range(0, len(audio), 1001):
+        pieces.extend(segmenter.feed(audio[offset:offset + 1001]))
+
+    assert pieces == whole
+    assert len(whole) == 2
+
+
+def test_flush_returns_the_utterance_in_progress():
+    segmenter = SpeechSegmenter()
+    assert segmenter.feed(tone(2)) == []
+
+    segment = segmenter.flush()
+
+    assert segment is not None and abs(duration(segment) - 2.0) <= 0.03
+    assert segmenter.flush() is None
+
+
+def test_flush_drops_a_too_short_utterance():
+    segmenter = SpeechSegmenter()
+    segmenter.feed(tone(0.5))
+
+    assert segmenter.flush() is None
+
+
+def test_utterance_in_progress_survives_a_handover():
+    audio = silence(0.5) + tone(2) + silence(1) + tone(1.2) + silence(1)
+    whole = SpeechSegmenter().feed(audio)
+    cut = len(audio) // 3 + 1
+
+    first = SpeechSegmenter()
+    before = first.feed(audio[:cut])
+    assert first.in_speech
+    second = SpeechSegmenter()
+    second.load_dict(json.loads(json.dumps(first.to_dict())))
+
+    assert before + second.feed(audio[cut:]) == whole
+
+
+def test_pcm_to_wav_wraps_mono_16_bit_audio():
+    pcm = tone(0.5)
+
+    with wave.open(io.BytesIO(pcm_to_wav(pcm))) as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, SAMPLE_RATE)
+        assert wav.readframes(wav.getnframes()) == pcm
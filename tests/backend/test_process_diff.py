@@ -0,0 +1,82 @@
+from process_diff import diff_processes, normalize_description, residual_processes
+
+
+def _process(*steps):
+    return {'name': 'Invoice Approval', 'steps': [
+        {'number': number, 'description': description, 'owner': owner, 'role': role}
+        for number, (description, owner, role) in enumerate(steps, start=1)
+    ]}
+
+
+RECEIVE = ('Receive the invoice', 'Clerk', 'AP')
+MATCH = ('Match invoice to purchase order', 'Clerk', 'AP')
+APPROVE = ('Approve invoice', 'Manager', 'Finance')
+PAY = ('Pay the vendor', 'Treasurer', 'Treasury')
+
+
+def test_normalize_description_ignores_case_punctuation_and_spacing():
+    assert normalize_description('  Approve   the Invoice!! ') == 'approve the invoice'
+    assert normalize_description(None) == ''
+
+
+def test_identical_processes():
+    diff = diff_processes(_process(RECEIVE, APPROVE), _process(RECEIVE, APPROVE))
+
+    assert diff['identical'] and diff['trivial']
+    assert diff['unchanged'] == 2
+
+
+def test_added_and_removed_steps():
+    diff = diff_processes(_process(RECEIVE, MATCH, APPROVE), _process(RECEIVE, APPROVE, PAY))
+
+    assert [step['description'] for step in diff['removed']] == [MATCH[0]]
+    assert [step['description'] for step in diff['added']] == [PAY[0]]
+    assert diff['summary']['unchanged'] == 2
+    assert not diff['identical'] and not diff['trivial']
+
+
+def test_moved_step_is_not_reported_as_added_and_removed():
+    diff = diff_processes(_process(RECEIVE, MATCH, APPROVE, PAY), _process(RECEIVE, APPROVE, MATCH, PAY))
+
+    assert diff['added'] == [] and diff['removed'] == []
+    assert len(diff['moved']) == 1
+    moved = diff['moved'][0]
+    assert {moved['from'], moved['to']} == {2, 3}
+    assert diff['trivial']
+
+
+def test_reworded_step_is_modified_with_its_similarity():
+    reworded = ('Match the invoice to its purchase order', 'Clerk', 'AP')
+    diff = diff_processes(_process(RECEIVE, MATCH), _process(RECEIVE, reworded))
+
+    assert diff['added'] == [] and diff['removed'] == []
+    [change] = diff['modified']
+    assert change['before']['description'] == MATCH[0]
+    assert change['after']['description'] == reworded[0]
+    assert 0.6 <= change['similarity'] < 1
+
+
+def test_typo_level_rewording_is_trivial():
+    typo = ('Aprove invoice', 'Manager', 'Finance')
+    diff = diff_processes(_process(RECEIVE, APPROVE), _process(RECEIVE, typo))
+
+    assert len(diff['modified']) == 1
+    assert diff['trivial'] and not diff['identical']
+
+
+def test_owner_and_role_changes_on_matched_steps():
+    delegated = (APPROVE[0], 'Controller', 'Finance')
+    diff = diff_processes(_process(RECEIVE, APPROVE), _process(RECEIVE, delegated))
+
+    assert diff['owner_role_changes'] == [{'step': 2, 'field': 'owner', 'before': 'Manager', 'after': 'Controller'}]
+    assert diff['trivial'] and not diff['identical']
+
+
+def test_residual_processes_keep_only_unexplained_steps():
+    old, new = _process(RECEIVE, MATCH, APPROVE), _process(RECEIVE, APPROVE, PAY)
+    old_residual, new_residual = residual_processes(old, new, diff_processes(old, new))
+
+    assert [step['description'] for step in old_residual['steps']] == [MATCH[0]]
+    assert [step['description'] for step in new_residual['steps']] == [PAY[0]]
+    assert old_residual['name'] == old['name']
+    assert len(old['steps']) == 3
@@ -0,0 +1,145 @@
+import random
+
+from process_flowchart import (
+    apply_diagram_diff, build_mermaid, diagram_graph, diagram_hash, diagram_source, diff_diagrams, render_diagram,
+    step_details, stored_steps, with_details
+)
+
+
+def _step(number, description, owner='Clerk', **extra):
+    return dict({'number': number, 'name': f'Step {number}', 'description': description, 'owner': owner}, **extra)
+
+
+LINEAR = [_step(1, 'Receive invoice'), _step(2, 'Check invoice'), _step(3, 'Pay vendor', 'Treasurer')]
+
+BRANCHING = [
+    _step(1, 'Receive invoice', type='start', next_steps=[2]),
+    _step(2, 'Invoice matches the order?', 'AP', next_steps=[
+        {'step': 3, 'label': 'yes'}, {'step': 4, 'label': 'no'}]),
+    _step(3, 'Pay vendor', 'Treasurer', next_steps=[5]),
+    _step(4, 'Return to vendor', next_steps=[5, 99]),
+    _step(5, 'Close case', type='end'),
+]
+
+
+def test_linear_steps_are_linked_in_order():
+    nodes, edges = diagram_graph(LINEAR)
+
+    assert [node['kind'] for node in nodes] == ['task', 'task', 'task']
+    assert edges == [('1', '2', ''), ('2', '3', '')]
+    assert nodes[2]['owner'] == 'Treasurer'
+
+
+def test_next_steps_branch_with_labels_and_skip_unknown_targets():
+    nodes, edges = diagram_graph(BRANCHING)
+
+    assert edges == [('1', '2', ''), ('2', '3', 'yes'), ('2', '4', 'no'), ('3', '5', ''), ('4', '5', '')]
+    assert [node['kind'] for node in nodes] == ['start', 'decision', 'task', 'task', 'end']
+
+
+def test_end_step_is_not_linked_onward_in_a_branching_process():
+    steps = [_step(1, 'Start', next_steps=[2]), _step(2, 'Stop', type='end'), _step(3, 'Orphan')]
+
+    _, edges = diagram_graph(steps)
+
+    assert edges == [('1', '2', '')]
+
+
+def test_mermaid_has_one_line_per_node_and_edge():
+    mermaid = build_mermaid(BRANCHING)
+    lines = mermaid.split('\n')
+
+    assert lines[0] == 'graph TD'
+    assert len(lines) == 1 + 5 + 5
+    assert '    S1(["Receive invoice<br/>Clerk"])' in lines
+    assert '    S2{"Invoice matches the order?<br/>AP"}' in lines
+    assert '    S2 -->|"yes"| S3' in lines
+
+
+def test_labels_are_escaped_and_long_descriptions_shortened():
+    steps = [_step(1, 'Check "urgent" <b>' + ' and more' * 20)]
+
+    title = diagram_graph(steps)[0][0]['title']
+    mermaid = build_mermaid(steps)
+
+    assert len(title) <= 60 and title.endswith('...')
+    assert '#quot;urgent#quot; #lt;b#gt;' in mermaid
+
+
+def test_diagram_hash_is_the_same_for_both_step_formats():
+    stored = {'steps': [{'step_number': 1, 'step_description': 'Receive invoice', 'approver_name': 'Clerk',
+                         'name': 'Step 1'}]}
+    extracted = {'steps': [_step(1, 'Receive invoice')]}
+
+    assert diagram_hash(stored) == diagram_hash(extracted)
+    assert diagram_hash(extracted) != diagram_hash({'steps': [_step(1, 'Receive invoice', 'AP')]})
+
+
+def test_render_diagram_is_memoized_by_content():
+    first = render_diagram({'steps': LINEAR})
+    second = render_diagram({'steps': [dict(step) for step in LINEAR]})
+
+    assert first == second
+
+
+def test_diff_round_trip_for_edits():
+    old = build_mermaid(LINEAR)
+    new = build_mermaid(LINEAR[:1] + [_step(2, 'Check invoice twice')] + LINEAR[2:] + [_step(4, 'Archive')])
+
+    diff = diff_diagrams(old, new)
+
+    assert apply_diagram_diff(old, diff) == new
+    assert len(diff['removed']) == 1
+
+
+def test_diff_round_trip_for_random_line_edits():
+    rng = random.Random(7)
+    base = [f'line {index}' for index in range(40)]
+    for _ in range(200):
+        edited = list(base)
+        for _ in range(rng.randint(1, 6)):
+            operation = rng.choice(('insert', 'delete', 'replace'))
+            position = rng.randrange(len(edited) + (operation == 'insert'))
+            if operation == 'insert':
+                edited.insert(position, f'new {rng.random()}')
+            elif operation == 'delete' and len(edited) > 1:
+                del edited[position]
+            elif edited:
+                edited[min(position, len(edited) - 1)] = f'changed {rng.random()}'
+        old, new = '\n'.join(base), '\n'.join(edited)
+        assert apply_diagram_diff(old, diff_diagrams(old, new)) == new
+
+
+def test_identical_diagrams_have_an_empty_diff():
+    mermaid = build_mermaid(BRANCHING)
+
+    assert diff_diagrams(mermaid, mermaid) == {'removed': [], 'added': []}
+
+
+def test_diagram_source_keeps_branching_and_names_through_storage():
+    extracted = {'steps': [
+        {'number': 1, 'name': 'Receive', 'description': 'Receive invoice', 'owner': 'Clerk', 'role': 'AP',
+         'next_steps': [2, 3]},
+        {'number': 2, 'name': 'Pay', 'description': 'Pay vendor', 'owner': 'Treasurer', 'role': 'Treasury',
+         'type': 'end'},
+        {'number': 3, 'name': 'Reject', 'description': 'Reject invoice', 'owner': 'Clerk', 'role': 'AP',
+         'type': 'end'},
+    ]}
+
+    source = diagram_source(extracted)
+    nodes, edges = diagram_graph(source['steps'])
+
+    assert edges == [('1', '2', ''), ('1', '3', '')]
+    assert [node['title'] for node in nodes] == ['Receive', 'Pay', 'Reject']
+    assert [node['kind'] for node in nodes] == ['decision', 'end', 'end']
+
+
+def test_edited_step_is_labelled_from_its_new_description():
+    extracted = {'steps': [{'number': 1, 'name': 'Receive', 'description': 'Receive invoice', 'owner': 'Clerk'}]}
+    [stored] = stored_steps(extracted)
+
+    [unchanged] = with_details([stored], step_details(extracted))
+    [edited] = with_details([dict(stored, description='Receive invoice by email')], step_details(extracted))
+
+    assert diagram_graph([unchanged])[0][0]['title'] == 'Receive'
+    assert diagram_graph([edited])[0][0]['title'] == 'Receive invoice by email'
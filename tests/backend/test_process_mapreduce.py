@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import process_mapreduce
+from llm_stream import ProcessJSONError, StreamingStepParser, parse_process_reply
+
+
+class FakeClient:
+    """Answers each section prompt with the reply registered for its section number"""
+
+    def __init__(self, replies):
+        self.replies = replies
+
+    def chat_text(self, messages, **kwargs):
+        prompt = messages[0]['content']
+        for section, reply in self.replies.items():
+            if f'section {section} of' in prompt:
+                return reply
+        raise AssertionError('unexpected prompt')
+
+
+@pytest.fixture
+def sections(monkeypatch):
+    def install(replies):
+        monkeypatch.setattr(process_mapreduce, 'get_llm_client', lambda: FakeClient(replies))
+        return [{'index': index, 'text': f'section text {index + 1}'} for index in range(len(replies))]
+    return install
+
+
+def _reply(name='', system='', steps=()):
+    return json.dumps({'name': name, 'system': system, 'steps': [
+        {'number': 1, 'name': description, 'description': description, 'owner': 'Clerk', 'role': 'AP'}
+        for description in steps
+    ]})
+
+
+def test_merge_keeps_name_from_the_only_section_that_has_one(sections):
+    chunks = sections({
+        1: _reply('Invoice Approval', 'SAP', ['Receive invoice']),
+        2: _reply(steps=['Check amount']),
+        3: _reply(steps=['Post invoice'])
+    })
+    process_info = process_mapreduce.map_reduce_extract(chunks, total=3, max_concurrency=2)
+
+    assert process_info['name'] == 'Invoice Approval'
+    assert process_info['system'] == 'SAP'
+    assert [step['description'] for step in process_info['steps']] == ['Receive invoice', 'Check amount', 'Post invoice']
+    assert [step['number'] for step in process_info['steps']] == [1, 2, 3]
+
+
+def test_merge_falls_back_to_placeholders_and_drops_boundary_duplicates(sections):
+    chunks = sections({
+        1: _reply(steps=['Receive invoice', 'Check amount']),
+        2: '```json\n' + _reply(steps=['Check amount', 'Post invoice']) + '\n```'
+    })
+    process_info = process_mapreduce.map_reduce_extract(chunks, total=2)
+
+    assert process_info['name'] == 'Extracted Process'
+    assert process_info['system'] == 'Unknown'
+    assert [step['description'] for step in process_info['steps']] == ['Receive invoice', 'Check amount', 'Post invoice']
+
+
+def test_partials_are_reported_in_document_order(sections):
+    chunks = sections({1: _reply(steps=['A']), 2: _reply(steps=['B']), 3: _reply(steps=['C'])})
+    seen = []
+    process_mapreduce.map_reduce_extract(chunks, total=3, max_concurrency=3,
+                                         on_partial=lambda partial: seen.append(partial['steps'][0]['description']))
+    assert seen == ['A', 'B', 'C']
+
+
+def test_chunks_are_read_at_most_max_concurrency_ahead(sections):
+    chunks = sections({section: _reply(steps=[f'Step {section}']) for section in range(1, 9)})
+    read, ahead = [], []
+
+    def produce():
+        for chunk in chunks:
+            read.append(chunk['index'])
+            yield chunk
+
+    process_info = process_mapreduce.map_reduce_extract(
+        produce(), total=8, max_concurrency=2, on_partial=lambda partial: ahead.append(len(read) - len(ahead) - 1))
+
+    assert len(process_info['steps']) == 8
+    assert max(ahead) <= 2
+
+
+def test_parse_process_reply_recovers_truncated_reply():
+    reply = _reply('Purchase', 'Oracle', ['Create request', 'Approve request'])
+    process_info, repaired = parse_process_reply(reply[:reply.rindex('Approve') + 4])
+
+    assert repaired
+    assert process_info['name'] == 'Purchase'
+    assert [step['description'] for step in process_info['steps']] == ['Create request']
+
+
+def test_parse_process_reply_without_defaults_leaves_name_empty():
+    process_info, _ = parse_process_reply(_reply(steps=['A']), fill_defaults=False)
+    assert process_info['name'] == '' and process_info['system'] == ''
+
+
+def test_parse_process_reply_requires_steps():
+    with pytest.raises(ProcessJSONError):
+        parse_process_reply('Sorry, I could not find a process.')
+
+
+def test_streaming_parser_yields_steps_as_they_complete():
+    reply = _reply('P', 'S', ['one', 'two {x}', 'three'])
+    parser = StreamingStepParser()
+    completed = []
+    for start in range(0, len(reply), 7):
+        completed.extend(step['description'] for step in parser.feed(reply[start:start + 7]))
+    assert completed == ['one', 'two {x}', 'three']
@@ -0,0 +1,149 @@
+import json
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from progress_stream import ProgressStream, ProgressStreams, report_stage
+
+
+@pytest.fixture
+def streams(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROGRESS_STREAM_PATH', str(tmp_path / 'progress.db'))
+    monkeypatch.setenv('PROGRESS_STREAM_WINDOW_SECONDS', '0.2')
+    monkeypatch.setenv('PROGRESS_STREAM_POLL_SECONDS', '0.01')
+    app = Flask(__name__)
+    progress = ProgressStreams(app)
+
+    @app.route('/work', methods=['POST'])
+    @progress.streamable('work')
+    def work():
+        report_stage('halfway', percent=50)
+        return jsonify({'answer': request.get_json()['value'] * 2})
+
+    @app.route('/fail', methods=['POST'])
+    @progress.streamable('fail')
+    def fail():
+        return jsonify({'error': 'Bad input'}), 400
+
+    yield progress
+    progress.executor.shutdown(wait=True)
+
+
+def parse_sse(body):
+    """[(id, event, data)] of the events in an SSE body"""
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def read_events(client, stream_id, last_event_id=None):
+    headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+    response = client.get(f'/api/progress/{stream_id}', headers=headers)
+    return response.status_code, parse_sse(response.get_data(as_text=True))
+
+
+def finished_stream(streams):
+    stream = ProgressStream(streams.store, streams.store.create('test'))
+    stream.emit('uploaded', size=10)
+    stream.emit('steps_partial', steps=[{'number': 1}])
+    stream.finish('result', {'ok': True})
+    return stream
+
+
+def test_events_are_numbered_in_order(streams):
+    stream = finished_stream(streams)
+
+    assert [row[:2] for row in streams.store.events_after(stream.id, 0)] == \
+        [(1, 'stage'), (2, 'steps'), (3, 'result')]
+
+
+def test_full_replay_without_last_event_id(streams):
+    stream = finished_stream(streams)
+
+    status, events = read_events(streams.app.test_client(), stream.id)
+
+    assert status == 200
+    assert [(seq, event) for seq, event, _ in events] == [(1, 'stage'), (2, 'steps'), (3, 'result')]
+    assert events[0][2] == {'stage': 'uploaded', 'size': 10}
+
+
+def test_reconnect_replays_only_missed_events(streams):
+    stream = finished_stream(streams)
+
+    status, events = read_events(streams.app.test_client(), stream.id, last_event_id=1)
+
+    assert status == 200
+    assert [seq for seq, _, _ in events] == [2, 3]
+
+
+def test_reconnect_after_the_final_event_gets_204(streams):
+    stream = finished_stream(streams)
+
+    status, events = read_events(streams.app.test_client(), stream.id, last_event_id=3)
+
+    assert status == 204 and events == []
+
+
+def test_open_stream_closes_after_the_window_and_resumes(streams):
+    stream = ProgressStream(streams.store, streams.store.create('test'))
+    stream.emit('uploaded')
+    client = streams.app.test_client()
+
+    started = time.monotonic()
+    status, events = read_events(client, stream.id)
+    assert status == 200 and [seq for seq, _, _ in events] == [1]
+    assert time.monotonic() - started >= streams.window
+
+    stream.emit('parsed')
+    stream.finish('result', {'ok': True})
+    status, events = read_events(client, stream.id, last_event_id=1)
+    assert [(seq, event) for seq, event, _ in events] == [(2, 'stage'), (3, 'result')]
+
+
+def test_unknown_stream_is_404(streams):
+    assert streams.app.test_client().get('/api/progress/missing').status_code == 404
+
+
+def wait_for_final(streams, stream_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = streams.store.events_after(stream_id, 0)
+        if events and events[-1][1] in ('result', 'error'):
+            return events
+        time.sleep(0.01)
+    raise AssertionError('stream did not finish')
+
+
+def test_streamable_view_answers_202_and_streams_its_result(streams):
+    client = streams.app.test_client()
+
+    response = client.post('/work?progress=1', json={'value': 21})
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['events_url'] == f"/api/progress/{body['stream_id']}"
+
+    wait_for_final(streams, body['stream_id'])
+    _, events = read_events(client, body['stream_id'])
+    assert [(event, data.get('stage')) for _, event, data in events[:-1]] == \
+        [('stage', 'started'), ('stage', 'halfway')]
+    assert events[-1][1:] == ('result', {'answer': 42})
+
+
+def test_streamable_view_without_progress_is_unchanged(streams):
+    response = streams.app.test_client().post('/work', json={'value': 2})
+
+    assert response.status_code == 200 and response.get_json() == {'answer': 4}
+
+
+def test_error_status_becomes_the_error_event(streams):
+    client = streams.app.test_client()
+    stream_id = client.post('/fail?progress=1', json={}).get_json()['stream_id']
+
+    events = wait_for_final(streams, stream_id)
+
+    assert events[-1][1] == 'error'
+    assert json.loads(events[-1][2]) == {'error': 'Bad input', 'status': 400}
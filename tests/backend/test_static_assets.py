@@ -0,0 +1,131 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+import static_assets
+from static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticAssets, _accepted_encodings
+
+BUNDLE = b'export const answer = 42;\n' * 200
+STYLES = b'body { margin: 0; }\n' * 100
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_bytes(b'<!doctype html><div id="root"></div>')
+    (tmp_path / 'assets' / 'index-3f9c2a1b.js').write_bytes(BUNDLE)
+    (tmp_path / 'assets' / 'logo-9a8b7c6d.png').write_bytes(bytes(range(256)) * 8)
+    (tmp_path / 'styles.css').write_bytes(STYLES)
+    # A build-time variant is served as it is
+    (tmp_path / 'styles.css.gz').write_bytes(gzip.compress(STYLES, mtime=0))
+    return tmp_path
+
+
+@pytest.fixture
+def client(dist, monkeypatch):
+    monkeypatch.setattr(static_assets, 'brotli', None)
+    assets = StaticAssets(str(dist))
+    app = Flask(__name__)
+    app.add_url_rule('/', 'index', assets.serve_index)
+    app.add_url_rule('/<path:path>', 'static_file', assets.serve)
+    client = app.test_client()
+    client.assets = assets
+    return client
+
+
+def test_manifest_lists_files_with_variants_and_cache_policy(client):
+    assets = client.assets.assets
+
+    assert sorted(assets) == ['assets/index-3f9c2a1b.js', 'assets/logo-9a8b7c6d.png', 'index.html', 'styles.css']
+    assert assets['assets/index-3f9c2a1b.js'].cache_control == IMMUTABLE_CACHE_CONTROL
+    assert assets['index.html'].cache_control == REVALIDATE_CACHE_CONTROL
+    assert assets['styles.css'].cache_control == REVALIDATE_CACHE_CONTROL
+    assert set(assets['assets/index-3f9c2a1b.js'].variants) == {'gzip'}
+    # Binary images and tiny files are not compressed
+    assert assets['assets/logo-9a8b7c6d.png'].variants == {}
+    assert assets['index.html'].variants == {}
+    # The prebuilt .gz is used, not recompressed
+    assert assets['styles.css'].variants['gzip'][1].endswith('styles.css.gz')
+
+
+def test_gzip_is_served_when_accepted(client):
+    response = client.get('/assets/index-3f9c2a1b.js', headers={'Accept-Encoding': 'br, gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(response.get_data()) == BUNDLE
+    assert int(response.headers['Content-Length']) == len(response.get_data())
+
+
+def test_identity_when_gzip_is_refused(client):
+    for accept in (None, 'gzip;q=0, identity', 'br'):
+        headers = {'Accept-Encoding': accept} if accept else {}
+        response = client.get('/assets/index-3f9c2a1b.js', headers=headers)
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == BUNDLE
+
+
+def test_etag_differs_per_encoding(client):
+    plain = client.get('/styles.css').headers['ETag']
+    gzipped = client.get('/styles.css', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    assert plain != gzipped
+    assert gzipped == plain[:-1] + '-gzip"'
+
+
+def test_if_none_match_answers_304(client):
+    etag = client.get('/index.html').headers['ETag']
+
+    response = client.get('/index.html', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_any_variant_etag_of_unchanged_content_is_304(client):
+    gzipped = client.get('/styles.css', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    assert client.get('/styles.css', headers={'If-None-Match': f'W/{gzipped}'}).status_code == 304
+    assert client.get('/styles.css', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_client_routes_fall_back_to_index_but_missing_bundles_do_not(client):
+    response = client.get('/processes/42')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/html'
+
+    assert client.get('/assets/index-00000000.js').status_code == 404
+
+
+def test_large_files_are_served_from_disk(dist, monkeypatch):
+    monkeypatch.setenv('STATIC_MEMORY_MAX_KB', '1')
+    assets = StaticAssets(str(dist))
+    bundle = assets.assets['assets/index-3f9c2a1b.js']
+    assert bundle.body is None
+    app = Flask(__name__)
+    app.add_url_rule('/<path:path>', 'static_file', assets.serve)
+
+    response = app.test_client().get('/assets/index-3f9c2a1b.js')
+
+    assert response.get_data() == BUNDLE
+    # The compressed variant is still kept in memory
+    assert bundle.variants['gzip'][0] is not None
+
+
+def test_reload_picks_up_a_new_build(client, dist):
+    etag = client.get('/index.html').headers['ETag']
+    (dist / 'index.html').write_bytes(b'<!doctype html><div id="app"></div>')
+
+    client.assets.reload()
+
+    assert client.get('/index.html', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_accepted_encodings_parses_quality_values():
+    assert _accepted_encodings('gzip;q=0.5, br;q=0, deflate') == {'gzip', 'deflate'}
+    assert _accepted_encodings(None) == set()
@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+import step_similarity
+from step_similarity import KIND_ERP, KIND_TOBE, align_steps, build_index, get_step_index
+
+STEPS = [
+    (KIND_ERP, 1, 10, 1, 'Receive the supplier invoice'),
+    (KIND_ERP, 2, 10, 2, 'Match invoice to purchase order'),
+    (KIND_ERP, 3, 10, 3, 'Approve invoice for payment'),
+    (KIND_ERP, 4, 11, 1, 'Create employee record'),
+    (KIND_ERP, 5, 11, 2, 'Assign laptop and badge'),
+    (KIND_TOBE, 6, 20, 1, 'Receive invoice electronically'),
+    (KIND_TOBE, 7, 20, 2, 'Automatically match invoice to purchase order'),
+    (KIND_TOBE, 8, 21, 1, 'Create employee record in HR system'),
+]
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(step_similarity, '_index', None)
+    monkeypatch.setattr(step_similarity, 'STEP_INDEX_PATH', str(tmp_path / 'step_index'))
+    monkeypatch.setattr(step_similarity, '_iter_step_rows', lambda session: iter(STEPS))
+    return str(tmp_path / 'step_index')
+
+
+def _build(path, dim=64):
+    return build_index(session=object(), path=path, dim=dim)
+
+
+def test_build_publishes_one_current_index(index_path):
+    meta = _build(index_path)
+
+    assert meta['steps'] == len(STEPS)
+    assert meta['processes'] == 4
+    with open(os.path.join(index_path, 'CURRENT')) as f:
+        assert f.read() == meta['version']
+
+    index = get_step_index()
+    assert len(index) == len(STEPS)
+    assert index.vectors.shape == (len(STEPS), 64)
+    assert list(index.process_starts) == [0, 3, 5, 7]
+
+
+def test_rebuild_replaces_the_previous_build(index_path):
+    first = _build(index_path)
+    assert get_step_index().version == first['version']
+
+    second = _build(index_path)
+
+    assert get_step_index().version == second['version']
+    assert sorted(os.listdir(index_path)) == sorted(['CURRENT', second['version']])
+
+
+def test_missing_index_is_none(index_path):
+    assert get_step_index() is None
+
+
+def test_search_steps_ranks_the_closest_step_first(index_path):
+    _build(index_path)
+    index = get_step_index()
+
+    results = index.search_steps('match the invoice with the purchase order', k=3)
+
+    assert results[0]['step_id'] in (2, 7)
+    assert {results[0]['step_id'], results[1]['step_id']} == {2, 7}
+    assert results[0]['score'] >= results[1]['score'] > 0
+
+
+def test_search_steps_filters_by_kind(index_path):
+    _build(index_path)
+
+    results = get_step_index().search_steps('match invoice to purchase order', k=2, kind=KIND_TOBE)
+
+    assert results[0]['step_id'] == 7
+    assert all(result['kind'] == 'tobe' for result in results)
+
+
+def test_search_results_do_not_depend_on_chunk_size(index_path, monkeypatch):
+    _build(index_path)
+    index = get_step_index()
+    texts = ['create employee record', 'assign a laptop']
+    whole = (index.search_steps(texts[0], k=4), index.search_processes(texts, k=4))
+
+    monkeypatch.setattr(step_similarity, 'SEARCH_CHUNK_ROWS', 2)
+
+    assert (index.search_steps(texts[0], k=4), index.search_processes(texts, k=4)) == whole
+
+
+def test_search_processes_scores_coverage_and_excludes(index_path):
+    _build(index_path)
+    index = get_step_index()
+    texts = ['Create employee record', 'Assign laptop and badge']
+
+    results = index.search_processes(texts, k=2)
+    assert (results[0]['kind'], results[0]['process_id']) == ('erp', 11)
+    assert results[0]['score'] == pytest.approx(1.0, abs=1e-4)
+
+    excluded = index.search_processes(texts, k=2, exclude=(KIND_ERP, 11))
+    assert (excluded[0]['kind'], excluded[0]['process_id']) == ('tobe', 21)
+
+
+def test_empty_query_finds_nothing(index_path):
+    _build(index_path)
+    index = get_step_index()
+
+    assert index.search_steps('the and of') == []
+    assert index.search_processes(['', 'a']) == []
+
+
+def test_align_steps_pairs_one_to_one_and_reports_leftovers(index_path):
+    asis = [
+        {'number': 1, 'description': 'Receive the supplier invoice'},
+        {'number': 2, 'description': 'Match invoice to purchase order'},
+        {'number': 3, 'description': 'File paper copy in cabinet'},
+    ]
+    target = [
+        {'number': 1, 'description': 'Automatically match invoice to purchase order'},
+        {'number': 2, 'description': 'Receive supplier invoice electronically'},
+        {'number': 3, 'description': 'Post payment run'},
+    ]
+
+    alignment = align_steps(asis, target)
+
+    assert [(pair['asis']['number'], pair['target']['number']) for pair in alignment['pairs']] == [(1, 2), (2, 1)]
+    assert [step['number'] for step in alignment['unmatched_asis']] == [3]
+    assert [step['number'] for step in alignment['unmatched_target']] == [3]
+
+
+def test_align_steps_handles_empty_sides(index_path):
+    alignment = align_steps([], [{'number': 1, 'description': 'Post payment run'}])
+
+    assert alignment['pairs'] == []
+    assert len(alignment['unmatched_target']) == 1
@@ -0,0 +1,166 @@
+"""
+Memoization for TO-BE generation.
+
+``/api/tobe/generate-from-asis`` (served by the backend API blueprint) asks
+the LLM for a new TO-BE process on every call, although the same AS-IS
+process is regenerated against the same standard again and again.
+``install_tobe_generation_cache`` wraps that view: successful responses are
+stored in the ``tobe_generation`` content cache under a hash of the
+normalized AS-IS content, the standard type, any other generation options
+and TOBE_PROMPT_VERSION, so a repeat generation is answered from the cache
+without an LLM call.
+
+A hit for a different AS-IS process with identical content gets its own copy
+of the cached TO-BE process, so every AS-IS process still owns its TO-BE
+rows. Sending ``force_regenerate`` (JSON body or query string) bypasses the
+lookup and refreshes the entry. Size and age limits come from
+AI_CACHE_TOBE_GENERATION_MAX_ENTRIES / _MAX_MB / _MAX_AGE_DAYS (falling back
+to the global AI_CACHE_* settings); least recently used entries go first.
+"""
+import functools
+import json
+import logging
+import os
+
+from flask import jsonify, make_response, request
+
+from analysis_cache import normalize_payload
+from content_cache import content_hash, get_cache
+from progress_stream import report_stage
+
+logger = logging.getLogger(__name__)
+
+TOBE_GENERATION_ROUTE = '/api/tobe/generate-from-asis'
+TOBE_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+TOBE_PROMPT_VERSION = os.environ.get('TOBE_PROMPT_VERSION', '1')
+
+ASIS_ID_KEYS = ('asis_process_id', 'asis_id', 'process_id')
+TOBE_ID_KEYS = ('tobe_process_id', 'id')
+# Request fields that identify or control the call rather than shape the output
+NON_CONTENT_KEYS = set(ASIS_ID_KEYS) | {'force_regenerate'}
+
+
+def _truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _asis_id(data):
+    for key in ASIS_ID_KEYS:
+        if data.get(key) is not None:
+            return data[key]
+    return None
+
+
+def _asis_payload(asis_id):
+    """Normalized AS-IS content (no ids or timestamps), or None if the process is missing"""
+    from process_queries import load_process, serialize_process
+    process, steps = load_process(asis_id)
+    if process is None:
+        return None
+    info = serialize_process(process, steps)
+    info['steps'] = [{key: step[key] for key in ('description', 'owner', 'role')} for step in info['steps']]
+    return normalize_payload(info)
+
+
+def generation_key(data):
+    """Cache key for a generation request, or None if the AS-IS process does not exist"""
+    options = {key: value for key, value in data.items() if key not in NON_CONTENT_KEYS}
+    asis_id = _asis_id(data)
+    asis = _asis_payload(asis_id) if asis_id is not None else None
+    if asis_id is not None and asis is None:
+        return None
+    return content_hash(
+        'tobe_generation', TOBE_MODEL, TOBE_PROMPT_VERSION,
+        json.dumps(asis, sort_keys=True),
+        json.dumps(normalize_payload(options), sort_keys=True, default=str)
+    )
+
+
+def _find_tobe_id(body):
+    """(container, key) holding the generated TO-BE process id in a response body"""
+    candidates = [body] + [value for value in body.values() if isinstance(value, dict)]
+    for container in candidates:
+        for key in TOBE_ID_KEYS:
+            if isinstance(container.get(key), int):
+                return container, key
+    return None, None
+
+
+def _clone_for_asis(body, asis_id):
+    """Copy of a cached response whose TO-BE process is re-created for another AS-IS process.
+
+    Returns None when the cached TO-BE process no longer exists, so the
+    caller regenerates instead.
+    """
+    from backend.models import db
+    from backend.models.tobe_process import ToBeProcess, ToBeProcessStep
+    from process_repository import save_tobe_process
+
+    body = json.loads(json.dumps(body))
+    container, key = _find_tobe_id(body)
+    if container is None:
+        return body
+    tobe = db.session.get(ToBeProcess, container[key])
+    if tobe is None:
+        return None
+    if tobe.related_asis_id == asis_id or str(tobe.related_asis_id) == str(asis_id):
+        return body
+
+    steps = ToBeProcessStep.query.filter_by(process_id=tobe.id).order_by(ToBeProcessStep.step_number).all()
+    container[key] = save_tobe_process(tobe.process_name, asis_id, tobe.standard_type, [{
+        'step_number': step.step_number,
+        'step_description': step.step_description,
+        'approver_role': step.approver_role,
+        'approver_name': step.approver_name,
+        'is_automated': step.is_automated
+    } for step in steps])
+    return body
+
+
+def cached_tobe_generation(view):
+    """Wrap the TO-BE generation view with the persistent memoization"""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        force = _truthy(data.get('force_regenerate')) or _truthy(request.args.get('force_regenerate'))
+        cache = get_cache('tobe_generation')
+
+        try:
+            key = generation_key(data)
+        except Exception as e:
+            logger.error(f"Could not compute TO-BE cache key: {str(e)}", exc_info=True)
+            key = None
+        if key is None:
+            return view(*args, **kwargs)
+
+        if not force:
+            cached = cache.get(key)
+            if cached is not None:
+                body = _clone_for_asis(json.loads(cached), _asis_id(data))
+                if body is not None:
+                    logger.info("TO-BE generation served from cache")
+                    response = jsonify(body)
+                    response.headers['X-TOBE-Cache'] = 'hit'
+                    return response
+                cache.delete(key)
+
+        report_stage('llm_started', cache='refresh' if force else 'miss')
+        response = make_response(view(*args, **kwargs))
+        body = response.get_json(silent=True) if response.is_json else None
+        if 200 <= response.status_code < 300 and isinstance(body, dict):
+            cache.set(key, json.dumps(body, default=str))
+        response.headers['X-TOBE-Cache'] = 'refresh' if force else 'miss'
+        return response
+
+    return wrapper
+
+
+def install_tobe_generation_cache(app):
+    """Wrap the registered TO-BE generation view(s); returns the endpoints wrapped"""
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.rule == TOBE_GENERATION_ROUTE}
+    for endpoint in endpoints:
+        app.view_functions[endpoint] = cached_tobe_generation(app.view_functions[endpoint])
+    if not endpoints:
+        logger.warning(f"No view registered for {TOBE_GENERATION_ROUTE}; TO-BE cache not installed")
+    return endpoints